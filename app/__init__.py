@@ -69,6 +69,16 @@ def create_app(config_class=Config):
     from app.services.shopify_service import shopify_service
     shopify_service.init_app(app)
     
+    # 每日财务汇总表随业务数据提交自动刷新（注册会话事件）
+    from app.services import financial_rollup  # noqa: F401
+    
+    # 费用分摊表随费用、费用-订单关联提交自动刷新（注册会话事件）
+    from app.services import expense_allocation  # noqa: F401
+    
+    # 注册命令行命令
+    from app.cli import register_commands
+    register_commands(app)
+    
     # 注册蓝图
     from app.main import bp as main_bp
     app.register_blueprint(main_bp)
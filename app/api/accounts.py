@@ -4,6 +4,8 @@ from app.models.account import Account, Recharge, Consumption
 from app import db
 from datetime import datetime, date
 from sqlalchemy import func, desc
+from app.services.account_ledger import account_ledger, InsufficientBalanceError, StatusConflictError
+from app.utils.date_ranges import dates_range, in_range, month_range
 
 
 # ==================== 账户管理 API ====================
@@ -296,11 +298,8 @@ def create_recharge(account_id):
             recharge_date=datetime.strptime(data['recharge_date'], '%Y-%m-%d') if data.get('recharge_date') else datetime.utcnow()
         )
         
-        db.session.add(recharge)
-        
-        # 直接更新账户余额
-        from decimal import Decimal
-        account.update_balance(Decimal(str(data['amount'])), 'add')
+        # 登记充值记录并原子增加账户余额，与充值记录在同一事务中提交
+        account_ledger.record_recharge(recharge)
         
         db.session.commit()
         
@@ -332,6 +331,7 @@ def confirm_recharge(recharge_id):
             }), 400
         
         recharge.confirm_recharge()
+        db.session.commit()
         
         return jsonify({
             'success': True,
@@ -339,6 +339,12 @@ def confirm_recharge(recharge_id):
             'recharge': recharge.to_dict()
         })
         
+    except StatusConflictError:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': '充值记录已被其他请求确认，请刷新后重试'
+        }), 409
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Confirm recharge error: {str(e)}")
@@ -418,42 +424,31 @@ def create_consumption(account_id):
                 'message': '消耗日期不能为空'
             }), 400
         
-        # 检查账户余额
-        amount = float(data['amount'])
-        if account.balance < amount:
-            return jsonify({
-                'success': False,
-                'message': f'账户余额不足：需要{amount}，余额{account.balance}'
-            }), 400
-        
-        # 创建消耗记录
-        consumption = Consumption(
-            account_id=account_id,
-            amount=amount,
-            currency=data.get('currency', account.currency),
-            consumption_type=data.get('consumption_type'),
-            description=data.get('description'),
-            reference_id=data.get('reference_id'),
-            consumption_date=datetime.strptime(data['consumption_date'], '%Y-%m-%d').date()
-        )
-        
-        db.session.add(consumption)
-        
-        # 从账户余额扣除
-        if consumption.process_consumption():
-            db.session.commit()
-            return jsonify({
-                'success': True,
-                'message': '消耗记录创建成功',
-                'consumption': consumption.to_dict()
-            }), 201
-        else:
+        # 原子扣减余额（余额检查在同一条 UPDATE 中完成）并创建消耗记录
+        try:
+            consumption = account_ledger.consume(
+                account_id,
+                data['amount'],
+                datetime.strptime(data['consumption_date'], '%Y-%m-%d').date(),
+                currency=data.get('currency', account.currency),
+                consumption_type=data.get('consumption_type'),
+                description=data.get('description'),
+                reference_id=data.get('reference_id')
+            )
+        except InsufficientBalanceError as e:
             db.session.rollback()
             return jsonify({
                 'success': False,
-                'message': '账户余额不足，无法创建消耗记录'
+                'message': str(e)
             }), 400
         
+        db.session.commit()
+        return jsonify({
+            'success': True,
+            'message': '消耗记录创建成功',
+            'consumption': consumption.to_dict()
+        }), 201
+        
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Create consumption error: {str(e)}")
@@ -516,14 +511,13 @@ def get_accounts_summary():
                 start_dt = datetime.strptime(start_date, '%Y-%m-%d')
                 end_dt = datetime.strptime(end_date, '%Y-%m-%d')
                 
+                period_start, period_end = dates_range(start_dt, end_dt)
                 recharge_query = recharge_query.filter(
-                    func.date(Recharge.recharge_date) >= start_dt.date(),
-                    func.date(Recharge.recharge_date) <= end_dt.date()
+                    in_range(Recharge.recharge_date, period_start, period_end)
                 )
                 
                 consumption_query = consumption_query.filter(
-                    Consumption.consumption_date >= start_dt.date(),
-                    Consumption.consumption_date <= end_dt.date()
+                    in_range(Consumption.consumption_date, period_start, period_end)
                 )
             except ValueError:
                 return jsonify({
@@ -532,17 +526,14 @@ def get_accounts_summary():
                 }), 400
         else:
             # 默认使用当前月份
-            current_month = datetime.now().month
-            current_year = datetime.now().year
+            month_start, month_end = month_range(datetime.now())
             
             recharge_query = recharge_query.filter(
-                func.extract('month', Recharge.recharge_date) == current_month,
-                func.extract('year', Recharge.recharge_date) == current_year
+                in_range(Recharge.recharge_date, month_start, month_end)
             )
             
             consumption_query = consumption_query.filter(
-                func.extract('month', Consumption.consumption_date) == current_month,
-                func.extract('year', Consumption.consumption_date) == current_year
+                in_range(Consumption.consumption_date, month_start, month_end)
             )
         
         month_recharge = recharge_query.scalar() or 0
@@ -645,12 +636,8 @@ def create_account_recharge():
             recharge_date=datetime.strptime(data['recharge_date'], '%Y-%m-%d') if data.get('recharge_date') else datetime.utcnow()
         )
         
-        db.session.add(recharge)
-        
-        # 如果状态为已完成，直接更新账户余额
-        if recharge.status == 'completed':
-            from decimal import Decimal
-            account.update_balance(Decimal(str(data['amount'])), 'add')
+        # 登记充值记录，状态为已完成时原子增加账户余额
+        account_ledger.record_recharge(recharge)
         
         db.session.commit()
         
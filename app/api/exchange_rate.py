@@ -19,6 +19,10 @@ def convert_currency():
                 'message': '请求数据不能为空'
             }), 400
         
+        # 批量转换：{"amounts": [...], "currencies": [...] 或 "from_currency": "USD", "dates": [...]}
+        if 'amounts' in data:
+            return _convert_batch(data)
+        
         amount = data.get('amount')
         from_currency = data.get('from_currency')
         to_currency = data.get('to_currency', 'CNY')
@@ -94,6 +98,78 @@ def convert_currency():
             'message': f'转换失败: {str(e)}'
         }), 500
 
+def _convert_batch(data):
+    """批量货币转换（一次调用转换整列金额）"""
+    amounts = data.get('amounts')
+    currencies = data.get('currencies') or data.get('from_currency')
+    to_currency = (data.get('to_currency') or 'CNY').upper()
+    dates = data.get('dates')
+    
+    if not isinstance(amounts, list) or not amounts:
+        return jsonify({
+            'success': False,
+            'message': '金额列表不能为空'
+        }), 400
+    
+    if not currencies:
+        return jsonify({
+            'success': False,
+            'message': '源货币不能为空'
+        }), 400
+    
+    if isinstance(currencies, list) and len(currencies) != len(amounts):
+        return jsonify({
+            'success': False,
+            'message': '货币列表与金额列表长度不一致'
+        }), 400
+    
+    if dates is not None and (not isinstance(dates, list) or len(dates) != len(amounts)):
+        return jsonify({
+            'success': False,
+            'message': '日期列表与金额列表长度不一致'
+        }), 400
+    
+    # 验证金额
+    try:
+        amounts = [float(amount) for amount in amounts]
+    except (ValueError, TypeError):
+        return jsonify({
+            'success': False,
+            'message': '金额格式不正确'
+        }), 400
+    if any(amount < 0 for amount in amounts):
+        return jsonify({
+            'success': False,
+            'message': '金额不能为负数'
+        }), 400
+    
+    # 验证货币代码
+    currency_set = {currencies.upper()} if isinstance(currencies, str) else {str(c).upper() for c in currencies}
+    for currency in sorted(currency_set | {to_currency}):
+        if not exchange_rate_service.is_currency_supported(currency):
+            return jsonify({
+                'success': False,
+                'message': f'不支持的货币: {currency}'
+            }), 400
+    
+    try:
+        converted = exchange_rate_service.convert_many(amounts, currencies, to=to_currency, dates=dates)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'converted_amounts': converted.tolist(),
+            'target_currency': to_currency,
+            'count': len(amounts)
+        },
+        'message': '转换成功'
+    })
+
 @exchange_rate_bp.route('/api/exchange/rates', methods=['GET'])
 def get_exchange_rates():
     """获取支持的货币列表和当前汇率"""
@@ -143,4 +219,37 @@ def get_supported_currencies():
         return jsonify({
             'success': False,
             'message': f'获取失败: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+@exchange_rate_bp.route('/api/exchange/providers', methods=['GET'])
+def get_provider_status():
+    """获取汇率API熔断器状态"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': exchange_rate_service.get_provider_status(),
+            'message': '获取成功'
+        })
+    except Exception as e:
+        logging.error(f'获取汇率API状态失败: {str(e)}')
+        return jsonify({
+            'success': False,
+            'message': f'获取失败: {str(e)}'
+        }), 500
+
+@exchange_rate_bp.route('/api/exchange/providers/reset', methods=['POST'])
+def reset_provider_status():
+    """手动恢复汇率API熔断器并清空负缓存"""
+    try:
+        exchange_rate_service.reset_providers()
+        return jsonify({
+            'success': True,
+            'data': exchange_rate_service.get_provider_status(),
+            'message': '重置成功'
+        })
+    except Exception as e:
+        logging.error(f'重置汇率API状态失败: {str(e)}')
+        return jsonify({
+            'success': False,
+            'message': f'重置失败: {str(e)}'
+        }), 500
@@ -2,8 +2,15 @@ from flask import request, jsonify
 from app.models import Expense, Account, Consumption, Order
 from app import db
 from datetime import datetime
-from sqlalchemy import desc
+from sqlalchemy import cast, desc, exists, literal
+from sqlalchemy.orm import aliased, selectinload
 from app.api import bp
+from app.services.account_ledger import account_ledger, InsufficientBalanceError
+from app.services.expense_allocation import expense_allocation
+from app.utils.fieldsets import invalid_names, parse_fieldset, pick_fields, wants
+
+# 费用列表 expand= 可展开的关联数据
+EXPENSE_EXPANDABLE = ('account', 'orders')
 
 @bp.route('/expenses', methods=['GET'])
 def get_expenses():
@@ -14,6 +21,13 @@ def get_expenses():
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
+        # 稀疏字段：fields= 只返回指定字段，expand= 展开关联数据（account、orders）
+        fields = parse_fieldset(request.args.get('fields'))
+        expand = parse_fieldset(request.args.get('expand')) or set()
+        unknown = invalid_names(expand, EXPENSE_EXPANDABLE)
+        if unknown:
+            return jsonify({'success': False, 'message': f"不支持展开: {', '.join(sorted(unknown))}"}), 400
+        
         # 构建查询
         expenses_query = Expense.query
         
@@ -38,28 +52,44 @@ def get_expenses():
             except ValueError:
                 return jsonify({'success': False, 'message': '结束日期格式错误'}), 400
         
-        # 分页查询费用
+        # 分页查询费用（只预加载请求的字段需要的关联订单）
         expenses_query = expenses_query.order_by(desc(Expense.expense_date))
+        want_orders = wants(fields, 'order_info', 'orders_info') or 'orders' in expand
+        if want_orders:
+            expenses_query = expenses_query.options(selectinload(Expense.orders))
         expenses_pagination = expenses_query.paginate(
             page=page, per_page=per_page, error_out=False
         )
+        expenses = expenses_pagination.items
+        
+        # 整页一次性加载关联账户，以及只有主要订单（向后兼容）的费用对应的订单
+        accounts = {}
+        if wants(fields, 'account_name') or 'account' in expand:
+            account_ids = {expense.account_id for expense in expenses if expense.account_id}
+            if account_ids:
+                accounts = {account.id: account for account in Account.query.filter(Account.id.in_(account_ids)).all()}
+        primary_orders = {}
+        if want_orders:
+            primary_ids = {expense.order_id for expense in expenses if expense.order_id and not expense.orders}
+            if primary_ids:
+                primary_orders = {order.id: order for order in Order.query.filter(Order.id.in_(primary_ids)).all()}
         
         expenses_data = []
-        for expense in expenses_pagination.items:
+        for expense in expenses:
             # 获取关联账户名称
-            account_name = None
-            if expense.account_id:
-                account = Account.query.get(expense.account_id)
-                if account:
-                    account_name = account.account_name
+            account = accounts.get(expense.account_id)
+            account_name = account.account_name if account else None
             
             # 获取关联订单信息（支持多个订单）
             order_info = None
             orders_info = []
-            
-            # 获取多对多关联的所有订单
-            if expense.orders:
-                for order in expense.orders:
+            related_orders = []
+            if want_orders:
+                # 获取多对多关联的所有订单；向后兼容：没有多对多关联但有主要订单时使用主要订单
+                related_orders = list(expense.orders)
+                if not related_orders and expense.order_id in primary_orders:
+                    related_orders = [primary_orders[expense.order_id]]
+                for order in related_orders:
                     orders_info.append({
                         'id': order.id,
                         'order_number': order.order_number,
@@ -67,24 +97,11 @@ def get_expenses():
                         'total_price': float(order.total_price) if order.total_price else 0
                     })
             
-            # 向后兼容：如果没有多对多关联但有主要订单，则使用主要订单
-            elif expense.order_id:
-                from app.models.order import Order
-                order = Order.query.get(expense.order_id)
-                if order:
-                    order_info = {
-                        'id': order.id,
-                        'order_number': order.order_number,
-                        'customer_name': order.customer_name,
-                        'total_price': float(order.total_price) if order.total_price else 0
-                    }
-                    orders_info = [order_info]
-            
             # 为了向后兼容，保留order_info字段（显示第一个订单）
             if orders_info:
                 order_info = orders_info[0]
             
-            expenses_data.append({
+            expense_data = pick_fields({
                 'id': expense.id,
                 'date': expense.expense_date.strftime('%Y-%m-%d') if expense.expense_date else None,
                 'category': expense.category,
@@ -99,7 +116,14 @@ def get_expenses():
                 'orders_info': orders_info,  # 所有关联订单信息
                 'created_at': expense.created_at.strftime('%Y-%m-%d %H:%M:%S') if expense.created_at else None,
                 'updated_at': expense.updated_at.strftime('%Y-%m-%d %H:%M:%S') if expense.updated_at else None
-            })
+            }, fields)
+            
+            # 展开关联数据
+            if 'account' in expand:
+                expense_data['account'] = account.to_dict() if account else None
+            if 'orders' in expand:
+                expense_data['orders'] = Order.to_dict_list(related_orders)
+            expenses_data.append(expense_data)
         
         return jsonify({
             'success': True,
@@ -146,6 +170,12 @@ def create_expense():
                     'message': f'缺少必需字段: {field}'
                 }), 400
         
+        if data.get('allocation_strategy') and data['allocation_strategy'] not in expense_allocation.strategies:
+            return jsonify({
+                'success': False, 
+                'message': f"不支持的分摊方式: {data['allocation_strategy']}"
+            }), 400
+        
         # 创建新费用
         expense = Expense(
             expense_date=datetime.strptime(data['date'], '%Y-%m-%d').date(),
@@ -161,6 +191,7 @@ def create_expense():
             submitter=data.get('submitter', 'Admin'),
             account_id=data.get('account_id'),
             order_id=data.get('order_id'),  # 添加订单关联
+            allocation_strategy=data.get('allocation_strategy', expense_allocation.DEFAULT_STRATEGY),
             status=data.get('status', 'completed'),
             created_at=datetime.now()
         )
@@ -178,45 +209,34 @@ def create_expense():
                     expense.orders.append(order)
         
         db.session.add(expense)
-        db.session.commit()
         
-        # 处理账户扣费（如果有）
+        # 处理账户扣费（如果有）：原子扣减余额并登记消耗记录，与费用在同一事务中提交
         account_id = data.get('account_id')
         if account_id:
-            # 查找指定账户
-            account = Account.query.get(account_id)
-            if not account:
+            if not Account.query.get(account_id):
                 db.session.rollback()
                 return jsonify({
                     'success': False, 
                     'message': f'账户不存在: {account_id}'
                 }), 400
             
-            # 检查账户余额是否足够
-            from decimal import Decimal
-            amount_decimal = Decimal(str(data['amount']))
-            if account.balance < amount_decimal:
+            db.session.flush()  # 获取费用ID，用于关联消耗记录
+            try:
+                account_ledger.consume(
+                    account_id,
+                    data['amount'],
+                    datetime.now().date(),
+                    description=f"费用支出: {data['description']}",
+                    reference_id=f'expense:{expense.id}'
+                )
+            except InsufficientBalanceError as e:
                 db.session.rollback()
                 return jsonify({
                     'success': False, 
-                    'message': f'账户余额不足，当前余额: {account.balance}，需要扣除: {data["amount"]}'
+                    'message': f'账户余额不足，当前余额: {e.balance}，需要扣除: {data["amount"]}'
                 }), 400
-            
-            # 扣除账户余额
-            account.balance -= amount_decimal
-            account.updated_at = datetime.now()
-            
-            # 创建消费记录
-            consumption = Consumption(
-                account_id=account_id,
-                amount=amount_decimal,
-                description=f"费用支出: {data['description']}",
-                consumption_date=datetime.now().date(),
-                created_at=datetime.now()
-            )
-            
-            db.session.add(consumption)
-            db.session.commit()
+        
+        db.session.commit()
         
         return jsonify({
             'success': True,
@@ -261,6 +281,16 @@ def update_expense(expense_id):
             expense.description = data['description']
         if 'notes' in data:
             expense.notes = data['notes']
+        if 'allocation_strategy' in data:
+            if data['allocation_strategy'] not in expense_allocation.strategies:
+                return jsonify({'success': False, 'message': f"不支持的分摊方式: {data['allocation_strategy']}"}), 400
+            expense.allocation_strategy = data['allocation_strategy']
+        if 'order_ids' in data:
+            # 更新关联订单，分摊表在提交时自动重新计算
+            order_ids = data['order_ids'] or []
+            orders = Order.query.filter(Order.id.in_(order_ids)).all() if order_ids else []
+            expense.orders = orders
+            expense.order_id = order_ids[0] if order_ids else None
         
         db.session.commit()
         
@@ -273,7 +303,9 @@ def update_expense(expense_id):
                 'expense_type': expense.expense_type,
                 'amount': float(expense.amount),
                 'description': expense.description,
-                'notes': expense.notes
+                'notes': expense.notes,
+                'allocation_strategy': expense.allocation_strategy,
+                'order_ids': [order.id for order in expense.orders]
             }
         })
     except ValueError as e:
@@ -282,30 +314,37 @@ def update_expense(expense_id):
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def _reverse_expense_consumption(expense):
+    """冲正费用扣款产生的消耗记录（不提交事务）"""
+    if not expense.account_id:
+        return
+    consumption = Consumption.query.filter(
+        Consumption.account_id == expense.account_id,
+        Consumption.reference_id == f'expense:{expense.id}'
+    ).first()
+    if consumption is None:
+        # 兼容旧数据：早期的消耗记录没有 reference_id，只能通过费用描述匹配。
+        # 只匹配尚未冲正的记录并按ID取最早的一条，描述相同的多条旧费用依次冲正各自的扣款
+        reversal = aliased(Consumption)
+        consumption = Consumption.query.filter(
+            Consumption.account_id == expense.account_id,
+            Consumption.reference_id.is_(None),
+            Consumption.description.contains(f"费用支出: {expense.description}", autoescape=True),
+            ~exists().where(reversal.reference_id == literal(f'{account_ledger.REVERSAL_TYPE}:').concat(
+                cast(Consumption.id, db.String)
+            ))
+        ).order_by(Consumption.id).first()
+    if consumption:
+        account_ledger.reverse_consumption(consumption, f"删除费用冲正: {expense.description}")
+
 @bp.route('/expenses/<int:expense_id>', methods=['DELETE'])
 def delete_expense(expense_id):
     """删除费用"""
     try:
         expense = Expense.query.get_or_404(expense_id)
         
-        # 如果费用关联了账户，需要处理消费记录和恢复余额
-        if expense.account_id:
-            account = Account.query.get(expense.account_id)
-            if account:
-                # 查找关联的消费记录（通过费用描述匹配）
-                consumption = Consumption.query.filter(
-                    Consumption.account_id == expense.account_id,
-                    Consumption.description.like(f"%费用支出: {expense.description}%")
-                ).first()
-                
-                if consumption:
-                    # 恢复账户余额
-                    from decimal import Decimal
-                    account.balance += consumption.amount
-                    account.updated_at = datetime.now()
-                    
-                    # 删除消费记录
-                    db.session.delete(consumption)
+        # 如果费用关联了账户，冲正对应的消耗记录并退回余额
+        _reverse_expense_consumption(expense)
         
         db.session.delete(expense)
         db.session.commit()
@@ -345,24 +384,8 @@ def batch_delete_expenses():
         
         # 批量删除
         for expense in expenses:
-            # 如果费用关联了账户，需要处理消费记录和恢复余额
-            if expense.account_id:
-                account = Account.query.get(expense.account_id)
-                if account:
-                    # 查找关联的消费记录（通过费用描述匹配）
-                    consumption = Consumption.query.filter(
-                        Consumption.account_id == expense.account_id,
-                        Consumption.description.like(f"%费用支出: {expense.description}%")
-                    ).first()
-                    
-                    if consumption:
-                        # 恢复账户余额
-                        from decimal import Decimal
-                        account.balance += consumption.amount
-                        account.updated_at = datetime.now()
-                        
-                        # 删除消费记录
-                        db.session.delete(consumption)
+            # 如果费用关联了账户，冲正对应的消耗记录并退回余额
+            _reverse_expense_consumption(expense)
             
             db.session.delete(expense)
         
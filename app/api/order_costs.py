@@ -1,11 +1,17 @@
-from flask import jsonify, request, current_app
+import io
+from flask import jsonify, request, current_app, send_file
 from app.api import bp
 from app.models.order_cost import OrderCost, OrderCostBatch
 from app.models.account import Account
 from app.models import Order
 from app import db
 from datetime import datetime, date
-from sqlalchemy import func, desc, and_
+from app.services.account_ledger import account_ledger, InsufficientBalanceError, StatusConflictError
+from app.services.cost_bill_import import cost_bill_importer, CostBillImportError
+from app.services.cost_reconciliation import cost_reconciler
+from app.services.financial_rollup import financial_rollup
+from app.utils.fieldsets import invalid_names, parse_fieldset
+from sqlalchemy import func, desc, and_, update
 
 
 # ==================== 订单费用管理 API ====================
@@ -22,7 +28,17 @@ def get_order_costs():
         end_date = request.args.get('end_date')
         batch_id = request.args.get('batch_id')
         
-        query = OrderCost.query
+        # 稀疏字段：fields= 只返回指定字段，expand= 展开关联数据
+        fields = parse_fieldset(request.args.get('fields'))
+        expand = parse_fieldset(request.args.get('expand'))
+        unknown = invalid_names(expand, OrderCost.EXPANDABLE)
+        if unknown:
+            return jsonify({
+                'success': False,
+                'message': f"不支持展开: {', '.join(sorted(unknown))}"
+            }), 400
+        
+        query = OrderCost.query.options(*OrderCost.serializer_options(fields, expand))
         
         # 订单号筛选
         if order_number:
@@ -50,7 +66,7 @@ def get_order_costs():
         
         return jsonify({
             'success': True,
-            'order_costs': [cost.to_dict() for cost in order_costs.items],
+            'order_costs': [cost.to_dict(fields, expand) for cost in order_costs.items],
             'pagination': {
                 'page': order_costs.page,
                 'pages': order_costs.pages,
@@ -326,10 +342,11 @@ def confirm_order_cost(cost_id):
                 'message': '只能确认待处理状态的费用记录'
             }), 400
         
-        # 确认费用（自动扣费）
+        # 确认费用（自动扣费），扣费、消耗记录和状态变更一起提交
         success, message = order_cost.confirm_costs()
         
         if success:
+            db.session.commit()
             return jsonify({
                 'success': True,
                 'message': '费用确认成功，已自动扣费',
@@ -341,6 +358,12 @@ def confirm_order_cost(cost_id):
                 'message': f'费用确认失败: {message}'
             }), 400
         
+    except StatusConflictError:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': '费用记录已被其他请求确认或修改，请刷新后重试'
+        }), 409
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Confirm order cost error: {str(e)}")
@@ -352,9 +375,15 @@ def confirm_order_cost(cost_id):
 
 @bp.route('/order-costs/batch/<batch_id>/confirm', methods=['POST'])
 def confirm_batch_order_costs(batch_id):
-    """批量确认订单费用并扣费"""
+    """批量确认订单费用并扣费
+    
+    整个批次在一个事务中完成：按账户汇总扣费金额，一条查询检查所有账户余额，
+    带 status='pending' 条件批量更新费用状态，每个账户一条原子 UPDATE 扣减，
+    消耗记录批量插入，只提交一次。
+    任一账户余额不足时整个批次都不确认。
+    """
     try:
-        order_costs = OrderCost.get_by_batch_id(batch_id)
+        order_costs = OrderCost.get_by_batch(batch_id)
         
         if not order_costs:
             return jsonify({
@@ -370,37 +399,197 @@ def confirm_batch_order_costs(batch_id):
                 'message': '批次中存在非待处理状态的费用记录'
             }), 400
         
-        success_count = 0
-        failed_orders = []
+        # 按账户汇总扣费，一次性校验所有账户余额
+        entries = [entry for cost in pending_costs for entry in cost.consumption_entries()]
+        accounts_summary = account_ledger.check_balances(account_ledger.aggregate(entries))
+        insufficient = [item for item in accounts_summary if not item['sufficient']]
+        if insufficient:
+            return jsonify({
+                'success': False,
+                'message': '账户余额不足：' + '；'.join(
+                    f"{item['account_name'] or item['account_id']} 需要{item['amount']}，余额{item['balance']}"
+                    for item in insufficient
+                ),
+                'accounts': _serialize_account_summary(accounts_summary)
+            }), 400
         
-        for order_cost in pending_costs:
-            success, message = order_cost.confirm_costs()
-            if success:
-                success_count += 1
-            else:
-                failed_orders.append({
-                    'order_number': order_cost.order_number,
-                    'error': message
-                })
+        # 先按 status='pending' 条件更新费用状态：并发确认同一批次时只有一个请求能更新全部行，
+        # 另一个请求在扣费之前就会回滚（不经过ORM事件，需要登记每日汇总表要刷新的日期）
+        result = db.session.execute(
+            update(OrderCost)
+            .where(OrderCost.id.in_([cost.id for cost in pending_costs]), OrderCost.status == 'pending')
+            .values(status='confirmed', updated_at=datetime.utcnow())
+            .execution_options(synchronize_session='fetch')
+        )
+        if result.rowcount != len(pending_costs):
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': '批次中的费用已被其他请求确认或修改，请刷新后重试'
+            }), 409
+        
+        try:
+            account_ledger.consume_many(entries)
+        except InsufficientBalanceError as e:
+            # 校验之后余额被并发请求扣减
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': f'批量确认失败: {str(e)}'
+            }), 409
         
-        if failed_orders:
+        financial_rollup.mark_days(cost.cost_date for cost in pending_costs)
+        OrderCostBatch.query.filter_by(batch_id=batch_id).update(
+            {'status': 'confirmed', 'updated_at': datetime.utcnow()}, synchronize_session=False
+        )
+        
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': f'批量确认成功：共确认 {len(pending_costs)} 条费用记录',
+            'confirmed_count': len(pending_costs),
+            'consumption_count': len(entries),
+            'accounts': _serialize_account_summary(accounts_summary)
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Confirm batch order costs error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'批量确认费用失败: {str(e)}'
+        }), 500
+
+
+def _serialize_account_summary(accounts_summary):
+    """每个账户的扣费汇总"""
+    return [{
+        'account_id': item['account_id'],
+        'account_name': item['account_name'],
+        'deducted': float(item['amount']),
+        'balance_before': float(item['balance']),
+        'balance_after': float(item['balance_after']),
+        'sufficient': item['sufficient']
+    } for item in accounts_summary]
+
+
+@bp.route('/order-costs/import', methods=['POST'])
+def import_order_cost_bill():
+    """导入4PX、方果费用账单（CSV/XLSX，multipart 上传）
+    
+    表单字段：file（账单文件）、bill_type（4px / fangguo / mixed）、cost_date（账单无日期列时使用）、
+    shipping_account_id、fangguo_account_id、batch_name、created_by、encoding（CSV编码）、dry_run
+    """
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
             return jsonify({
                 'success': False,
-                'message': f'批量确认部分失败：成功 {success_count} 条，失败 {len(failed_orders)} 条',
-                'failed_orders': failed_orders
+                'message': '请上传账单文件'
             }), 400
+        
+        cost_date = request.form.get('cost_date')
+        result = cost_bill_importer.import_bill(
+            upload.stream,
+            upload.filename,
+            bill_type=request.form.get('bill_type', 'mixed'),
+            cost_date=datetime.strptime(cost_date, '%Y-%m-%d').date() if cost_date else None,
+            shipping_account_id=request.form.get('shipping_account_id', type=int),
+            fangguo_account_id=request.form.get('fangguo_account_id', type=int),
+            batch_name=request.form.get('batch_name'),
+            created_by=request.form.get('created_by', 'system'),
+            encoding=request.form.get('encoding', 'utf-8-sig'),
+            dry_run=request.form.get('dry_run', 'false').lower() == 'true'
+        )
+        
+        if result['dry_run']:
+            message = f"校验完成：{result['imported_count']} 行可导入，{result['error_count']} 行有错误"
         else:
+            message = f"成功导入 {result['imported_count']} 条订单费用记录，{result['error_count']} 行有错误"
+        return jsonify({
+            'success': result['imported_count'] > 0 or result['error_count'] == 0,
+            'message': message,
+            **result
+        }), 201 if result['imported_count'] and not result['dry_run'] else 200
+        
+    except (CostBillImportError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Import order cost bill error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'导入费用账单失败: {str(e)}'
+        }), 500
+
+
+@bp.route('/order-costs/reconcile', methods=['POST'])
+def reconcile_order_cost_bill():
+    """供应商账单对账（CSV/XLSX，multipart 上传，只读）
+    
+    表单字段：file（账单文件）、bill_type（4px / fangguo / mixed）、start_date、end_date、
+    tolerance（允许的金额误差）、encoding（CSV编码）、format（json / csv / xlsx）、
+    include_matched（json 格式是否返回金额一致的明细）
+    """
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({
+                'success': False,
+                'message': '请上传账单文件'
+            }), 400
+        
+        report_format = request.form.get('format', 'json')
+        if report_format not in ('json', 'csv', 'xlsx'):
+            return jsonify({
+                'success': False,
+                'message': f'不支持的报告格式: {report_format}'
+            }), 400
+        
+        start_date = request.form.get('start_date')
+        end_date = request.form.get('end_date')
+        report = cost_reconciler.reconcile(
+            upload.stream,
+            upload.filename,
+            bill_type=request.form.get('bill_type', '4px'),
+            start_date=datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None,
+            end_date=datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None,
+            tolerance=request.form.get('tolerance', '0.01'),
+            encoding=request.form.get('encoding', 'utf-8-sig')
+        )
+        
+        summary = report['summary']
+        if report_format == 'json':
+            if request.form.get('include_matched', 'false').lower() != 'true':
+                report['matched'] = []
             return jsonify({
                 'success': True,
-                'message': f'批量确认成功：共确认 {success_count} 条费用记录'
+                **report
             })
         
+        content = cost_reconciler.to_csv(report) if report_format == 'csv' else cost_reconciler.to_xlsx(report)
+        return send_file(
+            io.BytesIO(content),
+            mimetype='text/csv' if report_format == 'csv' else
+            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=f"reconciliation_{summary['bill_type']}_{summary['start_date']}_{summary['end_date']}.{report_format}"
+        )
+        
+    except (CostBillImportError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
-        db.session.rollback()
-        current_app.logger.error(f"Confirm batch order costs error: {str(e)}")
+        current_app.logger.error(f"Reconcile order cost bill error: {str(e)}")
         return jsonify({
             'success': False,
-            'message': f'批量确认费用失败: {str(e)}'
+            'message': f'账单对账失败: {str(e)}'
         }), 500
 
 
@@ -4,9 +4,17 @@ from app.models.order import Order
 from app.models.payment import Payment
 from app import db
 from datetime import datetime, timedelta
+from app.services.order_search import order_search
+from app.utils.date_ranges import day_range
+from app.utils.fieldsets import invalid_names, parse_fieldset
+from app.utils.pagination import keyset_paginate
 from sqlalchemy import desc, asc, and_, or_
 
 
+# 游标分页允许的排序列（必须非空，与 id 组成唯一的排序键）
+KEYSET_SORT_COLUMNS = ('created_at', 'order_date', 'total_price', 'order_number', 'id')
+
+
 @bp.route('/orders', methods=['GET'])
 def get_orders():
     """获取订单列表"""
@@ -25,8 +33,18 @@ def get_orders():
         sort_by = request.args.get('sort_by', 'created_at')
         sort_order = request.args.get('sort_order', 'desc')
         
-        # 构建查询
-        query = Order.query
+        # 稀疏字段：fields= 只返回指定字段，expand= 展开关联数据
+        fields = parse_fieldset(request.args.get('fields'))
+        expand = parse_fieldset(request.args.get('expand'))
+        unknown = invalid_names(expand, Order.EXPANDABLE)
+        if unknown:
+            return jsonify({
+                'success': False,
+                'message': f"不支持展开: {', '.join(sorted(unknown))}"
+            }), 400
+        
+        # 构建查询（只预加载请求的字段需要的关联数据）
+        query = Order.query.options(*Order.serializer_options(fields, expand))
         
         # 应用筛选条件
         if financial_status:
@@ -60,14 +78,39 @@ def get_orders():
                 }), 400
         
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                or_(
-                    Order.order_number.ilike(search_term),
-                    Order.customer_email.ilike(search_term),
-                    Order.customer_name.ilike(search_term)
+            # 通过全文搜索索引做前缀匹配（订单号、客户邮箱、客户姓名）
+            query = order_search.filter(query, search)
+        
+        # 游标分页：传入 cursor 或 pagination=keyset 时启用，不执行 COUNT(*) 和 OFFSET
+        if request.args.get('cursor') or request.args.get('pagination') == 'keyset':
+            if sort_by not in KEYSET_SORT_COLUMNS:
+                return jsonify({
+                    'success': False,
+                    'message': f'游标分页不支持按 {sort_by} 排序'
+                }), 400
+            try:
+                page_result = keyset_paginate(
+                    query,
+                    getattr(Order, sort_by),
+                    Order.id,
+                    sort_order='asc' if sort_order == 'asc' else 'desc',
+                    per_page=per_page,
+                    cursor=request.args.get('cursor'),
+                    include_total=request.args.get('include_total', 'false').lower() == 'true'
                 )
-            )
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': str(e)
+                }), 400
+
+            return jsonify({
+                'success': True,
+                'data': {
+                    'orders': Order.to_dict_list(page_result.items, fields, expand),
+                    'pagination': page_result.to_dict()
+                }
+            })
         
         # 应用排序
         if hasattr(Order, sort_by):
@@ -88,8 +131,8 @@ def get_orders():
         
         orders = pagination.items
         
-        # 转换订单数据（费用分摊已在to_dict方法中处理）
-        orders_data = [order.to_dict() for order in orders]
+        # 转换订单数据（费用分摊已在to_dict方法中处理，批量序列化避免逐条查询）
+        orders_data = Order.to_dict_list(orders, fields, expand)
         
         return jsonify({
             'success': True,
@@ -118,12 +161,12 @@ def get_orders():
 def get_order(order_id):
     """获取单个订单详情"""
     try:
-        order = Order.query.get_or_404(order_id)
+        order = Order.query.options(*Order.serializer_options()).get_or_404(order_id)
         
         # 获取支付记录
         payments = Payment.query.filter_by(order_id=order_id).all()
         
-        order_data = order.to_dict()
+        order_data = Order.to_dict_list([order])[0]
         order_data['payments'] = [payment.to_dict() for payment in payments]
         
         return jsonify({
@@ -182,11 +225,13 @@ def get_recent_orders():
     try:
         limit = min(request.args.get('limit', 10, type=int), 50)
         
-        orders = Order.query.order_by(desc(Order.created_at)).limit(limit).all()
+        orders = Order.query.options(
+            *Order.serializer_options()
+        ).order_by(desc(Order.created_at)).limit(limit).all()
         
         return jsonify({
             'success': True,
-            'data': [order.to_dict() for order in orders]
+            'data': Order.to_dict_list(orders)
         })
         
     except Exception as e:
@@ -215,7 +260,7 @@ def get_order_stats():
         ).scalar() or 0
         
         # 今日统计
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        today_start = day_range(datetime.now())[0]
         today_orders = Order.query.filter(Order.created_at >= today_start).count()
         today_revenue = db.session.query(db.func.sum(Order.total_price)).filter(
             Order.created_at >= today_start
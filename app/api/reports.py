@@ -1,10 +1,16 @@
 from flask import request, jsonify
-from app.models import Order, Expense, Account, OrderCost
+from app.models import DailyFinancial
 from app import db
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_
+from sqlalchemy import func
 from app.api import bp
-from app.services.exchange_rate_service import exchange_rate_service
+from app.utils.date_ranges import date_bucket
+
+# 报表数据均来自每日财务汇总表 daily_financials（订单、费用、订单成本写入时增量维护，
+# 历史数据可用 `flask rebuild-daily-financials` 回填），查询耗时与历史数据量无关。
+
+def _sum_column(column):
+    return func.coalesce(func.sum(column), 0)
 
 @bp.route('/reports/financial-summary', methods=['GET'])
 def get_financial_summary():
@@ -27,58 +33,25 @@ def get_financial_summary():
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        # 计算总收入（订单金额，统一换算为人民币）
-        orders = db.session.query(Order).filter(
-            and_(Order.created_at >= start_date, Order.created_at <= end_date)
-        ).all()
-        
-        total_revenue_cny = 0
-        for order in orders:
-            # 只统计已支付且有实际到账金额的订单
-            if (order.financial_status in ['paid', 'partially_paid'] and 
-                order.actual_received and order.currency):
-                if order.currency == 'CNY':
-                    total_revenue_cny += float(order.actual_received)
-                else:
-                    # 将其他货币换算为人民币
-                    total_revenue_cny += float(exchange_rate_service.convert_to_cny(
-                        float(order.actual_received), order.currency
-                    ))
-        
-        # 计算总费用（费用记录 + 订单成本，统一换算为人民币）
-        expenses = db.session.query(Expense).filter(
-            and_(Expense.expense_date >= start_date, Expense.expense_date <= end_date)
-        ).all()
-        
-        expense_total_cny = 0
-        for expense in expenses:
-            if expense.amount and expense.currency:
-                if expense.currency == 'CNY':
-                    expense_total_cny += float(expense.amount)
-                else:
-                    # 将其他货币换算为人民币
-                    expense_total_cny += float(exchange_rate_service.convert_to_cny(
-                        float(expense.amount), expense.currency
-                    ))
-        
-        # 计算订单费用总额（物流费用 + 方果费用 + 其他费用，已经是人民币）
-        order_cost_total = db.session.query(
-            func.sum(OrderCost.shipping_cost + OrderCost.fangguo_cost + OrderCost.other_cost)
+        # 收入、费用、订单成本、订单数量（人民币）
+        totals = db.session.query(
+            _sum_column(DailyFinancial.revenue_cny).label('revenue'),
+            _sum_column(DailyFinancial.expense_cny).label('expense'),
+            _sum_column(DailyFinancial.order_cost_cny).label('order_cost'),
+            _sum_column(DailyFinancial.order_count).label('order_count')
         ).filter(
-            and_(OrderCost.cost_date >= start_date, OrderCost.cost_date <= end_date,
-                 OrderCost.status == 'confirmed')
-        ).scalar() or 0
+            DailyFinancial.date >= start_date, DailyFinancial.date <= end_date
+        ).one()
         
-        total_expenses_cny = expense_total_cny + float(order_cost_total)
+        total_revenue_cny = float(totals.revenue)
+        total_expenses_cny = float(totals.expense) + float(totals.order_cost)
         
         # 计算利润（人民币）
         total_profit_cny = total_revenue_cny - total_expenses_cny
         profit_margin = (total_profit_cny / total_revenue_cny * 100) if total_revenue_cny > 0 else 0
         
         # 订单数量
-        order_count = db.session.query(func.count(Order.id)).filter(
-            and_(Order.created_at >= start_date, Order.created_at <= end_date)
-        ).scalar() or 0
+        order_count = int(totals.order_count)
         
         return jsonify({
             'success': True,
@@ -115,27 +88,11 @@ def get_financial_report():
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        # 根据报表类型生成数据
+        # 根据报表类型生成数据（每个数据源一条分组查询，按日/按月分桶）
         financial_data = []
         
-        if report_type == 'daily':
-            # 按日统计
-            current_date = start_date
-            while current_date <= end_date:
-                daily_data = _get_daily_financial_data(current_date)
-                financial_data.append(daily_data)
-                current_date += timedelta(days=1)
-        elif report_type == 'monthly':
-            # 按月统计
-            current_date = start_date.replace(day=1)
-            while current_date <= end_date:
-                monthly_data = _get_monthly_financial_data(current_date.year, current_date.month)
-                financial_data.append(monthly_data)
-                # 移动到下个月
-                if current_date.month == 12:
-                    current_date = current_date.replace(year=current_date.year + 1, month=1)
-                else:
-                    current_date = current_date.replace(month=current_date.month + 1)
+        if report_type in ('daily', 'monthly'):
+            financial_data = _get_bucketed_financial_data(start_date, end_date, report_type)
         
         # 计算汇总数据
         total_income = float(sum(item['income'] for item in financial_data))
@@ -167,126 +124,48 @@ def get_financial_report():
             'traceback': error_details
         }), 500
 
-def _get_daily_financial_data(date):
-    """获取指定日期的财务数据"""
-    # 计算当日收入（统一换算为人民币）
-    daily_orders = db.session.query(Order).filter(
-        func.date(Order.created_at) == date
-    ).all()
-    
-    daily_income = 0.0
-    for order in daily_orders:
-        # 只统计已支付且有实际到账金额的订单
-        if (order.financial_status in ['paid', 'partially_paid'] and 
-            order.actual_received and order.currency):
-            if order.currency == 'CNY':
-                daily_income += float(order.actual_received)
-            else:
-                daily_income += float(exchange_rate_service.convert_to_cny(
-                    float(order.actual_received), order.currency
-                ))
-    
-    # 计算当日费用（统一换算为人民币）
-    daily_expenses = db.session.query(Expense).filter(
-        func.date(Expense.expense_date) == date
-    ).all()
-    
-    daily_expense = 0.0
-    for expense in daily_expenses:
-        if expense.amount and expense.currency:
-            if expense.currency == 'CNY':
-                daily_expense += float(expense.amount)
-            else:
-                daily_expense += float(exchange_rate_service.convert_to_cny(
-                    float(expense.amount), expense.currency
-                ))
-    
-    # 计算当日订单成本
-    daily_order_costs = db.session.query(OrderCost).join(Order).filter(
-        func.date(Order.created_at) == date
-    ).all()
-    
-    for cost in daily_order_costs:
-        if cost.amount and cost.currency:
-            if cost.currency == 'CNY':
-                daily_expense += float(cost.amount)
-            else:
-                daily_expense += float(exchange_rate_service.convert_to_cny(
-                    float(cost.amount), cost.currency
-                ))
-    
-    daily_profit = float(daily_income) - float(daily_expense)
-    
-    return {
-        'date': date.isoformat(),
-        'income': round(daily_income, 2),
-        'expense': round(daily_expense, 2),
-        'profit': round(daily_profit, 2)
-    }
-
-def _get_monthly_financial_data(year, month):
-    """获取指定月份的财务数据"""
-    # 计算月份的开始和结束日期
-    start_date = datetime(year, month, 1).date()
-    if month == 12:
-        end_date = datetime(year + 1, 1, 1).date() - timedelta(days=1)
+def _get_bucketed_financial_data(start_date, end_date, report_type):
+    """按日/按月汇总财务数据（一条分组查询读取每日汇总表）"""
+    # 计算分桶列表和查询范围（按月统计时覆盖首尾月份的完整月份）
+    buckets = []
+    if report_type == 'daily':
+        range_start, range_end = start_date, end_date
+        current_date = start_date
+        while current_date <= end_date:
+            buckets.append(current_date.isoformat())
+            current_date += timedelta(days=1)
     else:
-        end_date = datetime(year, month + 1, 1).date() - timedelta(days=1)
-    
-    # 计算月收入（统一换算为人民币）
-    monthly_orders = db.session.query(Order).filter(
-        and_(Order.created_at >= start_date, Order.created_at <= end_date)
-    ).all()
-    
-    monthly_income = 0.0
-    for order in monthly_orders:
-        # 只统计已支付且有实际到账金额的订单
-        if (order.financial_status in ['paid', 'partially_paid'] and 
-            order.actual_received and order.currency):
-            if order.currency == 'CNY':
-                monthly_income += float(order.actual_received)
-            else:
-                monthly_income += float(exchange_rate_service.convert_to_cny(
-                    float(order.actual_received), order.currency
-                ))
-    
-    # 计算月费用（统一换算为人民币）
-    monthly_expenses = db.session.query(Expense).filter(
-        and_(Expense.expense_date >= start_date, Expense.expense_date <= end_date)
-    ).all()
-    
-    monthly_expense = 0.0
-    for expense in monthly_expenses:
-        if expense.amount and expense.currency:
-            if expense.currency == 'CNY':
-                monthly_expense += float(expense.amount)
-            else:
-                monthly_expense += float(exchange_rate_service.convert_to_cny(
-                    float(expense.amount), expense.currency
-                ))
-    
-    # 计算月订单成本
-    monthly_order_costs = db.session.query(OrderCost).join(Order).filter(
-        and_(Order.created_at >= start_date, Order.created_at <= end_date)
-    ).all()
-    
-    for cost in monthly_order_costs:
-        if cost.amount and cost.currency:
-            if cost.currency == 'CNY':
-                monthly_expense += float(cost.amount)
+        range_start = start_date.replace(day=1)
+        current_date = range_start
+        while current_date <= end_date:
+            buckets.append(f'{current_date.year}-{current_date.month:02d}')
+            # 移动到下个月
+            if current_date.month == 12:
+                current_date = current_date.replace(year=current_date.year + 1, month=1)
             else:
-                monthly_expense += float(exchange_rate_service.convert_to_cny(
-                    float(cost.amount), cost.currency
-                ))
+                current_date = current_date.replace(month=current_date.month + 1)
+        range_end = current_date - timedelta(days=1)
     
-    monthly_profit = float(monthly_income) - float(monthly_expense)
+    bucket = date_bucket(DailyFinancial.date, report_type)
+    rows = db.session.query(
+        bucket.label('bucket'),
+        _sum_column(DailyFinancial.revenue_cny).label('income'),
+        (_sum_column(DailyFinancial.expense_cny) + _sum_column(DailyFinancial.order_cost_cny)).label('expense')
+    ).filter(
+        DailyFinancial.date >= range_start, DailyFinancial.date <= range_end
+    ).group_by(bucket).all()
+    totals = {row.bucket: (float(row.income), float(row.expense)) for row in rows}
     
-    return {
-        'date': f'{year}-{month:02d}',
-        'income': round(monthly_income, 2),
-        'expense': round(monthly_expense, 2),
-        'profit': round(monthly_profit, 2)
-    }
+    financial_data = []
+    for key in buckets:
+        income, expense = totals.get(key, (0.0, 0.0))
+        financial_data.append({
+            'date': key,
+            'income': round(income, 2),
+            'expense': round(expense, 2),
+            'profit': round(income - expense, 2)
+        })
+    return financial_data
 
 @bp.route('/reports/revenue-trend', methods=['GET'])
 def get_revenue_trend():
@@ -302,39 +181,23 @@ def get_revenue_trend():
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        # 按日期分组统计收入（统一换算为人民币）
+        # 按日期统计收入（人民币）和订单数，只返回有订单的日期
         revenue_data = db.session.query(
-            func.date(Order.created_at).label('date'),
-            func.count(Order.id).label('order_count')
+            DailyFinancial.date,
+            _sum_column(DailyFinancial.revenue_cny).label('revenue'),
+            _sum_column(DailyFinancial.order_count).label('order_count')
         ).filter(
-            and_(Order.created_at >= start_date, Order.created_at <= end_date)
-        ).group_by(func.date(Order.created_at)).order_by('date').all()
+            DailyFinancial.date >= start_date, DailyFinancial.date <= end_date
+        ).group_by(DailyFinancial.date).having(
+            func.sum(DailyFinancial.order_count) > 0
+        ).order_by(DailyFinancial.date).all()
         
         trend_data = []
         for item in revenue_data:
-            # 获取当天的所有订单
-            daily_orders = db.session.query(Order).filter(
-                func.date(Order.created_at) == item.date
-            ).all()
-            
-            # 计算当天收入（人民币）- 只统计实际到账金额
-            daily_revenue_cny = 0
-            for order in daily_orders:
-                # 只统计已支付且有实际到账金额的订单
-                if (order.financial_status in ['paid', 'partially_paid'] and 
-                    order.actual_received and order.currency):
-                    if order.currency == 'CNY':
-                        daily_revenue_cny += float(order.actual_received)
-                    else:
-                        # 将其他货币换算为人民币
-                        daily_revenue_cny += float(exchange_rate_service.convert_to_cny(
-                            float(order.actual_received), order.currency
-                        ))
-            
             trend_data.append({
-                'date': str(item.date),
-                'revenue': round(daily_revenue_cny, 2),
-                'order_count': item.order_count,
+                'date': item.date.isoformat(),
+                'revenue': round(float(item.revenue), 2),
+                'order_count': int(item.order_count),
                 'currency': 'CNY'
             })
         
@@ -355,42 +218,26 @@ def get_expense_analysis():
         end_date = datetime.now().date()
         start_date = end_date - timedelta(days=150)  # 5个月
         
-        # 查询日期范围已设置为5个月
-        
-        # 按月份统计费用（统一换算为人民币）
+        # 按月份统计费用（人民币），只返回有费用的月份
+        month = date_bucket(DailyFinancial.date, 'monthly')
         monthly_expenses = db.session.query(
-            func.strftime('%Y-%m', Expense.expense_date).label('month')
+            month.label('month'),
+            _sum_column(DailyFinancial.expense_cny).label('total')
         ).filter(
-            Expense.expense_date >= start_date,
-            Expense.expense_date <= end_date
-        ).group_by(func.strftime('%Y-%m', Expense.expense_date)).all()
+            DailyFinancial.date >= start_date,
+            DailyFinancial.date <= end_date
+        ).group_by(month).having(
+            func.sum(DailyFinancial.expense_cny) != 0
+        ).order_by(month).all()
         
         # 转换为图表数据格式
         expense_data = []
         for item in monthly_expenses:
-            # 获取当月的所有费用
-            month_expenses = db.session.query(Expense).filter(
-                func.strftime('%Y-%m', Expense.expense_date) == item.month
-            ).all()
-            
-            # 计算当月费用总额（人民币）
-            monthly_total_cny = 0
-            for expense in month_expenses:
-                if expense.amount and expense.currency:
-                    if expense.currency == 'CNY':
-                        monthly_total_cny += float(expense.amount)
-                    else:
-                        # 将其他货币换算为人民币
-                        monthly_total_cny += float(exchange_rate_service.convert_to_cny(
-                            float(expense.amount), expense.currency
-                        ))
-            
             expense_data.append({
                 'month': item.month,
-                'value': round(monthly_total_cny, 2),
+                'value': round(float(item.total), 2),
                 'currency': 'CNY'
             })
-            print(f"月份: {item.month}, 金额: {monthly_total_cny} CNY")  # 调试信息
         
         return jsonify({
             'success': True,
@@ -416,53 +263,22 @@ def get_profit_analysis():
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
         
+        # 按日期读取每日收入和支出（人民币）
+        rows = db.session.query(
+            DailyFinancial.date,
+            _sum_column(DailyFinancial.revenue_cny).label('revenue'),
+            (_sum_column(DailyFinancial.expense_cny) + _sum_column(DailyFinancial.order_cost_cny)).label('expenses')
+        ).filter(
+            DailyFinancial.date >= start_date, DailyFinancial.date <= end_date
+        ).group_by(DailyFinancial.date).all()
+        totals = {row.date: (float(row.revenue), float(row.expenses)) for row in rows}
+        
         # 按日期计算每日利润
         daily_profit = []
         current_date = start_date
         
         while current_date <= end_date:
-            # 当日收入（统一换算为人民币）
-            daily_orders = db.session.query(Order).filter(
-                func.date(Order.created_at) == current_date
-            ).all()
-            
-            daily_revenue_cny = 0
-            for order in daily_orders:
-                # 只统计已支付且有实际到账金额的订单
-                if (order.financial_status in ['paid', 'partially_paid'] and 
-                    order.actual_received and order.currency):
-                    if order.currency == 'CNY':
-                        daily_revenue_cny += float(order.actual_received)
-                    else:
-                        # 将其他货币换算为人民币
-                        daily_revenue_cny += float(exchange_rate_service.convert_to_cny(
-                            float(order.actual_received), order.currency
-                        ))
-            
-            # 当日费用（统一换算为人民币）
-            daily_expenses = db.session.query(Expense).filter(
-                Expense.expense_date == current_date
-            ).all()
-            
-            daily_expense_cny = 0
-            for expense in daily_expenses:
-                if expense.amount and expense.currency:
-                    if expense.currency == 'CNY':
-                        daily_expense_cny += float(expense.amount)
-                    else:
-                        # 将其他货币换算为人民币
-                        daily_expense_cny += float(exchange_rate_service.convert_to_cny(
-                            float(expense.amount), expense.currency
-                        ))
-            
-            # 当日订单成本（物流+方果+其他，已经是人民币）
-            daily_order_cost = db.session.query(
-                func.sum(OrderCost.shipping_cost + OrderCost.fangguo_cost + OrderCost.other_cost)
-            ).filter(
-                and_(OrderCost.cost_date == current_date, OrderCost.status == 'confirmed')
-            ).scalar() or 0
-            
-            daily_total_cost_cny = daily_expense_cny + float(daily_order_cost)
+            daily_revenue_cny, daily_total_cost_cny = totals.get(current_date, (0.0, 0.0))
             daily_net_profit_cny = daily_revenue_cny - daily_total_cost_cny
             
             daily_profit.append({
@@ -2,6 +2,7 @@ from flask import request, jsonify
 from app.api import bp
 from app.models import db, ShopifyConfig, FeeConfig
 from app.services.shopify_service import ShopifyService
+from app.services.fee_engine import fee_engine
 from datetime import datetime
 
 @bp.route('/settings/shopify', methods=['GET'])
@@ -261,6 +262,7 @@ def create_fee_config():
         
         db.session.add(config)
         db.session.commit()
+        fee_engine.invalidate()
         
         return jsonify({
             'success': True,
@@ -323,6 +325,7 @@ def update_fee_config(fee_id):
         config.updated_at = datetime.utcnow()
         
         db.session.commit()
+        fee_engine.invalidate()
         
         return jsonify({
             'success': True,
@@ -343,6 +346,7 @@ def delete_fee_config(fee_id):
         config.updated_at = datetime.utcnow()
         
         db.session.commit()
+        fee_engine.invalidate()
         
         return jsonify({
             'success': True,
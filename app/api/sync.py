@@ -3,6 +3,7 @@ from app.api import bp
 from app.services.shopify_service import shopify_service
 from app.models.order import Order
 from app.models.product import Product
+from app.models.sync_state import SyncState
 from app import db
 from datetime import datetime, timedelta
 
@@ -132,6 +133,37 @@ def sync_recent_orders():
         }), 500
 
 
+@bp.route('/sync/incremental', methods=['POST'])
+def sync_incremental_orders():
+    """基于updated_at水位线增量同步订单"""
+    try:
+        data = request.get_json() or {}
+        fallback_hours = data.get('fallback_hours', 24)
+        
+        # 验证参数
+        if fallback_hours < 1 or fallback_hours > 168:  # 最多一周
+            return jsonify({
+                'success': False,
+                'message': '回溯小时数必须在1-168之间'
+            }), 400
+        
+        # 执行同步
+        stats = shopify_service.sync_incremental_orders(fallback_hours=fallback_hours)
+        
+        return jsonify({
+            'success': True,
+            'message': '增量订单同步完成',
+            'stats': stats
+        })
+        
+    except Exception as e:
+        current_app.logger.error(f"Incremental orders sync error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'增量订单同步失败: {str(e)}'
+        }), 500
+
+
 @bp.route('/sync/status', methods=['GET'])
 def get_sync_status():
     """获取同步状态统计"""
@@ -150,6 +182,9 @@ def get_sync_status():
         last_order = Order.query.order_by(Order.updated_at.desc()).first()
         last_sync_time = last_order.updated_at.isoformat() if last_order else None
         
+        # 获取增量同步水位线
+        sync_states = [state.to_dict() for state in SyncState.query.all()]
+        
         return jsonify({
             'success': True,
             'data': {
@@ -161,7 +196,8 @@ def get_sync_status():
                     'total': total_products,
                     'active': active_products
                 },
-                'last_sync_time': last_sync_time
+                'last_sync_time': last_sync_time,
+                'sync_states': sync_states
             }
         })
         
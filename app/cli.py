@@ -0,0 +1,146 @@
+import click
+from datetime import datetime
+
+
+def register_commands(app):
+    """注册Flask命令行命令"""
+
+    @app.cli.command('rebuild-daily-financials')
+    @click.option('--start', 'start_date', help='开始日期 YYYY-MM-DD（默认最早的业务数据日期）')
+    @click.option('--end', 'end_date', help='结束日期 YYYY-MM-DD（默认最晚的业务数据日期）')
+    def rebuild_daily_financials(start_date, end_date):
+        """重建每日财务汇总表（daily_financials），用于历史数据回填"""
+        from app.services.financial_rollup import financial_rollup
+
+        start = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        end = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+
+        click.echo('正在重建每日财务汇总表...')
+        stats = financial_rollup.rebuild(start, end)
+        click.echo(f"重建完成：{stats['days']} 天，{stats['rows']} 条汇总记录")
+
+    @app.cli.command('rebuild-expense-allocations')
+    def rebuild_expense_allocations():
+        """重新计算全部费用分摊到订单的金额（expense_allocations），用于历史数据回填"""
+        from app.services.expense_allocation import expense_allocation
+
+        click.echo('正在重建费用分摊表...')
+        count = expense_allocation.rebuild()
+        click.echo(f'重建完成：{count} 条分摊记录')
+
+    @app.cli.command('load-exchange-rates')
+    @click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+    def load_exchange_rates(csv_path):
+        """从CSV导入历史汇率（表头：date,from_currency,to_currency,rate[,source]）"""
+        from app.services.exchange_rate_service import exchange_rate_service
+
+        click.echo(f'正在导入历史汇率: {csv_path}')
+        count = exchange_rate_service.load_rates_from_csv(csv_path)
+        click.echo(f'导入完成：{count} 条汇率')
+
+    @app.cli.command('rebuild-order-search')
+    def rebuild_order_search():
+        """重建订单全文搜索索引（SQLite FTS5），用于回填或修复"""
+        from app.services.order_search import order_search
+
+        click.echo('正在重建订单搜索索引...')
+        count = order_search.rebuild()
+        click.echo(f'重建完成：{count} 个订单')
+
+    @app.cli.command('explain-hot-queries')
+    @click.option('--verbose', '-v', is_flag=True, help='输出每条查询的执行计划')
+    def explain_hot_queries(verbose):
+        """对登记的热点查询执行 EXPLAIN，出现全表扫描时以非零状态退出"""
+        from app.services.query_audit import query_audit
+
+        results = query_audit.audit()
+        failed = [result for result in results if result['full_scan']]
+        for result in results:
+            click.echo(f"[{'FULL SCAN' if result['full_scan'] else 'OK'}] {result['name']}")
+            if verbose or result['full_scan']:
+                for line in result['plan']:
+                    click.echo(f'    {line}')
+
+        click.echo(f'共 {len(results)} 条查询，{len(failed)} 条全表扫描')
+        if failed:
+            raise SystemExit(1)
+
+    @app.cli.command('import-cost-bill')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--type', 'bill_type', type=click.Choice(['4px', 'fangguo', 'mixed']), default='mixed',
+                  help='账单类型：4px（金额列为物流费用）、fangguo（金额列为方果费用）、mixed（按列区分）')
+    @click.option('--cost-date', help='账单没有日期列时使用的费用日期 YYYY-MM-DD')
+    @click.option('--shipping-account-id', type=int, help='物流费用扣费账户ID')
+    @click.option('--fangguo-account-id', type=int, help='方果费用扣费账户ID')
+    @click.option('--batch-name', help='批次名称')
+    @click.option('--encoding', default='utf-8-sig', help='CSV文件编码（Excel导出的中文CSV通常为 gbk）')
+    @click.option('--dry-run', is_flag=True, help='只校验不写入')
+    def import_cost_bill(path, bill_type, cost_date, shipping_account_id, fangguo_account_id,
+                         batch_name, encoding, dry_run):
+        """导入4PX、方果费用账单（CSV/XLSX），生成一个待确认的费用批次"""
+        import os
+        from app.services.cost_bill_import import cost_bill_importer
+
+        click.echo(f'正在导入费用账单: {path}')
+        with open(path, 'rb') as bill_file:
+            result = cost_bill_importer.import_bill(
+                bill_file,
+                os.path.basename(path),
+                bill_type=bill_type,
+                cost_date=datetime.strptime(cost_date, '%Y-%m-%d').date() if cost_date else None,
+                shipping_account_id=shipping_account_id,
+                fangguo_account_id=fangguo_account_id,
+                batch_name=batch_name,
+                created_by='cli',
+                encoding=encoding,
+                dry_run=dry_run
+            )
+
+        for error in result['errors']:
+            click.echo(f"第{error['row']}行 {error['order_number'] or ''}: {error['message']}")
+        if result['errors_truncated']:
+            click.echo(f"……共 {result['error_count']} 行错误，仅显示前 {len(result['errors'])} 行")
+        if dry_run:
+            click.echo(f"校验完成：{result['imported_count']} 行可导入，{result['error_count']} 行有错误")
+        else:
+            click.echo(f"导入完成：批次 {result['batch']['batch_id']}，"
+                       f"{result['imported_count']} 条费用，{result['error_count']} 行有错误")
+
+    @app.cli.command('reconcile-cost-bill')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--type', 'bill_type', type=click.Choice(['4px', 'fangguo', 'mixed']), default='4px',
+                  help='账单类型：4px（对比物流费用）、fangguo（对比方果费用）、mixed（三类费用分别对比）')
+    @click.option('--start', 'start_date', help='开始日期 YYYY-MM-DD（默认账单最早日期）')
+    @click.option('--end', 'end_date', help='结束日期 YYYY-MM-DD（默认账单最晚日期）')
+    @click.option('--tolerance', default='0.01', help='允许的金额误差')
+    @click.option('--encoding', default='utf-8-sig', help='CSV文件编码（Excel导出的中文CSV通常为 gbk）')
+    @click.option('--output', '-o', type=click.Path(dir_okay=False), help='报告输出路径（.csv 或 .xlsx）')
+    def reconcile_cost_bill(path, bill_type, start_date, end_date, tolerance, encoding, output):
+        """供应商账单与已录入订单费用对账，输出汇总并可导出明细报告"""
+        import os
+        from app.services.cost_reconciliation import cost_reconciler
+
+        click.echo(f'正在对账: {path}')
+        with open(path, 'rb') as bill_file:
+            report = cost_reconciler.reconcile(
+                bill_file,
+                os.path.basename(path),
+                bill_type=bill_type,
+                start_date=datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None,
+                end_date=datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None,
+                tolerance=tolerance,
+                encoding=encoding
+            )
+
+        summary = report['summary']
+        click.echo(f"对账范围：{summary['start_date']} ~ {summary['end_date']}")
+        for category in cost_reconciler.CATEGORIES:
+            click.echo(f"{cost_reconciler.CATEGORY_NAMES[category]}：{summary[f'{category}_count']} 个订单，"
+                       f"账单 {summary[f'{category}_bill_amount']}，系统 {summary[f'{category}_ledger_amount']}")
+        click.echo(f"无法解析的行：{summary['invalid_rows']}")
+
+        if output:
+            content = cost_reconciler.to_xlsx(report) if output.lower().endswith('.xlsx') else cost_reconciler.to_csv(report)
+            with open(output, 'wb') as report_file:
+                report_file.write(content)
+            click.echo(f'报告已导出: {output}')
@@ -2,6 +2,9 @@ from flask import render_template, request, jsonify, redirect, url_for
 from app.main import bp
 from app.models import Order, Expense, FeeConfig, Account, Recharge, Consumption
 from app import db
+from app.services.order_search import order_search
+from app.utils.date_ranges import day_range, in_range, month_range
+from app.utils.pagination import keyset_paginate
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_
 
@@ -18,16 +21,16 @@ def dashboard():
     
     # 今日订单统计
     today_orders = Order.query.filter(
-        func.date(Order.order_date) == today
+        in_range(Order.order_date, *day_range(today))
     ).all()
     
     today_revenue = sum([order.total_price or 0 for order in today_orders])
     today_profit = sum([order.gross_profit or 0 for order in today_orders])
     
     # 本月统计
-    month_start = today.replace(day=1)
+    month_start, month_end = month_range(today)
     month_orders = Order.query.filter(
-        Order.order_date >= month_start
+        in_range(Order.order_date, month_start, month_end)
     ).all()
     
     month_revenue = sum([order.total_price or 0 for order in month_orders])
@@ -35,7 +38,7 @@ def dashboard():
     
     # 本月费用
     month_expenses = Expense.query.filter(
-        Expense.expense_date >= month_start
+        in_range(Expense.expense_date, month_start, month_end)
     ).all()
     
     month_expense_total = sum([expense.amount or 0 for expense in month_expenses])
@@ -87,36 +90,44 @@ def orders():
     
     # 应用搜索条件
     if search_order:
-        query = query.filter(Order.order_number.like(f'%{search_order}%'))
+        query = order_search.filter(query, search_order, columns=['order_number'])
     
     if search_email:
-        query = query.filter(Order.customer_email.like(f'%{search_email}%'))
+        query = order_search.filter(query, search_email, columns=['customer_email'])
     
     if status:
         query = query.filter(Order.financial_status == status)
     
-    # 应用日期筛选
+    # 应用日期筛选（包含结束日期当天，转换为半开区间以使用 order_date 索引）
     if start_date:
         try:
             start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-            query = query.filter(func.date(Order.order_date) >= start_date_obj)
+            query = query.filter(Order.order_date >= day_range(start_date_obj)[0])
         except ValueError:
             pass
     
     if end_date:
         try:
             end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-            query = query.filter(func.date(Order.order_date) <= end_date_obj)
+            query = query.filter(Order.order_date < day_range(end_date_obj)[1])
         except ValueError:
             pass
     
-    # 分页查询
-    orders = query.order_by(Order.order_date.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # 分页查询：带 cursor（或 pagination=keyset）时使用游标分页，深页与首页同样快
+    cursor = request.args.get('cursor', '').strip()
+    if cursor or request.args.get('pagination') == 'keyset':
+        try:
+            orders = keyset_paginate(query, Order.order_date, Order.id, 'desc', per_page, cursor or None)
+        except ValueError:
+            orders = keyset_paginate(query, Order.order_date, Order.id, 'desc', per_page)
+    else:
+        orders = query.order_by(Order.order_date.desc(), Order.id.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
     
     return render_template('orders.html', 
                          orders=orders, 
+                         cursor=cursor,
                          search_order=search_order, 
                          search_email=search_email,
                          status=status,
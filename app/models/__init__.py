@@ -8,6 +8,11 @@ from .product import Product
 from .account import Account, Recharge, Consumption
 from .order_cost import OrderCost, OrderCostBatch
 from .expense_order import ExpenseOrder
+from .expense_allocation import ExpenseAllocation
 from .platform_account import PlatformAccount
+from .sync_state import SyncState
+from .webhook_event import WebhookEvent
+from .daily_financial import DailyFinancial
+from .exchange_rate import ExchangeRate
 
-__all__ = ['db', 'Order', 'Payment', 'Expense', 'FeeConfig', 'ShopifyConfig', 'Product', 'Account', 'Recharge', 'Consumption', 'OrderCost', 'OrderCostBatch', 'ExpenseOrder', 'PlatformAccount']
\ No newline at end of file
+__all__ = ['db', 'Order', 'Payment', 'Expense', 'FeeConfig', 'ShopifyConfig', 'Product', 'Account', 'Recharge', 'Consumption', 'OrderCost', 'OrderCostBatch', 'ExpenseOrder', 'ExpenseAllocation', 'PlatformAccount', 'SyncState', 'WebhookEvent', 'DailyFinancial', 'ExchangeRate']
\ No newline at end of file
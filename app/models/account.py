@@ -41,18 +41,17 @@ class Account(db.Model):
         }
     
     def update_balance(self, amount, operation='add'):
-        """更新账户余额"""
-        from decimal import Decimal
-        # 确保 amount 是 Decimal 类型
-        if not isinstance(amount, Decimal):
-            amount = Decimal(str(amount))
+        """更新账户余额（原子 UPDATE，不提交事务）
+        
+        扣减时余额不足抛出 InsufficientBalanceError。新代码请直接使用
+        account_ledger 登记充值/消耗记录，而不是只修改余额。
+        """
+        from app.services.account_ledger import account_ledger
         
         if operation == 'add':
-            self.balance = (self.balance or Decimal('0')) + amount
+            account_ledger.credit(self.id, amount)
         elif operation == 'subtract':
-            self.balance = (self.balance or Decimal('0')) - amount
-        self.updated_at = datetime.utcnow()
-        db.session.commit()
+            account_ledger.debit(self.id, amount)
     
     def get_total_recharge(self):
         """获取总充值金额"""
@@ -101,6 +100,10 @@ class Recharge(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_recharges_account_id_recharge_date', 'account_id', 'recharge_date'),
+    )
+    
     def __repr__(self):
         return f'<Recharge {self.account.account_name}: {self.amount}>'
     
@@ -123,12 +126,9 @@ class Recharge(db.Model):
         }
     
     def confirm_recharge(self):
-        """确认充值成功"""
-        if self.status == 'pending':
-            self.status = 'completed'
-            self.account.update_balance(float(self.amount), 'add')
-            self.updated_at = datetime.utcnow()
-            db.session.commit()
+        """确认充值成功（不提交事务）"""
+        from app.services.account_ledger import account_ledger
+        return account_ledger.complete_recharge(self)
     
     @staticmethod
     def get_recharge_methods():
@@ -157,6 +157,10 @@ class Consumption(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_consumptions_account_id_consumption_date', 'account_id', 'consumption_date'),
+    )
+    
     def __repr__(self):
         return f'<Consumption {self.account.account_name}: {self.amount} on {self.consumption_date}>'
     
@@ -178,11 +182,13 @@ class Consumption(db.Model):
         }
     
     def process_consumption(self):
-        """处理消耗，从账户余额中扣除"""
-        if self.account.balance >= self.amount:
-            self.account.update_balance(float(self.amount), 'subtract')
-            return True
-        return False
+        """处理消耗，从账户余额中原子扣除（不提交事务），余额不足时返回False"""
+        from app.services.account_ledger import account_ledger, InsufficientBalanceError
+        try:
+            account_ledger.debit(self.account_id, self.amount)
+        except InsufficientBalanceError:
+            return False
+        return True
     
     @staticmethod
     def get_consumption_types():
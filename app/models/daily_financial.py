@@ -0,0 +1,45 @@
+from app import db
+from datetime import datetime
+from sqlalchemy import DECIMAL
+
+
+class DailyFinancial(db.Model):
+    """每日财务汇总表 - 按日期和货币预先汇总订单、费用、订单成本，报表直接读取"""
+    __tablename__ = 'daily_financials'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=False)  # 日期（订单按创建日期，费用按费用日期，订单成本按费用发生日期）
+    currency = db.Column(db.String(10), nullable=False)  # 原始货币
+    
+    # 收入：已支付订单的实际到账金额
+    revenue = db.Column(DECIMAL(12, 2), default=0)  # 原始货币金额
+    revenue_cny = db.Column(DECIMAL(12, 2), default=0)  # 换算为人民币
+    
+    # 支出（人民币）
+    expense_cny = db.Column(DECIMAL(12, 2), default=0)  # 费用记录
+    order_cost_cny = db.Column(DECIMAL(12, 2), default=0)  # 已确认的订单成本
+    
+    # 订单数量
+    order_count = db.Column(db.Integer, default=0)  # 当日创建的订单数
+    paid_count = db.Column(db.Integer, default=0)  # 其中已支付的订单数
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('date', 'currency', name='uq_daily_financial_date_currency'),)
+    
+    def __repr__(self):
+        return f'<DailyFinancial {self.date} {self.currency}>'
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'date': self.date.isoformat() if self.date else None,
+            'currency': self.currency,
+            'revenue': float(self.revenue) if self.revenue else 0,
+            'revenue_cny': float(self.revenue_cny) if self.revenue_cny else 0,
+            'expense_cny': float(self.expense_cny) if self.expense_cny else 0,
+            'order_cost_cny': float(self.order_cost_cny) if self.order_cost_cny else 0,
+            'order_count': self.order_count or 0,
+            'paid_count': self.paid_count or 0,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
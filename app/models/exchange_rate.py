@@ -0,0 +1,37 @@
+from app import db
+from datetime import datetime
+from sqlalchemy import DECIMAL
+
+
+class ExchangeRate(db.Model):
+    """历史汇率表 - 每个货币对每天一条汇率"""
+    __tablename__ = 'exchange_rates'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    rate_date = db.Column(db.Date, nullable=False)  # 汇率日期
+    from_currency = db.Column(db.String(10), nullable=False)  # 源货币
+    to_currency = db.Column(db.String(10), nullable=False)  # 目标货币
+    rate = db.Column(DECIMAL(18, 8), nullable=False)  # 1 源货币 = rate 目标货币
+    source = db.Column(db.String(50))  # 来源：csv, exchangerate-api 等
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('rate_date', 'from_currency', 'to_currency', name='uq_exchange_rate_date_pair'),
+    )
+    
+    def __repr__(self):
+        return f'<ExchangeRate {self.rate_date} {self.from_currency}->{self.to_currency}: {self.rate}>'
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'rate_date': self.rate_date.isoformat() if self.rate_date else None,
+            'from_currency': self.from_currency,
+            'to_currency': self.to_currency,
+            'rate': float(self.rate) if self.rate else None,
+            'source': self.source,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
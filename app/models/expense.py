@@ -7,7 +7,9 @@ expense_order_association = Table(
     'expense_order_association',
     db.Model.metadata,
     db.Column('expense_id', db.Integer, db.ForeignKey('expenses.id'), primary_key=True),
-    db.Column('order_id', db.Integer, db.ForeignKey('orders.id'), primary_key=True)
+    db.Column('order_id', db.Integer, db.ForeignKey('orders.id'), primary_key=True),
+    # 主键以 expense_id 开头，按订单加载关联费用需要单独的索引
+    db.Index('ix_expense_order_association_order_id', 'order_id')
 )
 
 class Expense(db.Model):
@@ -35,6 +37,9 @@ class Expense(db.Model):
     
     # 多对多关系：一个费用可以关联多个订单
     orders = db.relationship('Order', secondary=expense_order_association, backref='expenses')
+    # 分摊到各关联订单的金额（由费用分摊服务维护），删除费用时一并删除
+    allocations = db.relationship('ExpenseAllocation', backref='expense', cascade='all, delete-orphan')
+    allocation_strategy = db.Column(db.String(20), default='even', server_default='even')  # 分摊方式：even（平均）、revenue_weighted（按订单收入）
     reference_id = db.Column(db.String(255))  # 外部参考ID（如广告账单ID）
     
     # 供应商信息
@@ -49,6 +54,10 @@ class Expense(db.Model):
     # 状态
     status = db.Column(db.String(50), default='confirmed')  # confirmed, pending, cancelled
     
+    __table_args__ = (
+        db.Index('ix_expenses_expense_date', 'expense_date'),
+    )
+    
     def __repr__(self):
         return f'<Expense {self.category}: {self.amount}>'
     
@@ -70,6 +79,7 @@ class Expense(db.Model):
             'submitter': self.submitter,
             'expense_date': self.expense_date.isoformat() if self.expense_date else None,
             'status': self.status,
+            'allocation_strategy': self.allocation_strategy,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
     
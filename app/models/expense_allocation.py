@@ -0,0 +1,60 @@
+from app import db
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable
+from sqlalchemy import DECIMAL, func
+
+
+class ExpenseAllocation(db.Model):
+    """费用分摊表 - 每个费用分摊到每个关联订单的人民币金额
+
+    由费用分摊服务在费用或费用-订单关联变动的事务中维护，订单接口直接按订单ID读取，
+    不再在序列化时加载费用及其关联的全部订单计算。
+    """
+    __tablename__ = 'expense_allocations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    expense_id = db.Column(db.Integer, db.ForeignKey('expenses.id', ondelete='CASCADE'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id', ondelete='CASCADE'), nullable=False)
+    category = db.Column(db.String(50), nullable=False)  # 费用类别（与 expenses.category 相同）
+    allocated_amount_cny = db.Column(DECIMAL(12, 2), nullable=False)  # 分摊金额（人民币），同一费用的分摊合计等于费用金额
+    strategy = db.Column(db.String(20), nullable=False)  # 分摊方式：even, revenue_weighted
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('expense_id', 'order_id', name='uq_expense_allocation_expense_order'),
+        db.Index('ix_expense_allocations_order_id_category', 'order_id', 'category'),
+    )
+
+    def __repr__(self):
+        return f'<ExpenseAllocation expense={self.expense_id} order={self.order_id}: {self.allocated_amount_cny}>'
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'expense_id': self.expense_id,
+            'order_id': self.order_id,
+            'category': self.category,
+            'allocated_amount_cny': float(self.allocated_amount_cny) if self.allocated_amount_cny else 0,
+            'strategy': self.strategy,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    @staticmethod
+    def totals_by_order(order_ids: Iterable[int]) -> Dict[int, Dict[str, Decimal]]:
+        """一条分组查询：订单ID -> {费用类别: 分摊金额合计}"""
+        order_ids = list(order_ids)
+        totals = {order_id: {} for order_id in order_ids}
+        if not order_ids:
+            return totals
+        rows = db.session.query(
+            ExpenseAllocation.order_id,
+            ExpenseAllocation.category,
+            func.sum(ExpenseAllocation.allocated_amount_cny)
+        ).filter(
+            ExpenseAllocation.order_id.in_(order_ids)
+        ).group_by(ExpenseAllocation.order_id, ExpenseAllocation.category).all()
+        for order_id, category, amount in rows:
+            totals[order_id][category] = Decimal(str(amount or 0))
+        return totals
@@ -45,12 +45,12 @@ class FeeConfig(db.Model):
         # 如果订单货币与费用配置货币不同，需要进行汇率转换
         converted_amount = amount
         if order_currency and order_currency != self.currency:
-            from app.services.exchange_rate_service import ExchangeRateService
-            exchange_service = ExchangeRateService()
+            # 使用全局汇率服务，复用其汇率缓存
+            from app.services.exchange_rate_service import exchange_rate_service
             
             # 将订单金额转换为费用配置的货币
             try:
-                rate = exchange_service.get_exchange_rate(order_currency, self.currency)
+                rate = exchange_rate_service.get_exchange_rate(order_currency, self.currency)
                 if rate is not None:
                     converted_amount = float(amount) * float(rate)
                 else:
@@ -1,7 +1,10 @@
 from app import db
 from datetime import datetime
 from sqlalchemy import func, DECIMAL
+from sqlalchemy.orm import configure_mappers, selectinload
 from decimal import Decimal
+from typing import Dict, List, Optional, Set
+from app.utils.fieldsets import pick_fields, wants
 
 class Order(db.Model):
     """订单模型"""
@@ -48,6 +51,14 @@ class Order(db.Model):
     # 关联关系
     payments = db.relationship('Payment', backref='order', lazy='dynamic')
     
+    # 列表排序/游标分页 (created_at, id)、(order_date, id)，按支付状态筛选后按创建时间排序，按订单号查找
+    __table_args__ = (
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+        db.Index('ix_orders_order_date_id', 'order_date', 'id'),
+        db.Index('ix_orders_financial_status_created_at', 'financial_status', 'created_at'),
+        db.Index('ix_orders_order_number', 'order_number'),
+    )
+    
     @property
     def status(self):
         """根据financial_status返回订单状态"""
@@ -135,13 +146,13 @@ class Order(db.Model):
         """动态计算毛利润（人民币）"""
         from app.services.exchange_rate_service import exchange_rate_service
         
-        # 将订单收入转换为人民币
+        # 将订单收入转换为人民币（使用订单日期的历史汇率）
         if self.actual_received and self.currency:
             if self.currency == 'CNY':
                 actual_received_cny = Decimal(str(self.actual_received))
             else:
                 actual_received_cny = exchange_rate_service.convert_to_cny(
-                    float(self.actual_received), self.currency
+                    float(self.actual_received), self.currency, self.order_date
                 )
         else:
             actual_received_cny = Decimal('0')
@@ -156,7 +167,7 @@ class Order(db.Model):
                 product_cost_cny = Decimal(str(self.product_cost))
             else:
                 product_cost_cny = exchange_rate_service.convert_to_cny(
-                    float(self.product_cost), self.currency
+                    float(self.product_cost), self.currency, self.order_date
                 )
         else:
             product_cost_cny = Decimal('0')
@@ -167,64 +178,92 @@ class Order(db.Model):
         
         return float(gross_profit_cny)
     
-    def get_allocated_expenses(self):
-        """获取分摊到该订单的费用"""
-        from app.models.expense import Expense
-        from decimal import Decimal
-        
-        allocated_product_cost = Decimal('0')
-        allocated_shipping_cost = Decimal('0')
-        
-        # 获取所有关联的费用（通过多对多关系）
-        for expense in self.expenses:
-            if expense.category in ['product_cost', 'shipping_cost']:
-                # 计算该费用关联的订单数量
-                order_count = len(expense.orders)
-                if order_count > 0:
-                    # 平均分摊费用
-                    allocated_amount = Decimal(str(expense.amount)) / order_count
-                    
-                    if expense.category == 'product_cost':
-                        allocated_product_cost += allocated_amount
-                    elif expense.category == 'shipping_cost':
-                        allocated_shipping_cost += allocated_amount
+    def get_allocated_expenses(self, allocations: Optional[Dict[str, Decimal]] = None):
+        """获取分摊到该订单的费用
+        
+        分摊金额由费用分摊服务预先写入 expense_allocations 表，这里只按订单ID读取。
+        
+        Args:
+            allocations: 费用类别 -> 分摊金额合计（批量序列化时预先查询），不传时查询本订单
+        """
+        from app.models.expense_allocation import ExpenseAllocation
+        
+        if allocations is None:
+            allocations = ExpenseAllocation.totals_by_order([self.id])[self.id]
         
         return {
-            'product_cost': float(allocated_product_cost),
-            'shipping_cost': float(allocated_shipping_cost)
+            'product_cost': float(allocations.get('product_cost', 0)),
+            'shipping_cost': float(allocations.get('shipping_cost', 0))
         }
     
-    def to_dict(self):
-        """转换为字典"""
-        from app.services.exchange_rate_service import exchange_rate_service
+    # 需要加载关联数据或换算汇率的计算字段，只有在 fields= 请求时才计算
+    COST_FIELDS = ('shipping_cost_cny', 'fangguo_cost_cny', 'gross_profit_cny')
+    ALLOCATION_FIELDS = ('allocated_product_cost', 'allocated_shipping_cost')
+    # expand= 可展开的关联数据
+    EXPANDABLE = ('order_costs', 'payments', 'expenses')
+    
+    @classmethod
+    def serializer_options(cls, fields: Optional[Set[str]] = None, expand: Optional[Set[str]] = None):
+        """列表序列化需要的预加载选项：只预加载请求的字段用到的关联，每个关联一条 SELECT ... IN 查询"""
+        # order_costs、expenses 由反向关系创建，需要先完成映射配置
+        configure_mappers()
+        expand = expand or set()
+        options = []
+        if wants(fields, *cls.COST_FIELDS) or 'order_costs' in expand:
+            options.append(selectinload(cls.order_costs))
+        if 'expenses' in expand:
+            options.append(selectinload(cls.expenses))
+        return tuple(options)
+    
+    @classmethod
+    def to_dict_list(cls, orders, fields: Optional[Set[str]] = None,
+                     expand: Optional[Set[str]] = None) -> List[Dict]:
+        """批量序列化订单
         
-        # 获取RMB费用
-        shipping_cost_cny = self.get_total_shipping_cost_cny()
-        fangguo_cost_cny = self.get_total_fangguo_cost_cny()
-        gross_profit_cny = self.calculate_gross_profit_cny()
+        与逐个调用 to_dict() 的结果相同，但查询数量固定：订单成本和关联费用
+        由 serializer_options() 预加载，分摊费用用一条分组查询从分摊表读取，
+        人民币金额使用内存中的历史汇率计算。
+        """
+        from app.models.expense_allocation import ExpenseAllocation
+        from app.models.payment import Payment
         
-        # 获取分摊的费用
-        allocated_expenses = self.get_allocated_expenses()
+        orders = list(orders)
+        allocations = {}
+        if wants(fields, *cls.ALLOCATION_FIELDS):
+            allocations = ExpenseAllocation.totals_by_order(order.id for order in orders)
         
-        # 将订单总价转换为人民币
-        if self.total_price and self.currency:
-            if self.currency == 'CNY':
-                total_price_cny = float(self.total_price)
-            else:
-                total_price_cny = float(exchange_rate_service.convert_to_cny(
-                    float(self.total_price), self.currency
-                ))
-        else:
-            total_price_cny = 0
+        payments_by_order = None
+        if expand and 'payments' in expand and orders:
+            payments_by_order = {order.id: [] for order in orders}
+            for payment in Payment.query.filter(Payment.order_id.in_(payments_by_order.keys())).all():
+                payments_by_order[payment.order_id].append(payment)
         
-        return {
+        return [
+            order.to_dict(fields, expand, allocations=allocations.get(order.id),
+                          payments=payments_by_order[order.id] if payments_by_order is not None else None)
+            for order in orders
+        ]
+    
+    def to_dict(self, fields: Optional[Set[str]] = None, expand: Optional[Set[str]] = None,
+                allocations: Optional[Dict[str, Decimal]] = None, payments: Optional[List] = None):
+        """转换为字典
+        
+        Args:
+            fields: 只返回这些字段（id 始终返回），None 表示全部字段；
+                    未请求的计算字段不会计算，也不会加载对应的关联数据
+            expand: 展开的关联数据：order_costs、payments、expenses
+            allocations: 费用类别 -> 分摊金额合计（批量序列化时预先查询）
+            payments: 预先加载的支付记录（批量序列化时使用）
+        """
+        from app.services.exchange_rate_service import exchange_rate_service
+        
+        data = {
             'id': self.id,
             'shopify_order_id': self.shopify_order_id,
             'order_number': self.order_number,
             'customer_email': self.customer_email,
             'customer_name': self.customer_name,
             'total_price': float(self.total_price) if self.total_price else 0,
-            'total_price_cny': total_price_cny,  # 新增：订单总价（人民币）
             'currency': self.currency,
             'actual_received': float(self.actual_received) if self.actual_received else 0,
             'payment_method': self.payment_method,
@@ -233,15 +272,53 @@ class Order(db.Model):
             'shipping_cost': float(self.shipping_cost) if self.shipping_cost else 0,
             'gross_profit': float(self.gross_profit) if self.gross_profit else 0,
             'profit_margin': float(self.profit_margin) if self.profit_margin else 0,
+            'status': self.status,
             'financial_status': self.financial_status,
             'fulfillment_status': self.fulfillment_status,
             'order_date': self.order_date.isoformat() if self.order_date else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            # 新增RMB字段
-            'shipping_cost_cny': float(shipping_cost_cny) if shipping_cost_cny is not None else None,
-            'fangguo_cost_cny': float(fangguo_cost_cny) if fangguo_cost_cny is not None else None,
-            'gross_profit_cny': float(gross_profit_cny) if gross_profit_cny else 0,
-            # 新增分摊费用字段
-            'allocated_product_cost': allocated_expenses['product_cost'],
-            'allocated_shipping_cost': allocated_expenses['shipping_cost']
-        }
\ No newline at end of file
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+        
+        # 将订单总价转换为人民币
+        if wants(fields, 'total_price_cny'):
+            if self.total_price and self.currency:
+                if self.currency == 'CNY':
+                    total_price_cny = float(self.total_price)
+                else:
+                    total_price_cny = float(exchange_rate_service.convert_to_cny(
+                        float(self.total_price), self.currency, self.order_date
+                    ))
+            else:
+                total_price_cny = 0
+            data['total_price_cny'] = total_price_cny  # 新增：订单总价（人民币）
+        
+        # 新增RMB字段
+        if wants(fields, 'shipping_cost_cny'):
+            shipping_cost_cny = self.get_total_shipping_cost_cny()
+            data['shipping_cost_cny'] = float(shipping_cost_cny) if shipping_cost_cny is not None else None
+        if wants(fields, 'fangguo_cost_cny'):
+            fangguo_cost_cny = self.get_total_fangguo_cost_cny()
+            data['fangguo_cost_cny'] = float(fangguo_cost_cny) if fangguo_cost_cny is not None else None
+        if wants(fields, 'gross_profit_cny'):
+            gross_profit_cny = self.calculate_gross_profit_cny()
+            data['gross_profit_cny'] = float(gross_profit_cny) if gross_profit_cny else 0
+        
+        # 新增分摊费用字段
+        if wants(fields, *self.ALLOCATION_FIELDS):
+            allocated_expenses = self.get_allocated_expenses(allocations)
+            data['allocated_product_cost'] = allocated_expenses['product_cost']
+            data['allocated_shipping_cost'] = allocated_expenses['shipping_cost']
+        
+        data = pick_fields(data, fields)
+        
+        # 展开关联数据
+        expand = expand or set()
+        if 'order_costs' in expand:
+            data['order_costs'] = [cost.to_dict() for cost in self.order_costs]
+        if 'payments' in expand:
+            if payments is None:
+                payments = self.payments.all()
+            data['payments'] = [payment.to_dict() for payment in payments]
+        if 'expenses' in expand:
+            data['expenses'] = [expense.to_dict() for expense in self.expenses]
+        return data
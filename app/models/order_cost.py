@@ -1,6 +1,8 @@
 from app import db
 from datetime import datetime
 from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+from app.utils.fieldsets import pick_fields, wants
 
 
 class OrderCost(db.Model):
@@ -45,23 +47,51 @@ class OrderCost(db.Model):
     shipping_account = db.relationship('Account', foreign_keys=[shipping_account_id], backref='shipping_costs')
     fangguo_account = db.relationship('Account', foreign_keys=[fangguo_account_id], backref='fangguo_costs')
     
+    __table_args__ = (
+        db.Index('ix_order_costs_order_id', 'order_id'),
+        db.Index('ix_order_costs_status_cost_date', 'status', 'cost_date'),  # 每日汇总：已确认费用按日期范围
+        db.Index('ix_order_costs_cost_date', 'cost_date'),
+        db.Index('ix_order_costs_created_at', 'created_at'),
+        db.Index('ix_order_costs_batch_id', 'batch_id'),
+        db.Index('ix_order_costs_order_number', 'order_number'),
+    )
+    
     def __repr__(self):
         return f'<OrderCost {self.order_number}: shipping={self.shipping_cost}, fangguo={self.fangguo_cost}>'
     
-    def to_dict(self):
-        """转换为字典格式"""
-        return {
+    # expand= 可展开的关联数据
+    EXPANDABLE = ('order', 'shipping_account', 'fangguo_account')
+    
+    @classmethod
+    def serializer_options(cls, fields=None, expand=None):
+        """列表序列化需要的预加载选项（只预加载请求的字段用到的关联）"""
+        expand = expand or set()
+        options = []
+        if wants(fields, 'shipping_account_name') or 'shipping_account' in expand:
+            options.append(selectinload(cls.shipping_account))
+        if wants(fields, 'fangguo_account_name') or 'fangguo_account' in expand:
+            options.append(selectinload(cls.fangguo_account))
+        if 'order' in expand:
+            options.append(selectinload(cls.order))
+        return tuple(options)
+    
+    def to_dict(self, fields=None, expand=None):
+        """转换为字典格式
+        
+        Args:
+            fields: 只返回这些字段（id 始终返回），None 表示全部字段
+            expand: 展开的关联数据：order、shipping_account、fangguo_account
+        """
+        data = {
             'id': self.id,
             'order_id': self.order_id,
             'order_number': self.order_number,
             'shipping_cost': float(self.shipping_cost) if self.shipping_cost else 0.00,
             'shipping_account_id': self.shipping_account_id,
-            'shipping_account_name': self.shipping_account.account_name if self.shipping_account else None,
             'shipping_reference': self.shipping_reference,
             'shipping_notes': self.shipping_notes,
             'fangguo_cost': float(self.fangguo_cost) if self.fangguo_cost else 0.00,
             'fangguo_account_id': self.fangguo_account_id,
-            'fangguo_account_name': self.fangguo_account.account_name if self.fangguo_account else None,
             'fangguo_reference': self.fangguo_reference,
             'fangguo_notes': self.fangguo_notes,
             'other_cost': float(self.other_cost) if self.other_cost else 0.00,
@@ -76,6 +106,21 @@ class OrderCost(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+        if wants(fields, 'shipping_account_name'):
+            data['shipping_account_name'] = self.shipping_account.account_name if self.shipping_account else None
+        if wants(fields, 'fangguo_account_name'):
+            data['fangguo_account_name'] = self.fangguo_account.account_name if self.fangguo_account else None
+        data = pick_fields(data, fields)
+        
+        # 展开关联数据
+        expand = expand or set()
+        if 'order' in expand:
+            data['order'] = self.order.to_dict() if self.order else None
+        if 'shipping_account' in expand:
+            data['shipping_account'] = self.shipping_account.to_dict() if self.shipping_account else None
+        if 'fangguo_account' in expand:
+            data['fangguo_account'] = self.fangguo_account.to_dict() if self.fangguo_account else None
+        return data
     
     def get_total_cost(self):
         """计算总费用"""
@@ -84,55 +129,70 @@ class OrderCost(db.Model):
         other = float(self.other_cost) if self.other_cost else 0.00
         return shipping + fangguo + other
     
+    def consumption_entries(self):
+        """确认本条费用需要登记的消耗记录（物流费用从物流账户扣除，方果费用从方果账户扣除）"""
+        entries = []
+        if self.shipping_cost and self.shipping_cost > 0 and self.shipping_account_id:
+            entries.append({
+                'account_id': self.shipping_account_id,
+                'amount': self.shipping_cost,
+                'consumption_date': self.cost_date,
+                'consumption_type': 'shipping',
+                'description': f"订单{self.order_number}物流费用",
+                'reference_id': self.order_number
+            })
+        if self.fangguo_cost and self.fangguo_cost > 0 and self.fangguo_account_id:
+            entries.append({
+                'account_id': self.fangguo_account_id,
+                'amount': self.fangguo_cost,
+                'consumption_date': self.cost_date,
+                'consumption_type': 'order_fee',
+                'description': f"订单{self.order_number}方果下单费用",
+                'reference_id': self.order_number
+            })
+        return entries
+    
     def confirm_costs(self):
-        """确认费用并从相关账户扣除余额"""
+        """确认费用并从相关账户扣除余额（不提交事务）
+        
+        扣费通过账户台账的原子 UPDATE 完成；在保存点中执行，
+        任一账户余额不足时本条费用的所有扣费都会撤销，不影响同一事务中的其他操作。
+        状态先用带 status='pending' 条件的 UPDATE 修改，并发确认同一条费用时只有一个请求会扣费。
+        
+        Returns:
+            (是否成功, 提示信息)
+        
+        Raises:
+            StatusConflictError: 费用已被并发请求确认或修改，此时没有扣费
+        """
+        from app.services.account_ledger import account_ledger, InsufficientBalanceError, StatusConflictError
+        from app.services.financial_rollup import financial_rollup
+        
         if self.status != 'pending':
-            return False
+            return False, "只能确认待处理状态的费用"
         
+        savepoint = db.session.begin_nested()
         try:
-            # 从物流账户扣除费用
-            if self.shipping_cost and self.shipping_cost > 0 and self.shipping_account:
-                if self.shipping_account.balance < self.shipping_cost:
-                    return False, f"物流账户余额不足：需要{self.shipping_cost}，余额{self.shipping_account.balance}"
-                self.shipping_account.update_balance(float(self.shipping_cost), 'subtract')
-                
-                # 创建消耗记录
-                from .account import Consumption
-                consumption = Consumption(
-                    account_id=self.shipping_account_id,
-                    amount=self.shipping_cost,
-                    consumption_type='shipping',
-                    description=f"订单{self.order_number}物流费用",
-                    reference_id=self.order_number,
-                    consumption_date=self.cost_date
-                )
-                db.session.add(consumption)
+            account_ledger.claim_pending(OrderCost, self.id, 'confirmed')
             
-            # 从方果账户扣除费用
-            if self.fangguo_cost and self.fangguo_cost > 0 and self.fangguo_account:
-                if self.fangguo_account.balance < self.fangguo_cost:
-                    return False, f"方果账户余额不足：需要{self.fangguo_cost}，余额{self.fangguo_account.balance}"
-                self.fangguo_account.update_balance(float(self.fangguo_cost), 'subtract')
-                
-                # 创建消耗记录
-                from .account import Consumption
-                consumption = Consumption(
-                    account_id=self.fangguo_account_id,
-                    amount=self.fangguo_cost,
-                    consumption_type='order_fee',
-                    description=f"订单{self.order_number}方果下单费用",
-                    reference_id=self.order_number,
-                    consumption_date=self.cost_date
-                )
-                db.session.add(consumption)
+            # 从物流账户、方果账户扣除费用，并创建消耗记录
+            for entry in self.consumption_entries():
+                account_ledger.consume(**entry)
             
-            self.status = 'confirmed'
-            self.updated_at = datetime.utcnow()
-            db.session.commit()
+            # 状态不经过ORM修改，需要登记每日汇总表要刷新的日期
+            financial_rollup.mark_days([self.cost_date])
+            savepoint.commit()
             return True, "费用确认成功"
             
+        except StatusConflictError:
+            savepoint.rollback()
+            raise
+        except InsufficientBalanceError as e:
+            savepoint.rollback()
+            account_type = '物流' if e.account_id == self.shipping_account_id else '方果'
+            return False, f"{account_type}{str(e)}"
         except Exception as e:
-            db.session.rollback()
+            savepoint.rollback()
             return False, f"费用确认失败：{str(e)}"
     
     @staticmethod
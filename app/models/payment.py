@@ -29,6 +29,9 @@ class Payment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 同一订单的同一笔交易只记录一次（批量upsert的冲突键）
+    __table_args__ = (db.UniqueConstraint('order_id', 'transaction_id', name='uq_payment_order_transaction'),)
+    
     def __repr__(self):
         return f'<Payment {self.transaction_id}>'
     
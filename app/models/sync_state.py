@@ -0,0 +1,87 @@
+import json
+from app import db
+from datetime import datetime
+
+
+class SyncState(db.Model):
+    """同步状态表 - 按店铺/资源记录增量同步的updated_at水位线"""
+    __tablename__ = 'sync_state'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    shop_url = db.Column(db.String(255), nullable=False)  # 店铺URL
+    resource = db.Column(db.String(50), nullable=False)  # 资源类型：orders, products
+    
+    # 水位线：已同步到的最大updated_at（UTC）
+    last_updated_at = db.Column(db.DateTime)
+    
+    # 最近一次运行信息
+    last_run_at = db.Column(db.DateTime)
+    last_run_count = db.Column(db.Integer, default=0)
+    
+    # 无法解析而被跳过的记录：水位线照常越过它们，避免一条坏数据卡住增量同步
+    skipped_count = db.Column(db.Integer, default=0)  # 累计跳过次数
+    skipped_records = db.Column(db.Text)  # 最近跳过的记录（JSON列表：id, updated_at, error, skipped_at）
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('shop_url', 'resource', name='uq_sync_state_shop_resource'),)
+    
+    # skipped_records 最多保留的条数
+    MAX_SKIPPED_RECORDS = 100
+    
+    def __repr__(self):
+        return f'<SyncState {self.shop_url}:{self.resource} @ {self.last_updated_at}>'
+    
+    def advance(self, updated_at):
+        """推进水位线（只前进不后退）"""
+        if updated_at and (self.last_updated_at is None or updated_at > self.last_updated_at):
+            self.last_updated_at = updated_at
+    
+    def get_skipped_records(self):
+        """最近跳过的记录列表"""
+        return json.loads(self.skipped_records) if self.skipped_records else []
+    
+    def record_skipped(self, resource_id, updated_at, error):
+        """登记一个无法解析而被跳过的记录，同一记录只保留最新一次"""
+        resource_id = str(resource_id)
+        records = [record for record in self.get_skipped_records() if record['id'] != resource_id]
+        records.append({
+            'id': resource_id,
+            'updated_at': updated_at.isoformat() if updated_at else None,
+            'error': str(error)[:500],
+            'skipped_at': datetime.utcnow().isoformat()
+        })
+        self.skipped_records = json.dumps(records[-self.MAX_SKIPPED_RECORDS:], ensure_ascii=False)
+        self.skipped_count = (self.skipped_count or 0) + 1
+    
+    def clear_skipped(self, resource_ids):
+        """之前被跳过、之后同步成功的记录从列表中移除"""
+        if not self.skipped_records:
+            return
+        resource_ids = {str(resource_id) for resource_id in resource_ids}
+        records = [record for record in self.get_skipped_records() if record['id'] not in resource_ids]
+        self.skipped_records = json.dumps(records, ensure_ascii=False) if records else None
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'shop_url': self.shop_url,
+            'resource': self.resource,
+            'last_updated_at': self.last_updated_at.isoformat() if self.last_updated_at else None,
+            'last_run_at': self.last_run_at.isoformat() if self.last_run_at else None,
+            'last_run_count': self.last_run_count,
+            'skipped_count': self.skipped_count or 0,
+            'skipped_records': self.get_skipped_records(),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    @staticmethod
+    def get_or_create(shop_url, resource):
+        """获取或创建同步状态记录"""
+        state = SyncState.query.filter_by(shop_url=shop_url, resource=resource).first()
+        if not state:
+            state = SyncState(shop_url=shop_url, resource=resource)
+            db.session.add(state)
+        return state
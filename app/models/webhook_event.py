@@ -0,0 +1,74 @@
+from app import db
+from datetime import datetime
+
+
+class WebhookEvent(db.Model):
+    """Webhook收件箱 - 保存通过签名验证的原始webhook请求，由Celery异步处理"""
+    __tablename__ = 'webhook_inbox'
+    
+    # 处理状态
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSED = 'processed'
+    STATUS_COALESCED = 'coalesced'  # 被同一订单更新的事件取代，未单独处理
+    STATUS_FAILED = 'failed'
+    
+    # 超过该次数仍处理失败的事件标记为failed，不再阻塞后续事件
+    MAX_ATTEMPTS = 5
+    
+    id = db.Column(db.Integer, primary_key=True)
+    webhook_id = db.Column(db.String(100))  # X-Shopify-Webhook-Id，重复投递只保存一次
+    topic = db.Column(db.String(50), nullable=False)  # orders/create, products/update 等
+    shop_domain = db.Column(db.String(255))  # X-Shopify-Shop-Domain
+    resource_id = db.Column(db.String(50))  # 订单/商品的Shopify ID
+    payload = db.Column(db.Text, nullable=False)  # 原始请求体
+    
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDING)
+    attempts = db.Column(db.Integer, default=0)
+    error_message = db.Column(db.Text)
+    
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_webhook_inbox_status_id', 'status', 'id'),
+        db.Index('ix_webhook_inbox_resource_id', 'resource_id'),
+        db.UniqueConstraint('webhook_id', name='uq_webhook_inbox_webhook_id'),
+    )
+    
+    def __repr__(self):
+        return f'<WebhookEvent {self.id} {self.topic} {self.status}>'
+    
+    def mark_processed(self):
+        """标记为处理成功"""
+        self.status = self.STATUS_PROCESSED
+        self.processed_at = datetime.utcnow()
+        self.error_message = None
+    
+    def mark_coalesced(self, event_id):
+        """标记为已被同一订单的另一事件合并"""
+        self.status = self.STATUS_COALESCED
+        self.processed_at = datetime.utcnow()
+        self.error_message = f'coalesced into event {event_id}'
+    
+    def mark_failed(self, error_message):
+        """记录一次处理失败，达到最大次数后不再重试"""
+        self.attempts = (self.attempts or 0) + 1
+        self.error_message = error_message
+        if self.attempts >= self.MAX_ATTEMPTS:
+            self.status = self.STATUS_FAILED
+            self.processed_at = datetime.utcnow()
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'webhook_id': self.webhook_id,
+            'topic': self.topic,
+            'shop_domain': self.shop_domain,
+            'resource_id': self.resource_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error_message': self.error_message,
+            'received_at': self.received_at.isoformat() if self.received_at else None,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
@@ -0,0 +1,222 @@
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func, insert, update
+from app.models.account import Account, Consumption, Recharge
+from app import db
+
+
+class InsufficientBalanceError(Exception):
+    """账户余额不足"""
+
+    def __init__(self, account_id: int, required: Decimal, balance: Optional[Decimal]):
+        self.account_id = account_id
+        self.required = required
+        self.balance = balance
+        super().__init__(f"账户余额不足：需要{required}，余额{balance if balance is not None else 0}")
+
+
+class StatusConflictError(Exception):
+    """记录状态已被并发请求修改（带状态条件的 UPDATE 没有命中）"""
+
+
+class AccountLedger:
+    """账户余额台账
+
+    余额的每次变动都对应一条只追加的充值（Recharge）或消耗（Consumption）记录；
+    accounts.balance 只通过一条原子 UPDATE 修改：
+        UPDATE accounts SET balance = balance - :x WHERE id = :id AND balance >= :x
+    余额检查与扣减在数据库中一步完成，并发请求不会丢失更新或扣成负数。
+    这里的方法都不提交事务，一个API操作中的所有变动由调用方统一提交。
+    删除费用等需要撤销消耗时追加一条负数的冲正记录，不删除原记录。
+    """
+
+    REVERSAL_TYPE = 'reversal'
+
+    @staticmethod
+    def _decimal(amount) -> Decimal:
+        return amount if isinstance(amount, Decimal) else Decimal(str(amount))
+
+    def credit(self, account_id: int, amount, session=None):
+        """增加账户余额（不提交事务）"""
+        session = session or db.session
+        amount = self._decimal(amount)
+        result = session.execute(
+            update(Account)
+            .where(Account.id == account_id)
+            .values(balance=func.coalesce(Account.balance, 0) + amount, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session='fetch')
+        )
+        if result.rowcount != 1:
+            raise ValueError(f"账户不存在: {account_id}")
+
+    def debit(self, account_id: int, amount, session=None):
+        """扣减账户余额（不提交事务），余额不足时抛出 InsufficientBalanceError"""
+        session = session or db.session
+        amount = self._decimal(amount)
+        result = session.execute(
+            update(Account)
+            .where(Account.id == account_id, func.coalesce(Account.balance, 0) >= amount)
+            .values(balance=func.coalesce(Account.balance, 0) - amount, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session='fetch')
+        )
+        if result.rowcount != 1:
+            row = session.query(Account.id, Account.balance).filter(Account.id == account_id).first()
+            if row is None:
+                raise ValueError(f"账户不存在: {account_id}")
+            raise InsufficientBalanceError(account_id, amount, row.balance)
+
+    def claim_pending(self, model, record_id: int, status: str, session=None):
+        """把待处理记录改为 status（不提交事务）：
+            UPDATE ... SET status = :status WHERE id = :id AND status = 'pending'
+        
+        并发确认同一条记录时只有一个请求能命中，必须在增减余额之前调用。
+        
+        Raises:
+            StatusConflictError: 记录已不是待处理状态，调用方回滚事务
+        """
+        session = session or db.session
+        result = session.execute(
+            update(model)
+            .where(model.id == record_id, model.status == 'pending')
+            .values(status=status, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session='fetch')
+        )
+        if result.rowcount != 1:
+            raise StatusConflictError(f"记录状态已被其他请求修改: {model.__tablename__} {record_id}")
+
+    def record_recharge(self, recharge: Recharge, session=None) -> Recharge:
+        """登记充值记录，状态为已完成时增加余额（不提交事务）"""
+        session = session or db.session
+        session.add(recharge)
+        if recharge.status == 'completed':
+            self.credit(recharge.account_id, recharge.amount, session)
+        return recharge
+
+    def complete_recharge(self, recharge: Recharge, session=None) -> bool:
+        """确认待处理的充值并增加余额（不提交事务）
+        
+        Raises:
+            StatusConflictError: 充值已被并发请求确认，此时余额未改变
+        """
+        if recharge.status != 'pending':
+            return False
+        self.claim_pending(Recharge, recharge.id, 'completed', session)
+        self.credit(recharge.account_id, recharge.amount, session)
+        return True
+
+    def consume(self, account_id: int, amount, consumption_date: Optional[date] = None,
+                session=None, **fields) -> Consumption:
+        """扣减余额并追加一条消耗记录（不提交事务）
+
+        Args:
+            account_id: 账户ID
+            amount: 消耗金额
+            consumption_date: 消耗日期，默认今天
+            **fields: Consumption 的其他字段（consumption_type、description、reference_id、currency）
+
+        Raises:
+            InsufficientBalanceError: 余额不足，此时余额和消耗记录都未改变
+        """
+        session = session or db.session
+        amount = self._decimal(amount)
+        self.debit(account_id, amount, session)
+        consumption = Consumption(
+            account_id=account_id,
+            amount=amount,
+            consumption_date=consumption_date or date.today(),
+            **fields
+        )
+        session.add(consumption)
+        return consumption
+
+    def consume_many(self, entries: Iterable[Dict], session=None) -> Dict[int, Decimal]:
+        """批量扣费：按账户汇总后每个账户一条原子 UPDATE，消耗记录一次批量插入（不提交事务）
+        
+        Args:
+            entries: 消耗记录字典（account_id、amount、consumption_date 及 Consumption 的其他字段）
+        
+        Returns:
+            账户ID -> 扣减总额
+        
+        Raises:
+            InsufficientBalanceError: 任一账户余额不足；调用方回滚事务即可撤销已扣减的账户
+        """
+        session = session or db.session
+        entries = list(entries)
+        totals = self.aggregate(entries)
+        # 固定按账户ID顺序加锁，避免并发批次之间死锁
+        for account_id in sorted(totals):
+            self.debit(account_id, totals[account_id], session)
+        
+        now = datetime.utcnow()
+        rows = [
+            dict(entry, amount=self._decimal(entry['amount']), created_at=now, updated_at=now)
+            for entry in entries
+        ]
+        if rows:
+            session.execute(insert(Consumption), rows)
+        return totals
+    
+    def aggregate(self, entries: Iterable[Dict]) -> Dict[int, Decimal]:
+        """按账户汇总消耗金额"""
+        totals = {}
+        for entry in entries:
+            totals[entry['account_id']] = totals.get(entry['account_id'], Decimal('0')) + self._decimal(entry['amount'])
+        return totals
+    
+    def check_balances(self, totals: Dict[int, Decimal], session=None) -> List[Dict]:
+        """一条查询检查多个账户的余额是否足够扣减
+        
+        Returns:
+            每个账户一个字典：account_id、account_name、balance、amount、balance_after、sufficient
+        """
+        session = session or db.session
+        if not totals:
+            return []
+        accounts = {
+            row.id: row for row in session.query(Account.id, Account.account_name, Account.balance)
+            .filter(Account.id.in_(totals.keys())).all()
+        }
+        summary = []
+        for account_id in sorted(totals):
+            account = accounts.get(account_id)
+            balance = Decimal(str(account.balance or 0)) if account else Decimal('0')
+            summary.append({
+                'account_id': account_id,
+                'account_name': account.account_name if account else None,
+                'balance': balance,
+                'amount': totals[account_id],
+                'balance_after': balance - totals[account_id],
+                'sufficient': account is not None and balance >= totals[account_id]
+            })
+        return summary
+    
+    def reverse_consumption(self, consumption: Consumption, description: Optional[str] = None,
+                            session=None) -> Optional[Consumption]:
+        """冲正一条消耗：退回余额并追加一条负数消耗记录（不提交事务）
+
+        同一条消耗只会冲正一次，已冲正时返回 None。
+        """
+        session = session or db.session
+        reference = f'{self.REVERSAL_TYPE}:{consumption.id}'
+        if session.query(Consumption.id).filter(Consumption.reference_id == reference).first():
+            return None
+
+        amount = self._decimal(consumption.amount)
+        self.credit(consumption.account_id, amount, session)
+        reversal = Consumption(
+            account_id=consumption.account_id,
+            amount=-amount,
+            currency=consumption.currency,
+            consumption_type=self.REVERSAL_TYPE,
+            description=description or f"冲正: {consumption.description or ''}",
+            reference_id=reference,
+            consumption_date=date.today()
+        )
+        session.add(reversal)
+        return reversal
+
+
+# 创建全局实例
+account_ledger = AccountLedger()
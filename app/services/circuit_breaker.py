@@ -0,0 +1,84 @@
+import threading
+import time
+from typing import Dict
+
+
+class CircuitBreaker:
+    """熔断器
+
+    closed：正常调用，连续失败达到 failure_threshold 次后进入 open；
+    open：直接跳过调用，recovery_timeout 秒后进入 half_open；
+    half_open：只放行一次试探调用，成功则恢复 closed，失败则重新 open。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 3, recovery_timeout: float = 60):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failure_count = 0
+        self.total_failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """是否允许本次调用"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.time() - self.opened_at < self.recovery_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_progress = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_progress:
+                    return False
+                self._trial_in_progress = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failure_count = 0
+            self.opened_at = None
+            self._trial_in_progress = False
+
+    def record_skip(self):
+        """调用没有结果（既不算成功也不算失败）：不改变状态，只释放 half_open 的试探名额"""
+        with self._lock:
+            self._trial_in_progress = False
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.failure_count += 1
+            self.total_failures += 1
+            self.last_error = str(error) if error else None
+            self._trial_in_progress = False
+            if self.state == self.HALF_OPEN or self.failure_count >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+    def reset(self):
+        self.record_success()
+
+    def to_dict(self) -> Dict:
+        """转换为字典"""
+        with self._lock:
+            retry_in = None
+            if self.state == self.OPEN and self.opened_at:
+                retry_in = max(0.0, round(self.recovery_timeout - (time.time() - self.opened_at), 1))
+            return {
+                'name': self.name,
+                'state': self.state,
+                'failure_count': self.failure_count,
+                'total_failures': self.total_failures,
+                'failure_threshold': self.failure_threshold,
+                'recovery_timeout': self.recovery_timeout,
+                'retry_in': retry_in,
+                'last_error': self.last_error
+            }
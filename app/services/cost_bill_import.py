@@ -0,0 +1,348 @@
+import codecs
+import csv
+import os
+import uuid
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import insert
+from app.models.account import Account
+from app.models.order import Order
+from app.models.order_cost import OrderCost, OrderCostBatch
+from app import db
+
+
+class CostBillImportError(Exception):
+    """账单文件无法导入（格式不支持、缺少必需列、账户无效等整体性错误）"""
+
+
+class CostBillImporter:
+    """4PX物流账单、方果下单账单的批量导入
+
+    逐行流式读取 CSV 或 XLSX（openpyxl read_only 模式），每 CHUNK_SIZE 行为一组：
+    一条查询把订单号解析为订单ID，一条查询检查已存在的费用记录，
+    校验通过的行用一条 INSERT 批量写入 order_costs。内存占用与组大小有关，与文件行数无关。
+    导入的费用都属于同一个新的 OrderCostBatch，状态为 pending，
+    之后通过批次确认接口统一扣费。出错的行不导入，在结果中逐行列出原因。
+    """
+
+    CHUNK_SIZE = 1000
+    MAX_REPORTED_ERRORS = 1000
+
+    BILL_TYPES = ('4px', 'fangguo', 'mixed')
+
+    # 表头别名（不区分大小写）-> OrderCost 字段
+    COLUMN_ALIASES = {
+        'order_number': ('order_number', 'order no', 'order_no', '订单号', '订单编号', '客户订单号', '参考号'),
+        'cost_date': ('cost_date', 'date', '日期', '费用日期', '账单日期', '发货日期', '下单日期'),
+        'shipping_cost': ('shipping_cost', '物流费用', '运费'),
+        'shipping_reference': ('shipping_reference', 'tracking_number', '跟踪号', '物流单号', '运单号'),
+        'shipping_notes': ('shipping_notes', '物流备注'),
+        'fangguo_cost': ('fangguo_cost', '方果费用', '下单费用'),
+        'fangguo_reference': ('fangguo_reference', '方果订单号', '方果单号'),
+        'fangguo_notes': ('fangguo_notes', '方果备注'),
+        'other_cost': ('other_cost', '其他费用'),
+        'other_description': ('other_description', '其他费用说明'),
+        'amount': ('amount', 'cost', 'fee', '金额', '费用', '总费用', '合计'),
+        'notes': ('notes', 'remark', '备注'),
+    }
+
+    # 单一类型账单中的"金额""备注"列对应的字段
+    BILL_TYPE_COLUMNS = {
+        '4px': {'amount': 'shipping_cost', 'notes': 'shipping_notes'},
+        'fangguo': {'amount': 'fangguo_cost', 'notes': 'fangguo_notes'},
+    }
+
+    COST_FIELDS = ('shipping_cost', 'fangguo_cost', 'other_cost')
+    DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%Y.%m.%d', '%Y%m%d')
+
+    # ==================== 读取 ====================
+
+    def iter_rows(self, stream, filename: str, encoding: str = 'utf-8-sig') -> Iterator[Tuple[int, Dict]]:
+        """逐行读取账单文件，返回 (行号, {字段: 值})，跳过空行
+
+        Args:
+            stream: 二进制文件对象（上传文件或 open(path, 'rb')）
+            filename: 文件名，按扩展名判断格式（.csv / .xlsx）
+            encoding: CSV 文件编码，Excel 导出的中文CSV通常为 gbk
+        """
+        extension = os.path.splitext(filename or '')[1].lower()
+        if extension == '.csv':
+            rows = csv.reader(codecs.iterdecode(stream, encoding))
+        elif extension in ('.xlsx', '.xlsm'):
+            rows = self._iter_xlsx(stream)
+        else:
+            raise CostBillImportError(f"不支持的文件格式: {extension or filename}，请上传 CSV 或 XLSX 文件")
+
+        header = None
+        for line_number, values in enumerate(rows, start=1):
+            if header is None:
+                header = self._map_header(values)
+                continue
+            if not any(value not in (None, '') and str(value).strip() for value in values):
+                continue
+            yield line_number, {
+                field: values[index] for index, field in header.items() if index < len(values)
+            }
+
+        if header is None:
+            raise CostBillImportError('账单文件为空')
+
+    @staticmethod
+    def _iter_xlsx(stream):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise CostBillImportError('导入 XLSX 需要安装 openpyxl')
+
+        # read_only 模式按行解析工作表XML，不会把整个工作簿加载到内存
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+        try:
+            for values in workbook.active.iter_rows(values_only=True):
+                yield values
+        finally:
+            workbook.close()
+
+    def _map_header(self, values) -> Dict[int, str]:
+        lookup = {
+            alias.lower(): field for field, aliases in self.COLUMN_ALIASES.items() for alias in aliases
+        }
+        header = {}
+        for index, value in enumerate(values):
+            field = lookup.get(str(value or '').strip().lower())
+            if field and field not in header.values():
+                header[index] = field
+        if 'order_number' not in header.values():
+            raise CostBillImportError('账单缺少订单号列（order_number / 订单号）')
+        return header
+
+    # ==================== 校验 ====================
+
+    @staticmethod
+    def normalize_order_number(value) -> str:
+        """账单中的订单号可能带 "#" 前缀，或被Excel存成数字"""
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value if value is not None else '').strip().lstrip('#').strip()
+
+    @staticmethod
+    def _parse_amount(value) -> Decimal:
+        if value is None or str(value).strip() == '':
+            return Decimal('0')
+        if isinstance(value, (int, float, Decimal)):
+            amount = Decimal(str(value))
+        else:
+            text = str(value).strip().replace(',', '')
+            for symbol in ('¥', '￥', '$', 'CNY', 'RMB', 'USD'):
+                text = text.replace(symbol, '')
+            try:
+                amount = Decimal(text.strip())
+            except InvalidOperation:
+                raise ValueError(f"金额格式错误: {value}")
+        if amount < 0:
+            raise ValueError(f"金额不能为负数: {value}")
+        return amount.quantize(Decimal('0.01'))
+
+    def _parse_date(self, value) -> Optional[date]:
+        if value is None or str(value).strip() == '':
+            return None
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        text = str(value).strip()[:10]
+        for date_format in self.DATE_FORMATS:
+            try:
+                return datetime.strptime(text, date_format).date()
+            except ValueError:
+                continue
+        raise ValueError(f"日期格式错误: {value}")
+
+    @staticmethod
+    def _text(value) -> Optional[str]:
+        if value is None:
+            return None
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value).strip() or None
+
+    def parse_row(self, record: Dict, bill_type: str, default_cost_date: Optional[date]) -> Dict:
+        """把一行账单转换为 OrderCost 字段，格式错误时抛出 ValueError"""
+        order_number = self.normalize_order_number(record.get('order_number'))
+        if not order_number:
+            raise ValueError('订单号为空')
+
+        mapping = self.BILL_TYPE_COLUMNS.get(bill_type, {})
+        row = {'order_number': order_number}
+        for field in ('shipping_reference', 'shipping_notes', 'fangguo_reference',
+                      'fangguo_notes', 'other_description'):
+            row[field] = self._text(record.get(field))
+        for field in self.COST_FIELDS:
+            row[field] = self._parse_amount(record.get(field))
+
+        if self._text(record.get('amount')):
+            if 'amount' not in mapping:
+                raise ValueError('混合账单请分别填写物流费用、方果费用列')
+            if row[mapping['amount']] == 0:
+                row[mapping['amount']] = self._parse_amount(record['amount'])
+        if record.get('notes') is not None and 'notes' in mapping and not row[mapping['notes']]:
+            row[mapping['notes']] = self._text(record['notes'])
+
+        if not any(row[field] for field in self.COST_FIELDS):
+            raise ValueError('费用金额为空或为0')
+
+        row['cost_date'] = self._parse_date(record.get('cost_date')) or default_cost_date
+        if not row['cost_date']:
+            raise ValueError('缺少费用日期')
+        return row
+
+    @staticmethod
+    def _check_account(account_id: Optional[int], platform: str) -> Optional[int]:
+        if account_id is None:
+            return None
+        account = db.session.get(Account, account_id)
+        if account is None:
+            raise CostBillImportError(f"账户不存在: {account_id}")
+        if account.platform != platform:
+            raise CostBillImportError(f"账户 {account.account_name} 不是{platform}账户")
+        return account.id
+
+    # ==================== 导入 ====================
+
+    def import_bill(self, stream, filename: str, bill_type: str = 'mixed',
+                    cost_date: Optional[date] = None, shipping_account_id: Optional[int] = None,
+                    fangguo_account_id: Optional[int] = None, batch_name: Optional[str] = None,
+                    created_by: Optional[str] = None, encoding: str = 'utf-8-sig',
+                    dry_run: bool = False) -> Dict:
+        """导入一份账单并提交
+
+        Args:
+            stream: 二进制文件对象
+            filename: 文件名（.csv / .xlsx）
+            bill_type: 4px（金额列记为物流费用）、fangguo（记为方果费用）、mixed（按列区分）
+            cost_date: 账单中没有日期列时使用的费用日期
+            shipping_account_id: 物流费用扣费账户（4PX）
+            fangguo_account_id: 方果费用扣费账户
+            dry_run: 只校验不写入
+
+        Returns:
+            batch、imported_count、error_count、errors（行号、订单号、原因，最多 MAX_REPORTED_ERRORS 条）
+
+        Raises:
+            CostBillImportError: 文件或参数整体无效，未写入任何数据
+        """
+        if bill_type not in self.BILL_TYPES:
+            raise CostBillImportError(f"不支持的账单类型: {bill_type}")
+        shipping_account_id = self._check_account(shipping_account_id, '4px')
+        fangguo_account_id = self._check_account(fangguo_account_id, 'fangguo')
+
+        now = datetime.utcnow()
+        batch = OrderCostBatch(
+            batch_id=f"IMPORT_{now.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}",
+            batch_name=batch_name or f"账单导入 {filename}",
+            description=f"从 {filename} 导入（{bill_type}）",
+            created_by=created_by,
+            status='pending'
+        )
+        result = {'imported_count': 0, 'error_count': 0, 'errors': []}
+        totals = {field: Decimal('0') for field in self.COST_FIELDS}
+        seen = set()
+        chunk = []
+
+        def flush():
+            rows = self._resolve_chunk(chunk, seen, result)
+            chunk.clear()
+            if not rows:
+                return
+            for field in self.COST_FIELDS:
+                totals[field] += sum(row[field] for row in rows)
+            result['imported_count'] += len(rows)
+            if dry_run:
+                return
+            for row in rows:
+                row.update(
+                    shipping_account_id=shipping_account_id,
+                    fangguo_account_id=fangguo_account_id,
+                    entry_date=now.date(),
+                    entry_user=created_by,
+                    status='pending',
+                    batch_id=batch.batch_id,
+                    batch_notes=batch.batch_name,
+                    created_at=now,
+                    updated_at=now
+                )
+            db.session.execute(insert(OrderCost), rows)
+
+        try:
+            for line_number, record in self.iter_rows(stream, filename, encoding):
+                try:
+                    chunk.append((line_number, self.parse_row(record, bill_type, cost_date)))
+                except ValueError as e:
+                    self._add_error(result, line_number, record.get('order_number'), str(e))
+                    continue
+                if len(chunk) >= self.CHUNK_SIZE:
+                    flush()
+            flush()
+        except UnicodeDecodeError:
+            db.session.rollback()
+            raise CostBillImportError(f"CSV 文件不是 {encoding} 编码，请指定正确的编码（如 gbk）")
+        except Exception:
+            db.session.rollback()
+            raise
+
+        batch.order_count = result['imported_count']
+        batch.total_shipping_cost = totals['shipping_cost']
+        batch.total_fangguo_cost = totals['fangguo_cost']
+        batch.total_other_cost = totals['other_cost']
+
+        if dry_run or not result['imported_count']:
+            db.session.rollback()
+        else:
+            db.session.add(batch)
+            db.session.commit()
+
+        result['batch'] = batch.to_dict()
+        result['dry_run'] = dry_run
+        result['errors_truncated'] = result['error_count'] > len(result['errors'])
+        return result
+
+    def _resolve_chunk(self, chunk: List[Tuple[int, Dict]], seen: set, result: Dict) -> List[Dict]:
+        """一组行：一条查询解析订单ID，一条查询检查已存在的费用记录"""
+        if not chunk:
+            return []
+        order_numbers = {row['order_number'] for _, row in chunk}
+        order_ids = dict(
+            db.session.query(Order.order_number, Order.id).filter(Order.order_number.in_(order_numbers)).all()
+        )
+        existing = {
+            number for number, in db.session.query(OrderCost.order_number)
+            .filter(OrderCost.order_number.in_(order_numbers), OrderCost.status != 'cancelled').all()
+        }
+
+        rows = []
+        for line_number, row in chunk:
+            order_number = row['order_number']
+            if order_number not in order_ids:
+                self._add_error(result, line_number, order_number, '订单不存在')
+            elif order_number in existing:
+                self._add_error(result, line_number, order_number, '订单已存在费用记录')
+            elif order_number in seen:
+                self._add_error(result, line_number, order_number, '订单号在账单中重复')
+            else:
+                seen.add(order_number)
+                row['order_id'] = order_ids[order_number]
+                rows.append(row)
+        return rows
+
+    def _add_error(self, result: Dict, line_number: int, order_number, message: str):
+        result['error_count'] += 1
+        if len(result['errors']) < self.MAX_REPORTED_ERRORS:
+            result['errors'].append({
+                'row': line_number,
+                'order_number': self.normalize_order_number(order_number) or None,
+                'message': message
+            })
+
+
+# 创建全局实例
+cost_bill_importer = CostBillImporter()
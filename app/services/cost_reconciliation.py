@@ -0,0 +1,303 @@
+import csv
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+from app.models.order import Order
+from app.models.order_cost import OrderCost
+from app.services.cost_bill_import import cost_bill_importer, CostBillImportError
+from app.utils.date_ranges import dates_range, in_range
+from app import db
+
+
+class CostReconciler:
+    """供应商账单与已录入订单费用的对账
+
+    账单逐行读取（与账单导入相同的解析规则）后按订单号汇总到哈希表；
+    账单日期范围内的 order_costs、orders 各用一条查询加载到按订单号、参考号索引的哈希表。
+    然后对账单一次线性遍历：先按订单号、再按物流/方果参考号匹配，
+    得到 matched（金额一致）、amount_mismatch（金额不一致）、missing_in_ledger（账单有、系统无）
+    和 missing_in_bill（系统有、账单无）四类结果。查询数量与行数无关。
+    """
+
+    # 各账单类型参与对账的费用字段和参考号字段
+    BILL_FIELDS = {
+        '4px': (('shipping_cost',), ('shipping_reference',)),
+        'fangguo': (('fangguo_cost',), ('fangguo_reference',)),
+        'mixed': (cost_bill_importer.COST_FIELDS, ('shipping_reference', 'fangguo_reference')),
+    }
+
+    CATEGORIES = ('matched', 'amount_mismatch', 'missing_in_ledger', 'missing_in_bill')
+    CATEGORY_NAMES = {
+        'matched': '金额一致',
+        'amount_mismatch': '金额不一致',
+        'missing_in_ledger': '系统无记录',
+        'missing_in_bill': '账单无记录',
+        'invalid_rows': '无法解析的行',
+    }
+    REPORT_COLUMNS = (
+        'order_number', 'order_id', 'matched_by', 'bill_amount', 'ledger_amount', 'difference',
+        'bill_references', 'ledger_references', 'bill_rows', 'cost_ids', 'cost_dates', 'note'
+    )
+
+    # 订单通常早于物流/下单费用发生，加载订单时向前多取的天数
+    ORDER_LOOKBACK_DAYS = 60
+    LOOKUP_CHUNK_SIZE = 1000
+
+    def reconcile(self, stream, filename: str, bill_type: str = '4px',
+                  start_date: Optional[date] = None, end_date: Optional[date] = None,
+                  tolerance=Decimal('0.01'), encoding: str = 'utf-8-sig') -> Dict:
+        """对账（只读，不修改数据）
+
+        Args:
+            stream: 二进制账单文件对象
+            filename: 文件名（.csv / .xlsx）
+            bill_type: 4px（对比物流费用）、fangguo（对比方果费用）、mixed（三类费用分别对比）
+            start_date, end_date: 对账日期范围，默认取账单中的最早、最晚日期
+            tolerance: 允许的金额误差
+
+        Returns:
+            summary 及 matched、amount_mismatch、missing_in_ledger、missing_in_bill、invalid_rows 列表
+        """
+        if bill_type not in self.BILL_FIELDS:
+            raise CostBillImportError(f"不支持的账单类型: {bill_type}")
+        fields, reference_fields = self.BILL_FIELDS[bill_type]
+        tolerance = Decimal(str(tolerance))
+
+        bill, invalid_rows, bill_start, bill_end = self._load_bill(
+            stream, filename, bill_type, end_date, fields, reference_fields, encoding
+        )
+        start_date = start_date or bill_start
+        end_date = end_date or bill_end
+        if not start_date or not end_date:
+            raise CostBillImportError('无法确定对账日期范围，请指定开始和结束日期')
+
+        ledger, ledger_by_reference = self._load_ledger(start_date, end_date, fields, reference_fields)
+        order_ids = self._load_orders(start_date, end_date)
+
+        report = {category: [] for category in self.CATEGORIES}
+        for order_number, bill_entry in bill.items():
+            ledger_entry, matched_by = ledger.pop(order_number, None), 'order_number'
+            if ledger_entry is None:
+                for reference in bill_entry['references']:
+                    key = ledger_by_reference.get(reference)
+                    if key in ledger:
+                        ledger_entry, matched_by = ledger.pop(key), 'reference'
+                        break
+
+            if ledger_entry is None:
+                report['missing_in_ledger'].append(self._line(order_number, bill_entry, None, None, fields))
+                continue
+
+            line = self._line(order_number, bill_entry, ledger_entry, matched_by, fields)
+            differences = {
+                field: bill_entry['amounts'][field] - ledger_entry['amounts'][field] for field in fields
+                if abs(bill_entry['amounts'][field] - ledger_entry['amounts'][field]) > tolerance
+            }
+            if differences:
+                line['note'] = '; '.join(f'{field} {difference:+}' for field, difference in differences.items())
+                report['amount_mismatch'].append(line)
+            else:
+                report['matched'].append(line)
+
+        # 系统中有本类费用、但账单中没有的记录
+        report['missing_in_bill'] = [
+            self._line(order_number, None, ledger_entry, None, fields)
+            for order_number, ledger_entry in ledger.items()
+            if any(ledger_entry['amounts'][field] for field in fields)
+        ]
+
+        self._annotate_missing_in_ledger(report['missing_in_ledger'], order_ids)
+        for category in ('missing_in_bill',) + self.CATEGORIES[:2]:
+            for line in report[category]:
+                line['order_id'] = line['order_id'] or order_ids.get(line['order_number'])
+
+        report['invalid_rows'] = invalid_rows
+        report['summary'] = self._summary(report, bill_type, start_date, end_date)
+        return report
+
+    # ==================== 加载 ====================
+
+    def _load_bill(self, stream, filename, bill_type, default_date, fields, reference_fields, encoding):
+        bill = {}
+        invalid_rows = []
+        bill_start = bill_end = None
+        for line_number, record in cost_bill_importer.iter_rows(stream, filename, encoding):
+            try:
+                row = cost_bill_importer.parse_row(record, bill_type, default_date)
+            except ValueError as e:
+                invalid_rows.append({
+                    'bill_rows': str(line_number),
+                    'order_number': cost_bill_importer.normalize_order_number(record.get('order_number')) or None,
+                    'note': str(e)
+                })
+                continue
+
+            # 同一订单在账单中可能有多行（如运费、附加费分列），按订单号汇总
+            entry = bill.setdefault(row['order_number'], {
+                'amounts': {field: Decimal('0') for field in fields},
+                'references': [],
+                'rows': [],
+                'dates': set(),
+            })
+            for field in fields:
+                entry['amounts'][field] += row[field]
+            for field in reference_fields:
+                if row.get(field) and row[field] not in entry['references']:
+                    entry['references'].append(row[field])
+            entry['rows'].append(line_number)
+            entry['dates'].add(row['cost_date'])
+            bill_start = min(bill_start or row['cost_date'], row['cost_date'])
+            bill_end = max(bill_end or row['cost_date'], row['cost_date'])
+        return bill, invalid_rows, bill_start, bill_end
+
+    def _load_ledger(self, start_date, end_date, fields, reference_fields):
+        """一条查询加载日期范围内未取消的订单费用，按订单号汇总并建立参考号索引"""
+        ledger = {}
+        ledger_by_reference = {}
+        rows = db.session.query(
+            OrderCost.id, OrderCost.order_id, OrderCost.order_number, OrderCost.cost_date,
+            *[getattr(OrderCost, field) for field in fields],
+            *[getattr(OrderCost, field) for field in reference_fields]
+        ).filter(
+            OrderCost.cost_date >= start_date,
+            OrderCost.cost_date <= end_date,
+            OrderCost.status != 'cancelled'
+        ).yield_per(5000)
+
+        for row in rows:
+            self._add_ledger_row(ledger, ledger_by_reference, row, fields, reference_fields)
+        return ledger, ledger_by_reference
+
+    @staticmethod
+    def _add_ledger_row(ledger, ledger_by_reference, row, fields, reference_fields):
+        order_number = cost_bill_importer.normalize_order_number(row.order_number)
+        entry = ledger.setdefault(order_number, {
+            'amounts': {field: Decimal('0') for field in fields},
+            'references': [],
+            'cost_ids': [],
+            'dates': set(),
+            'order_id': row.order_id,
+        })
+        for field in fields:
+            entry['amounts'][field] += Decimal(str(getattr(row, field) or 0))
+        for field in reference_fields:
+            reference = (getattr(row, field) or '').strip()
+            if reference and reference not in entry['references']:
+                entry['references'].append(reference)
+                ledger_by_reference.setdefault(reference, order_number)
+        entry['cost_ids'].append(row.id)
+        entry['dates'].add(row.cost_date)
+
+    def _load_orders(self, start_date, end_date) -> Dict[str, int]:
+        """一条查询加载日期范围（向前多取 ORDER_LOOKBACK_DAYS 天）内的订单号 -> 订单ID"""
+        start, end = dates_range(start_date - timedelta(days=self.ORDER_LOOKBACK_DAYS), end_date)
+        return {
+            cost_bill_importer.normalize_order_number(order_number): order_id
+            for order_number, order_id in db.session.query(Order.order_number, Order.id)
+            .filter(in_range(Order.order_date, start, end))
+            .yield_per(5000)
+        }
+
+    def _annotate_missing_in_ledger(self, lines: List[Dict], order_ids: Dict[str, int]):
+        """区分"订单不存在"与"订单存在但未录入费用"，并标出录入在对账范围之外的费用
+
+        只对系统无记录的订单号按 LOOKUP_CHUNK_SIZE 分组查询，查询数量与账单行数无关。
+        """
+        unresolved = [line['order_number'] for line in lines if line['order_number'] not in order_ids]
+        for chunk in self._chunks(unresolved):
+            order_ids.update(
+                db.session.query(Order.order_number, Order.id).filter(Order.order_number.in_(chunk)).all()
+            )
+
+        outside_window = {}
+        for chunk in self._chunks([line['order_number'] for line in lines]):
+            for order_number, cost_date in db.session.query(OrderCost.order_number, OrderCost.cost_date).filter(
+                OrderCost.order_number.in_(chunk), OrderCost.status != 'cancelled'
+            ):
+                outside_window.setdefault(order_number, []).append(cost_date.isoformat())
+
+        for line in lines:
+            order_number = line['order_number']
+            line['order_id'] = order_ids.get(order_number)
+            if order_number in outside_window:
+                line['note'] = f"费用录入在对账范围之外: {', '.join(sorted(outside_window[order_number]))}"
+            elif line['order_id'] is None:
+                line['note'] = '订单不存在'
+            else:
+                line['note'] = '订单未录入费用'
+
+    def _chunks(self, values: List) -> Iterable[List]:
+        for start in range(0, len(values), self.LOOKUP_CHUNK_SIZE):
+            yield values[start:start + self.LOOKUP_CHUNK_SIZE]
+
+    # ==================== 报告 ====================
+
+    @staticmethod
+    def _line(order_number, bill_entry, ledger_entry, matched_by, fields) -> Dict:
+        bill_amount = sum(bill_entry['amounts'].values()) if bill_entry else None
+        ledger_amount = sum(ledger_entry['amounts'][field] for field in fields) if ledger_entry else None
+        return {
+            'order_number': order_number,
+            'order_id': ledger_entry['order_id'] if ledger_entry else None,
+            'matched_by': matched_by,
+            'bill_amount': float(bill_amount) if bill_amount is not None else None,
+            'ledger_amount': float(ledger_amount) if ledger_amount is not None else None,
+            'difference': float((bill_amount or 0) - (ledger_amount or 0)),
+            'bill_references': ', '.join(bill_entry['references']) if bill_entry else None,
+            'ledger_references': ', '.join(ledger_entry['references']) if ledger_entry else None,
+            'bill_rows': ', '.join(str(row) for row in bill_entry['rows']) if bill_entry else None,
+            'cost_ids': ', '.join(str(cost_id) for cost_id in ledger_entry['cost_ids']) if ledger_entry else None,
+            'cost_dates': ', '.join(
+                sorted(day.isoformat() for day in (ledger_entry or bill_entry)['dates'])
+            ),
+            'note': None,
+        }
+
+    def _summary(self, report: Dict, bill_type: str, start_date: date, end_date: date) -> Dict:
+        summary = {
+            'bill_type': bill_type,
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'invalid_rows': len(report['invalid_rows']),
+        }
+        for category in self.CATEGORIES:
+            lines = report[category]
+            summary[f'{category}_count'] = len(lines)
+            summary[f'{category}_bill_amount'] = round(sum(line['bill_amount'] or 0 for line in lines), 2)
+            summary[f'{category}_ledger_amount'] = round(sum(line['ledger_amount'] or 0 for line in lines), 2)
+        return summary
+
+    def to_csv(self, report: Dict) -> bytes:
+        """导出为一个CSV文件（result 列标明分类），使用 utf-8-sig 以便Excel直接打开"""
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(('result',) + self.REPORT_COLUMNS)
+        for category in self.CATEGORIES + ('invalid_rows',):
+            for line in report[category]:
+                writer.writerow((self.CATEGORY_NAMES[category],) + tuple(
+                    line.get(column) for column in self.REPORT_COLUMNS
+                ))
+        return output.getvalue().encode('utf-8-sig')
+
+    def to_xlsx(self, report: Dict) -> bytes:
+        """导出为XLSX：汇总表加每类结果一个工作表（write_only 模式逐行写入）"""
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        summary_sheet = workbook.create_sheet('汇总')
+        for key, value in report['summary'].items():
+            summary_sheet.append((key, value))
+        for category in self.CATEGORIES + ('invalid_rows',):
+            sheet = workbook.create_sheet(self.CATEGORY_NAMES[category])
+            sheet.append(self.REPORT_COLUMNS)
+            for line in report[category]:
+                sheet.append(tuple(line.get(column) for column in self.REPORT_COLUMNS))
+
+        output = io.BytesIO()
+        workbook.save(output)
+        return output.getvalue()
+
+
+# 创建全局实例
+cost_reconciler = CostReconciler()
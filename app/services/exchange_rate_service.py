@@ -1,17 +1,61 @@
+import csv
+import numpy as np
 import requests
-from decimal import Decimal
+import threading
+from bisect import bisect_right
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
 from flask import current_app
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 import time
+from app.services.rate_snapshot import RateSnapshotStore
+from app.services.circuit_breaker import CircuitBreaker
 
 class ExchangeRateService:
-    """汇率服务 - 获取实时汇率"""
+    """汇率服务 - 获取实时汇率
+    
+    报表和序列化使用 convert_to_cny(amount, currency, on_date) 按订单日期换算：
+    汇率来自 exchange_rates 表，在进程内预加载为内存映射，定期检查版本以发现其他进程的写入，不访问外部API。
+    
+    实时汇率由定时任务 refresh_shared_rates() 统一刷新并发布到共享快照，
+    各进程按版本号读取快照；只有快照不存在时才直接请求外部API。
+    """
+    
+    # 所有API都失败、且没有历史汇率时使用的默认汇率
+    DEFAULT_RATES = {
+        'USD_CNY': Decimal('7.2'),
+        'EUR_CNY': Decimal('7.8'),
+        'GBP_CNY': Decimal('9.1'),
+        'CAD_CNY': Decimal('5.3'),
+        'AUD_CNY': Decimal('4.8'),
+        'JPY_CNY': Decimal('0.048')
+    }
     
     def __init__(self):
         self.cache = {}
         self.cache_duration = 3600  # 缓存1小时
         # 支持的货币列表
         self.supported_currencies = ['USD', 'EUR', 'GBP', 'CAD', 'AUD', 'JPY', 'CNY']
+        # 历史汇率：(源货币, 目标货币) -> (按日期排序的日期列表, 对应汇率列表)
+        self._historical = None
+        self._historical_lock = threading.Lock()
+        # 历史汇率版本（行数, 最大更新时间），其他进程写入汇率后据此重新加载
+        self._historical_version = None
+        self._historical_checked_at = 0
+        self.historical_check_interval = 30  # 每30秒最多检查一次历史汇率版本
+        # 共享汇率快照
+        self.snapshot_store = RateSnapshotStore()
+        self._snapshot = None
+        self._snapshot_checked_at = 0
+        self.snapshot_check_interval = 30  # 每30秒最多检查一次快照版本
+        # 每个汇率API一个熔断器；所有API都失败的货币对短时间内不再请求
+        self.breakers = {
+            'exchangerate-api': CircuitBreaker('exchangerate-api'),
+            'fixer': CircuitBreaker('fixer'),
+            'exchangerate.host': CircuitBreaker('exchangerate.host'),
+        }
+        self.negative_cache = {}
+        self.negative_cache_duration = 300  # 失败的货币对5分钟内直接使用默认汇率
     
     def get_exchange_rate(self, from_currency: str, to_currency: str) -> Optional[Decimal]:
         """获取两种货币之间的汇率"""
@@ -27,8 +71,10 @@ class ExchangeRateService:
             if current_time - cached_data['timestamp'] < self.cache_duration:
                 return cached_data['rate']
         
-        # 尝试从多个API获取汇率
-        rate = self._fetch_rate_from_apis(from_currency, to_currency)
+        # 优先使用定时任务发布的共享快照，快照不存在时才请求外部API
+        rate = self._get_snapshot_rate(from_currency, to_currency)
+        if not rate:
+            rate = self._fetch_rate_from_apis(from_currency, to_currency)
         
         if rate:
             # 缓存汇率
@@ -39,16 +85,7 @@ class ExchangeRateService:
             return rate
         
         # 如果所有API都失败，返回默认汇率
-        default_rates = {
-            'USD_CNY': Decimal('7.2'),
-            'EUR_CNY': Decimal('7.8'),
-            'GBP_CNY': Decimal('9.1'),
-            'CAD_CNY': Decimal('5.3'),
-            'AUD_CNY': Decimal('4.8'),
-            'JPY_CNY': Decimal('0.048')
-        }
-        
-        default_rate = default_rates.get(cache_key, Decimal('1'))
+        default_rate = self.DEFAULT_RATES.get(cache_key, Decimal('1'))
         try:
             current_app.logger.warning(f"无法获取实时汇率，使用默认汇率 {from_currency} -> {to_currency}: {default_rate}")
         except RuntimeError:
@@ -56,33 +93,140 @@ class ExchangeRateService:
             print(f"警告: 无法获取实时汇率，使用默认汇率 {from_currency} -> {to_currency}: {default_rate}")
         return default_rate
     
+    def _get_snapshot_rate(self, from_currency: str, to_currency: str) -> Optional[Decimal]:
+        """从共享快照计算汇率，版本号变化时才重新读取快照"""
+        current_time = time.time()
+        if current_time - self._snapshot_checked_at >= self.snapshot_check_interval:
+            self._snapshot_checked_at = current_time
+            try:
+                version = self.snapshot_store.read_version()
+                if version is not None and (self._snapshot is None or self._snapshot.get('version') != version):
+                    self._snapshot = self.snapshot_store.read()
+                    # 快照更新后本地缓存的实时汇率作废
+                    self.cache.clear()
+            except Exception as e:
+                try:
+                    current_app.logger.warning(f"读取共享汇率快照失败: {e}")
+                except RuntimeError:
+                    print(f"警告: 读取共享汇率快照失败: {e}")
+        
+        snapshot = self._snapshot
+        if not snapshot:
+            return None
+        
+        # 快照中的汇率为：1 基准货币 = rates[货币] 该货币
+        base = snapshot['base']
+        rates = snapshot['rates']
+        from_rate = Decimal('1') if from_currency == base else rates.get(from_currency)
+        to_rate = Decimal('1') if to_currency == base else rates.get(to_currency)
+        if not from_rate or not to_rate:
+            return None
+        return (Decimal(str(to_rate)) / Decimal(str(from_rate))).quantize(Decimal('0.00000001'))
+    
+    def refresh_shared_rates(self, base_currency: str = 'CNY') -> Dict:
+        """一次请求刷新所有支持货币的汇率，发布共享快照并记录当天的历史汇率（用于定时任务）"""
+        from app import db
+        
+        url = f"https://api.exchangerate-api.com/v4/latest/{base_currency}"
+        response = requests.get(url, timeout=10)
+        response.raise_for_status()
+        all_rates = response.json().get('rates', {})
+        
+        rates = {
+            currency: str(all_rates[currency])
+            for currency in self.supported_currencies
+            if currency != base_currency and all_rates.get(currency)
+        }
+        if not rates:
+            raise RuntimeError(f"exchangerate-api 未返回 {base_currency} 的汇率")
+        
+        version = self.snapshot_store.publish({
+            'base': base_currency,
+            'rates': rates,
+            'fetched_at': datetime.utcnow().isoformat()
+        })
+        
+        # 记录当天汇率（货币 -> 基准货币）
+        today = date.today()
+        self.store_rates([
+            {
+                'rate_date': today,
+                'from_currency': currency,
+                'to_currency': base_currency,
+                'rate': (Decimal('1') / Decimal(rate)).quantize(Decimal('0.00000001'))
+            }
+            for currency, rate in rates.items()
+        ], source='exchangerate-api')
+        db.session.commit()
+        
+        # 本进程立即使用新快照
+        self._snapshot_checked_at = 0
+        
+        return {'version': version, 'base': base_currency, 'currencies': len(rates)}
+    
     def get_usd_to_cny_rate(self) -> Optional[Decimal]:
         """获取USD到CNY的汇率（保持向后兼容）"""
         return self.get_exchange_rate('USD', 'CNY')
     
     def _fetch_rate_from_apis(self, from_currency: str, to_currency: str) -> Optional[Decimal]:
-        """从多个API尝试获取汇率"""
+        """从多个API尝试获取汇率
+        
+        熔断中的API直接跳过；API抛出异常（超时、HTTP错误）计为一次失败，
+        返回None（未配置、不支持该货币）不影响熔断状态。
+        所有API都没有取到汇率时，该货币对进入负缓存。
+        """
+        cache_key = f'{from_currency}_{to_currency}'
+        expires_at = self.negative_cache.get(cache_key)
+        if expires_at and time.time() < expires_at:
+            return None
+        
         apis = [
-            lambda: self._fetch_from_exchangerate_api(from_currency, to_currency),
-            lambda: self._fetch_from_fixer_api(from_currency, to_currency),
-            lambda: self._fetch_from_currencyapi(from_currency, to_currency)
+            ('exchangerate-api', lambda: self._fetch_from_exchangerate_api(from_currency, to_currency)),
+            ('fixer', lambda: self._fetch_from_fixer_api(from_currency, to_currency)),
+            ('exchangerate.host', lambda: self._fetch_from_currencyapi(from_currency, to_currency))
         ]
         
-        for api_func in apis:
+        for name, api_func in apis:
+            breaker = self.breakers[name]
+            if not breaker.allow():
+                continue
             try:
                 rate = api_func()
-                if rate:
-                    return rate
             except Exception as e:
+                breaker.record_failure(e)
                 try:
                     current_app.logger.warning(f"汇率API调用失败: {e}")
                 except RuntimeError:
                     # 在应用上下文外部运行时
                     print(f"警告: 汇率API调用失败: {e}")
                 continue
+            if rate:
+                breaker.record_success()
+                self.negative_cache.pop(cache_key, None)
+                return rate
+            breaker.record_skip()
         
+        self.negative_cache[cache_key] = time.time() + self.negative_cache_duration
         return None
     
+    def get_provider_status(self) -> Dict:
+        """汇率API熔断器状态和负缓存"""
+        current_time = time.time()
+        return {
+            'providers': [breaker.to_dict() for breaker in self.breakers.values()],
+            'negative_cache': [
+                {'pair': cache_key, 'expires_in': round(expires_at - current_time, 1)}
+                for cache_key, expires_at in self.negative_cache.items()
+                if expires_at > current_time
+            ]
+        }
+    
+    def reset_providers(self):
+        """手动恢复所有熔断器并清空负缓存"""
+        for breaker in self.breakers.values():
+            breaker.reset()
+        self.negative_cache.clear()
+    
     def _fetch_from_exchangerate_api(self, from_currency: str, to_currency: str) -> Optional[Decimal]:
         """从 exchangerate-api.com 获取汇率"""
         try:
@@ -103,6 +247,7 @@ class ExchangeRateService:
                 current_app.logger.warning(f"exchangerate-api 调用失败: {e}")
             except RuntimeError:
                 print(f"警告: exchangerate-api 调用失败: {e}")
+            raise
         
         return None
     
@@ -135,6 +280,7 @@ class ExchangeRateService:
                 current_app.logger.warning(f"fixer.io 调用失败: {e}")
             except RuntimeError:
                 print(f"警告: fixer.io 调用失败: {e}")
+            raise
         
         return None
     
@@ -159,6 +305,7 @@ class ExchangeRateService:
                 current_app.logger.warning(f"exchangerate.host 调用失败: {e}")
             except RuntimeError:
                 print(f"警告: exchangerate.host 调用失败: {e}")
+            raise
         
         return None
     
@@ -169,10 +316,10 @@ class ExchangeRateService:
         
         # 如果目标货币为空或None，直接返回原始金额
         if not to_currency:
-            return Decimal(str(amount)).quantize(Decimal('0.01'))
+            return Decimal(str(amount)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
         
         if from_currency == to_currency:
-            return Decimal(str(amount)).quantize(Decimal('0.01'))
+            return Decimal(str(amount)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
         
         rate = self.get_exchange_rate(from_currency, to_currency)
         if rate is None:
@@ -181,16 +328,304 @@ class ExchangeRateService:
                 current_app.logger.warning(f"无法获取汇率 {from_currency} -> {to_currency}，返回原始金额")
             except RuntimeError:
                 print(f"警告: 无法获取汇率 {from_currency} -> {to_currency}，返回原始金额")
-            return Decimal(str(amount)).quantize(Decimal('0.01'))
+            return Decimal(str(amount)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
         
         amount_decimal = Decimal(str(amount))
         converted_amount = amount_decimal * rate
         
-        return converted_amount.quantize(Decimal('0.01'))  # 保留两位小数
+        return converted_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)  # 保留两位小数
+    
+    def convert_to_cny(self, amount: float, from_currency: str, on_date=None) -> Decimal:
+        """将任意货币金额转换为CNY
+        
+        Args:
+            amount: 金额
+            from_currency: 源货币
+            on_date: 汇率日期（如订单日期）。传入时使用该日期的历史汇率，不访问外部API
+        """
+        if on_date is None:
+            return self.convert_currency(amount, from_currency, 'CNY')
+        return self.convert_on_date(amount, from_currency, 'CNY', on_date)
+    
+    # convert_many 中汇率放大的倍数（保留8位小数）
+    RATE_SCALE = 10 ** 8
+    
+    def convert_many(self, amounts, currencies, to: str = 'CNY', dates=None, as_cents: bool = False):
+        """批量货币转换（向量化）
+        
+        金额转换为整数分、汇率放大为整数后用 NumPy int64 运算，按 ROUND_HALF_UP
+        （远离零，与 convert_currency、convert_on_date 相同）舍入到分，结果与逐笔 Decimal 计算一致。汇率按（货币, 日期）去重后只解析一次。
+        
+        Args:
+            amounts: 金额序列（两位小数）
+            currencies: 与金额等长的货币序列，或单个货币代码
+            to: 目标货币
+            dates: 与金额等长的日期序列，传入时使用各自日期的历史汇率（不访问外部API）；
+                   不传时使用当前汇率
+            as_cents: 为True时返回整数分（int64数组）
+        
+        Returns:
+            numpy数组：转换后的金额（float64，已舍入到分）或整数分
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        count = amounts.shape[0] if amounts.ndim else 0
+        if count == 0:
+            return np.zeros(0, dtype=np.int64 if as_cents else np.float64)
+        
+        if isinstance(currencies, str):
+            currencies = [currencies] * count
+        currencies = np.asarray([(currency or to).upper() for currency in currencies], dtype=object)
+        if currencies.shape[0] != count:
+            raise ValueError('金额与货币数量不一致')
+        
+        # 按（货币, 日期）去重解析汇率
+        if dates is not None:
+            day_keys = np.asarray([self._as_rate_date(value) for value in dates], dtype=object)
+            if day_keys.shape[0] != count:
+                raise ValueError('金额与日期数量不一致')
+            keys = np.asarray([f'{currency}|{day.isoformat() if day else ""}'
+                               for currency, day in zip(currencies, day_keys)], dtype=object)
+        else:
+            day_keys = None
+            keys = currencies
+        unique_keys, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        
+        unique_rates = np.empty(len(unique_keys), dtype=np.int64)
+        for position, index in enumerate(first_index):
+            from_currency = currencies[index]
+            if from_currency == to:
+                rate = Decimal('1')
+            elif day_keys is not None and day_keys[index] is not None:
+                rate = self.get_rate_on(from_currency, to, day_keys[index])
+                if rate is None:
+                    rate = self._fallback_rate(from_currency, to)
+            else:
+                rate = self.get_exchange_rate(from_currency, to) or Decimal('1')
+            unique_rates[position] = int((Decimal(str(rate)) * self.RATE_SCALE).to_integral_value())
+        rates = unique_rates[inverse]
+        
+        # 金额（分）× 汇率（放大1e8），四舍五入（远离零）回到分
+        cents = np.rint(amounts * 100).astype(np.int64)
+        limit = np.iinfo(np.int64).max
+        if int(np.abs(cents).max()) * int(rates.max()) >= limit:
+            # 超出int64范围时退回逐笔Decimal计算
+            converted = np.asarray([
+                int((Decimal(int(cent)) * Decimal(int(rate)) / self.RATE_SCALE).quantize(
+                    Decimal('1'), rounding=ROUND_HALF_UP))
+                for cent, rate in zip(cents, rates)
+            ], dtype=np.int64)
+        else:
+            product = cents * rates
+            converted = np.sign(product) * ((np.abs(product) + self.RATE_SCALE // 2) // self.RATE_SCALE)
+        
+        if as_cents:
+            return converted
+        return converted / 100.0
+    
+    @staticmethod
+    def _as_rate_date(value) -> Optional[date]:
+        if value is None or value == '':
+            return None
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    
+    def convert_on_date(self, amount: float, from_currency: str, to_currency: str, on_date) -> Decimal:
+        """按指定日期的历史汇率转换金额（只读内存，不访问外部API）"""
+        if not amount:
+            return Decimal('0')
+        
+        if not to_currency or not from_currency or from_currency == to_currency:
+            return Decimal(str(amount)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        
+        rate = self.get_rate_on(from_currency, to_currency, on_date)
+        if rate is None:
+            rate = self._fallback_rate(from_currency, to_currency)
+        
+        return (Decimal(str(amount)) * rate).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    
+    def get_rate_on(self, from_currency: str, to_currency: str, on_date) -> Optional[Decimal]:
+        """获取指定日期的历史汇率
+        
+        使用不晚于该日期的最近一条汇率；日期早于所有记录时使用最早的一条。
+        表中只有反向货币对时取倒数。没有任何记录时返回None。
+        """
+        if from_currency == to_currency:
+            return Decimal('1')
+        
+        historical = self._get_historical_rates()
+        
+        if isinstance(on_date, datetime):
+            on_date = on_date.date()
+        
+        series = historical.get((from_currency, to_currency))
+        if series:
+            return self._rate_in_series(series, on_date)
+        
+        series = historical.get((to_currency, from_currency))
+        if series:
+            rate = self._rate_in_series(series, on_date)
+            return Decimal('1') / rate if rate else None
+        
+        return None
+    
+    @staticmethod
+    def _rate_in_series(series, on_date: date) -> Decimal:
+        dates, rates = series
+        index = bisect_right(dates, on_date) - 1
+        return rates[max(index, 0)]
+    
+    def _fallback_rate(self, from_currency: str, to_currency: str) -> Decimal:
+        """没有历史汇率时：使用已缓存的实时汇率（不检查过期），否则使用默认汇率"""
+        cache_key = f'{from_currency}_{to_currency}'
+        cached_data = self.cache.get(cache_key)
+        if cached_data:
+            return cached_data['rate']
+        return self.DEFAULT_RATES.get(cache_key, Decimal('1'))
     
-    def convert_to_cny(self, amount: float, from_currency: str) -> Decimal:
-        """将任意货币金额转换为CNY"""
-        return self.convert_currency(amount, from_currency, 'CNY')
+    def _get_historical_rates(self) -> Dict:
+        """返回内存中的历史汇率，版本变化时重新加载
+        
+        invalidate_historical_rates() 只作用于当前进程，其他进程（如导入CSV的命令、
+        刷新汇率的定时任务）写入的汇率通过定期检查版本发现。
+        """
+        historical = self._historical
+        if historical is None:
+            return self.load_historical_rates()
+        
+        current_time = time.time()
+        if current_time - self._historical_checked_at >= self.historical_check_interval:
+            self._historical_checked_at = current_time
+            try:
+                version = self._read_historical_version()
+            except Exception as e:
+                try:
+                    current_app.logger.warning(f"检查历史汇率版本失败: {e}")
+                except RuntimeError:
+                    print(f"警告: 检查历史汇率版本失败: {e}")
+                return historical
+            if version != self._historical_version:
+                return self.load_historical_rates()
+        return historical
+    
+    @staticmethod
+    def _read_historical_version():
+        """历史汇率版本：(行数, 最大更新时间)，覆盖写入会更新 updated_at，删除会改变行数"""
+        from app import db
+        from sqlalchemy import func
+        from app.models.exchange_rate import ExchangeRate
+        
+        count, updated_at = db.session.query(
+            func.count(ExchangeRate.id), func.max(ExchangeRate.updated_at)
+        ).one()
+        return count, updated_at
+    
+    def load_historical_rates(self) -> Dict:
+        """从 exchange_rates 表预加载全部历史汇率到内存（一条版本查询 + 一条汇率查询）"""
+        from app import db
+        from app.models.exchange_rate import ExchangeRate
+        
+        with self._historical_lock:
+            historical = {}
+            version = None
+            try:
+                # 先读版本：加载期间其他进程写入的汇率会在下次检查时发现
+                version = self._read_historical_version()
+                rows = db.session.query(
+                    ExchangeRate.from_currency, ExchangeRate.to_currency,
+                    ExchangeRate.rate_date, ExchangeRate.rate
+                ).order_by(
+                    ExchangeRate.from_currency, ExchangeRate.to_currency, ExchangeRate.rate_date
+                ).all()
+            except Exception as e:
+                try:
+                    current_app.logger.warning(f"加载历史汇率失败: {e}")
+                except RuntimeError:
+                    print(f"警告: 加载历史汇率失败: {e}")
+                rows = []
+            
+            for from_currency, to_currency, rate_date, rate in rows:
+                dates, rates = historical.setdefault((from_currency, to_currency), ([], []))
+                dates.append(rate_date)
+                rates.append(Decimal(str(rate)))
+            
+            self._historical = historical
+            self._historical_version = version
+            self._historical_checked_at = time.time()
+            return historical
+    
+    def invalidate_historical_rates(self):
+        """历史汇率变更后调用，下次使用时重新加载"""
+        self._historical = None
+    
+    def store_rates(self, rows: List[Dict], source: Optional[str] = None) -> int:
+        """批量写入历史汇率（同一日期、货币对已存在时覆盖，不提交事务）
+        
+        Args:
+            rows: [{'rate_date': date, 'from_currency': 'USD', 'to_currency': 'CNY', 'rate': Decimal}, ...]
+            source: 汇率来源
+        """
+        from app import db
+        from app.models.exchange_rate import ExchangeRate
+        from app.utils.upsert import upsert_rows
+        
+        now = datetime.utcnow()
+        # 同一批中同一日期、货币对只保留最后一条
+        unique_rows = {}
+        for row in rows:
+            key = (row['rate_date'], row['from_currency'], row['to_currency'])
+            unique_rows[key] = {
+                'rate_date': row['rate_date'],
+                'from_currency': row['from_currency'],
+                'to_currency': row['to_currency'],
+                'rate': row['rate'],
+                'source': row.get('source') or source,
+                'created_at': now,
+                'updated_at': now
+            }
+        
+        upsert_rows(db.session, ExchangeRate, list(unique_rows.values()),
+                    ['rate_date', 'from_currency', 'to_currency'], ['rate', 'source', 'updated_at'])
+        self.invalidate_historical_rates()
+        return len(unique_rows)
+    
+    def load_rates_from_csv(self, path: str, batch_size: int = 1000) -> int:
+        """从本地CSV导入历史汇率并提交
+        
+        CSV需包含表头：date,from_currency,to_currency,rate（可选 source），
+        date 格式为 YYYY-MM-DD。
+        
+        Returns:
+            导入的汇率条数
+        """
+        from app import db
+        
+        total = 0
+        batch = []
+        with open(path, newline='', encoding='utf-8-sig') as csv_file:
+            for line_number, record in enumerate(csv.DictReader(csv_file), start=2):
+                try:
+                    batch.append({
+                        'rate_date': datetime.strptime(record['date'].strip(), '%Y-%m-%d').date(),
+                        'from_currency': record['from_currency'].strip().upper(),
+                        'to_currency': record['to_currency'].strip().upper(),
+                        'rate': Decimal(record['rate'].strip()),
+                        'source': (record.get('source') or '').strip() or None
+                    })
+                except Exception as e:
+                    raise ValueError(f"CSV第{line_number}行格式错误: {e}")
+                
+                if len(batch) >= batch_size:
+                    total += self.store_rates(batch, source='csv')
+                    db.session.commit()
+                    batch = []
+        
+        if batch:
+            total += self.store_rates(batch, source='csv')
+            db.session.commit()
+        return total
     
     def convert_usd_to_cny(self, usd_amount: float) -> Decimal:
         """将USD金额转换为CNY（保持向后兼容）"""
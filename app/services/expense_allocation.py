@@ -0,0 +1,225 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional
+from sqlalchemy import delete, event, inspect, insert
+from sqlalchemy.orm import Session
+from app.models.expense import Expense, expense_order_association
+from app.models.expense_allocation import ExpenseAllocation
+from app.models.order import Order
+from app import db
+
+
+# 会话中待重新分摊的费用ID、收入变动的订单ID（session.info 的键）
+DIRTY_EXPENSES_KEY = 'expense_allocations_dirty_expenses'
+DIRTY_ORDERS_KEY = 'expense_allocations_dirty_orders'
+
+# 分摊策略：(费用金额（分）, 订单列表) -> {订单ID: 分摊金额（分）}
+AllocationStrategy = Callable[[int, List], Dict[int, int]]
+
+
+def _split_cents(total_cents: int, weights: Dict[int, int]) -> Dict[int, int]:
+    """按权重把金额（分）拆分到各订单，最大余数法分配零头，合计与原金额完全一致"""
+    weight_sum = sum(weights.values())
+    shares = {}
+    remainders = []
+    for order_id, weight in weights.items():
+        share, remainder = divmod(total_cents * weight, weight_sum)
+        shares[order_id] = share
+        remainders.append((-remainder, order_id))
+    for _, order_id in sorted(remainders)[:total_cents - sum(shares.values())]:
+        shares[order_id] += 1
+    return shares
+
+
+def even_strategy(total_cents: int, orders: List) -> Dict[int, int]:
+    """平均分摊"""
+    return _split_cents(total_cents, {order.id: 1 for order in orders})
+
+
+def revenue_weighted_strategy(total_cents: int, orders: List) -> Dict[int, int]:
+    """按订单总价（换算为人民币，使用订单日期的历史汇率）加权分摊，订单收入都为0时平均分摊"""
+    from app.services.exchange_rate_service import exchange_rate_service
+
+    revenue_cents = exchange_rate_service.convert_many(
+        [float(order.total_price or 0) for order in orders],
+        [order.currency for order in orders],
+        dates=[order.order_date for order in orders],
+        as_cents=True
+    )
+    weights = {order.id: max(int(cents), 0) for order, cents in zip(orders, revenue_cents)}
+    if not sum(weights.values()):
+        return even_strategy(total_cents, orders)
+    return _split_cents(total_cents, weights)
+
+
+class ExpenseAllocationService:
+    """费用分摊表（expense_allocations）维护服务
+
+    费用新增、修改（金额、类别、分摊方式）、删除或费用-订单关联变动时，会话事件记录费用ID，
+    提交前重新计算这些费用的分摊（删除后批量插入），与业务数据在同一个事务中生效。
+    使用按收入加权的费用，在关联订单的总价变动时也会重新分摊。
+    分摊策略可通过 register_strategy() 扩展，费用的 allocation_strategy 字段选择策略。
+    直接写关联表、批量 upsert 订单等不经过ORM的操作需要调用 mark_expenses()、mark_orders() 登记。
+    """
+
+    DEFAULT_STRATEGY = 'even'
+    # 影响分摊结果的费用字段
+    TRACKED_EXPENSE_FIELDS = ('amount', 'category', 'allocation_strategy', 'orders')
+    # 影响按收入加权结果的订单字段
+    TRACKED_ORDER_FIELDS = ('total_price', 'currency', 'order_date')
+    CHUNK_SIZE = 500
+
+    def __init__(self):
+        self.strategies: Dict[str, AllocationStrategy] = {}
+
+    def register_strategy(self, name: str, strategy: AllocationStrategy):
+        """登记分摊策略"""
+        self.strategies[name] = strategy
+
+    def get_strategy(self, name: Optional[str]) -> AllocationStrategy:
+        try:
+            return self.strategies[name or self.DEFAULT_STRATEGY]
+        except KeyError:
+            raise ValueError(f"不支持的分摊方式: {name}")
+
+    def mark_expenses(self, expense_ids: Iterable[int], session=None):
+        """登记需要重新分摊的费用，在本事务提交前刷新"""
+        session = session or db.session
+        session.info.setdefault(DIRTY_EXPENSES_KEY, set()).update(
+            expense_id for expense_id in expense_ids if expense_id is not None
+        )
+
+    def mark_orders(self, order_ids: Iterable[int], session=None):
+        """登记总价可能变动的订单（如批量 upsert 订单后），提交前重新分摊按收入加权的关联费用"""
+        session = session or db.session
+        session.info.setdefault(DIRTY_ORDERS_KEY, set()).update(
+            order_id for order_id in order_ids if order_id is not None
+        )
+
+    def refresh_expenses(self, expense_ids: Iterable[int], session=None) -> int:
+        """重新计算指定费用的分摊（不提交事务）
+
+        每 CHUNK_SIZE 个费用：一条 DELETE，一条查询费用，一条查询关联订单，一条批量 INSERT。
+
+        Returns:
+            写入的分摊行数
+        """
+        session = session or db.session
+        expense_ids = sorted(set(expense_ids))
+        written = 0
+        for start in range(0, len(expense_ids), self.CHUNK_SIZE):
+            written += self._refresh_chunk(expense_ids[start:start + self.CHUNK_SIZE], session)
+        return written
+
+    def _refresh_chunk(self, expense_ids: List[int], session) -> int:
+        session.execute(
+            delete(ExpenseAllocation).where(ExpenseAllocation.expense_id.in_(expense_ids))
+            .execution_options(synchronize_session=False)
+        )
+
+        expenses = session.query(
+            Expense.id, Expense.amount, Expense.category, Expense.allocation_strategy
+        ).filter(Expense.id.in_(expense_ids)).all()
+        if not expenses:
+            return 0
+
+        association = expense_order_association.c
+        orders_by_expense = {expense.id: [] for expense in expenses}
+        for row in session.query(
+            association.expense_id, Order.id, Order.total_price, Order.currency, Order.order_date
+        ).join(Order, Order.id == association.order_id).filter(
+            association.expense_id.in_(orders_by_expense.keys())
+        ).order_by(association.expense_id, Order.id):
+            orders_by_expense[row.expense_id].append(row)
+
+        now = datetime.utcnow()
+        rows = []
+        for expense in expenses:
+            orders = orders_by_expense[expense.id]
+            if not orders or not expense.amount:
+                continue
+            strategy = expense.allocation_strategy or self.DEFAULT_STRATEGY
+            total_cents = int((Decimal(str(expense.amount)) * 100).to_integral_value())
+            for order_id, cents in self.get_strategy(strategy)(total_cents, orders).items():
+                rows.append({
+                    'expense_id': expense.id,
+                    'order_id': order_id,
+                    'category': expense.category,
+                    'allocated_amount_cny': Decimal(cents) / 100,
+                    'strategy': strategy,
+                    'updated_at': now
+                })
+        if rows:
+            session.execute(insert(ExpenseAllocation), rows)
+        return len(rows)
+
+    def rebuild(self) -> int:
+        """重新计算全部费用的分摊并提交（用于回填历史数据），返回写入的分摊行数"""
+        expense_ids = [expense_id for expense_id, in db.session.query(Expense.id).order_by(Expense.id)]
+        db.session.execute(delete(ExpenseAllocation).execution_options(synchronize_session=False))
+        written = 0
+        for start in range(0, len(expense_ids), self.CHUNK_SIZE):
+            written += self._refresh_chunk(expense_ids[start:start + self.CHUNK_SIZE], db.session)
+            db.session.commit()
+        db.session.commit()
+        return written
+
+    # ==================== 会话事件 ====================
+
+    def _collect_dirty(self, session, flush_context):
+        """flush后记录变动的费用（此时新增费用已有ID）和总价变动的订单"""
+        expense_ids = set()
+        order_ids = set()
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Expense):
+                state = inspect(obj)
+                if obj in session.new or obj in session.deleted or any(
+                    state.attrs[field].history.has_changes() for field in self.TRACKED_EXPENSE_FIELDS
+                ):
+                    expense_ids.add(obj.id)
+            elif isinstance(obj, Order):
+                # 从订单一侧修改关联（order.expenses）时，增删的费用都需要重新分摊
+                state = inspect(obj)
+                history = state.attrs.expenses.history
+                expense_ids.update(expense.id for expense in list(history.added or ()) + list(history.deleted or ()))
+                if obj not in session.new and any(
+                    state.attrs[field].history.has_changes() for field in self.TRACKED_ORDER_FIELDS
+                ):
+                    order_ids.add(obj.id)
+        if expense_ids:
+            self.mark_expenses(expense_ids, session)
+        if order_ids:
+            self.mark_orders(order_ids, session)
+
+    def _refresh_before_commit(self, session):
+        # 改动在 after_flush 中收集，先flush再检查
+        session.flush()
+        if not session.info.get(DIRTY_EXPENSES_KEY) and not session.info.get(DIRTY_ORDERS_KEY):
+            return
+        expense_ids = session.info.pop(DIRTY_EXPENSES_KEY, set())
+        order_ids = session.info.pop(DIRTY_ORDERS_KEY, set())
+        if order_ids:
+            # 订单总价变动只影响按收入加权分摊的费用
+            order_ids = list(order_ids)
+            for start in range(0, len(order_ids), self.CHUNK_SIZE):
+                expense_ids.update(
+                    expense_id for expense_id, in session.query(ExpenseAllocation.expense_id).filter(
+                        ExpenseAllocation.order_id.in_(order_ids[start:start + self.CHUNK_SIZE]),
+                        ExpenseAllocation.strategy != 'even'
+                    ).distinct()
+                )
+        self.refresh_expenses(expense_ids, session)
+
+    def _discard_dirty(self, session):
+        session.info.pop(DIRTY_EXPENSES_KEY, None)
+        session.info.pop(DIRTY_ORDERS_KEY, None)
+
+
+# 创建全局实例
+expense_allocation = ExpenseAllocationService()
+expense_allocation.register_strategy('even', even_strategy)
+expense_allocation.register_strategy('revenue_weighted', revenue_weighted_strategy)
+
+event.listen(Session, 'after_flush', expense_allocation._collect_dirty)
+event.listen(Session, 'before_commit', expense_allocation._refresh_before_commit)
+event.listen(Session, 'after_rollback', expense_allocation._discard_dirty)
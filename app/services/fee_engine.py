@@ -0,0 +1,149 @@
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func
+from app.models.fee_config import FeeConfig
+from app import db
+
+
+# 单条手续费规则（不可变）
+FeeRule = namedtuple('FeeRule', [
+    'gateway', 'fee_config_id', 'calculation_method', 'percentage_rate', 'fixed_amount', 'currency'
+])
+
+# 单笔支付的手续费计算结果
+FeeResult = namedtuple('FeeResult', ['fee_percentage', 'fee_fixed', 'total_fee', 'net_amount'])
+
+
+class FeeRuleTable:
+    """编译后的手续费规则表：按支付网关索引，加载后不可修改"""
+
+    def __init__(self, rules: Dict[str, FeeRule], version):
+        self.rules = MappingProxyType(dict(rules))
+        self.version = version
+
+    def get(self, gateway: Optional[str]) -> Optional[FeeRule]:
+        return self.rules.get(gateway) if gateway else None
+
+
+class FeeEngine:
+    """手续费规则引擎
+
+    把所有启用的支付类 FeeConfig 一次性加载为按网关索引的不可变规则表，
+    一批支付只做一次版本检查，之后全部在内存中计算，不再逐笔查询数据库
+    或汇率接口。费用配置变更时（/settings/fees）调用 invalidate()，
+    其他进程通过版本戳（配置数量 + 最后更新时间）发现变更。
+    """
+
+    # 支付网关与费用名称的对应关系（费用名称中包含网关关键字即可匹配）
+    GATEWAY_FEE_NAMES = {
+        'paypal': 'PayPal手续费',
+        'stripe': 'Stripe手续费',
+    }
+
+    def __init__(self):
+        self._table: Optional[FeeRuleTable] = None
+
+    def invalidate(self):
+        """丢弃当前规则表，下次使用时重新加载"""
+        self._table = None
+
+    def current_table(self) -> FeeRuleTable:
+        """获取当前规则表，版本戳变化时重新编译"""
+        version = self._load_version()
+        table = self._table
+        if table is None or table.version != version:
+            table = self._compile(version)
+            self._table = table
+        return table
+
+    def calculate_batch(self, payments: Iterable[Tuple[Optional[str], Decimal, Optional[str]]]) -> List[FeeResult]:
+        """批量计算手续费
+
+        Args:
+            payments: (支付网关, 支付金额, 订单货币) 列表
+
+        Returns:
+            与输入顺序一致的 FeeResult 列表
+        """
+        payments = list(payments)
+        if not payments:
+            return []
+
+        table = self.current_table()
+
+        # 一批中每个货币对只取一次汇率
+        rates = {}
+        for gateway, amount, currency in payments:
+            rule = table.get(gateway)
+            if rule and currency and rule.currency and currency != rule.currency:
+                rates.setdefault((currency, rule.currency), None)
+        if rates:
+            from app.services.exchange_rate_service import exchange_rate_service
+            for from_currency, to_currency in list(rates):
+                rates[(from_currency, to_currency)] = exchange_rate_service.get_exchange_rate(from_currency, to_currency)
+
+        return [self._calculate(table.get(gateway), amount, currency, rates) for gateway, amount, currency in payments]
+
+    def _calculate(self, rule: Optional[FeeRule], amount, currency, rates) -> FeeResult:
+        amount = Decimal(str(amount or 0))
+        if rule is None:
+            # 没有费用配置时不收取手续费
+            return FeeResult(Decimal('0'), Decimal('0'), Decimal('0'), amount)
+
+        # 订单货币与费用配置货币不同，按汇率换算后计算
+        converted_amount = amount
+        if currency and rule.currency and currency != rule.currency:
+            rate = rates.get((currency, rule.currency))
+            if rate is not None:
+                converted_amount = amount * Decimal(str(rate))
+
+        percentage_fee = converted_amount * rule.percentage_rate / Decimal('100')
+        if rule.calculation_method == 'percentage':
+            fee = percentage_fee
+            fee_percentage, fee_fixed = rule.percentage_rate, rule.fixed_amount
+        elif rule.calculation_method == 'fixed':
+            fee = rule.fixed_amount
+            fee_percentage, fee_fixed = Decimal('0'), rule.fixed_amount
+        elif rule.calculation_method == 'percentage_plus_fixed':
+            fee = percentage_fee + rule.fixed_amount
+            fee_percentage, fee_fixed = rule.percentage_rate, rule.fixed_amount
+        else:
+            fee = Decimal('0')
+            fee_percentage, fee_fixed = Decimal('0'), Decimal('0')
+
+        total_fee = fee.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        return FeeResult(fee_percentage, fee_fixed, total_fee, amount - total_fee)
+
+    def _load_version(self):
+        """版本戳：启用配置数量 + 最后更新时间"""
+        count, last_updated = db.session.query(
+            func.count(FeeConfig.id), func.max(FeeConfig.updated_at)
+        ).filter(FeeConfig.is_active == True).one()
+        return (count, last_updated)
+
+    def _compile(self, version) -> FeeRuleTable:
+        configs = FeeConfig.query.filter_by(fee_type='payment', is_active=True).order_by(FeeConfig.id).all()
+
+        rules = {}
+        for gateway, fee_name in self.GATEWAY_FEE_NAMES.items():
+            # 优先精确匹配默认费用名称，其次匹配名称中包含网关关键字的配置
+            matched = next((config for config in configs if config.fee_name == fee_name), None)
+            if matched is None:
+                matched = next((config for config in configs if gateway in (config.fee_name or '').lower()), None)
+            if matched is None:
+                continue
+            rules[gateway] = FeeRule(
+                gateway=gateway,
+                fee_config_id=matched.id,
+                calculation_method=matched.calculation_method,
+                percentage_rate=Decimal(str(matched.percentage_rate or 0)),
+                fixed_amount=Decimal(str(matched.fixed_amount or 0)),
+                currency=matched.currency,
+            )
+        return FeeRuleTable(rules, version)
+
+
+# 创建全局实例
+fee_engine = FeeEngine()
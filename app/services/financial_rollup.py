@@ -0,0 +1,249 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import case, delete, event, func, inspect, insert
+from sqlalchemy.orm import Session
+from app.models.daily_financial import DailyFinancial
+from app.models.expense import Expense
+from app.models.order import Order
+from app.models.order_cost import OrderCost
+from app.utils.date_ranges import date_bucket, dates_range, in_range
+from app import db
+
+
+# 会话中待刷新的日期集合（session.info 的键）
+DIRTY_DAYS_KEY = 'daily_financials_dirty_days'
+
+# 计入收入的订单支付状态
+PAID_STATUSES = ('paid', 'partially_paid')
+
+
+def _as_date(value) -> Optional[date]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class FinancialRollupService:
+    """每日财务汇总表（daily_financials）维护服务
+
+    订单、费用、订单成本写入时，会话事件记录受影响的日期，提交前按日期
+    重新汇总这几天的数据（删除后重新插入），与业务数据在同一个事务中生效。
+    批量 upsert 等不经过ORM的写入需要调用 mark_days() 登记日期。
+    报表只读取汇总表，耗时与历史数据量无关。
+    """
+
+    # 会话事件中需要跟踪的模型及其日期字段
+    TRACKED_DATE_FIELDS = {
+        Order: 'created_at',
+        Expense: 'expense_date',
+        OrderCost: 'cost_date',
+    }
+
+    def mark_days(self, days: Iterable, session=None):
+        """登记需要重新汇总的日期，在本事务提交前刷新"""
+        session = session or db.session
+        session.info.setdefault(DIRTY_DAYS_KEY, set()).update(
+            day for day in (_as_date(value) for value in days) if day
+        )
+
+    def refresh_days(self, days: Iterable, session=None) -> int:
+        """重新汇总指定日期（不提交事务）
+
+        Returns:
+            写入的汇总行数
+        """
+        session = session or db.session
+        days = sorted({day for day in (_as_date(value) for value in days) if day})
+        written = 0
+        for start, end in self._contiguous_ranges(days):
+            written += self._refresh_range(start, end, session)
+        return written
+
+    def rebuild(self, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                chunk_days: int = 31) -> Dict[str, int]:
+        """重建汇总表（用于历史数据回填），按 chunk_days 分段提交
+
+        Args:
+            start_date: 开始日期，默认为最早的业务数据日期
+            end_date: 结束日期，默认为最晚的业务数据日期
+            chunk_days: 每个事务处理的天数
+        """
+        stats = {'days': 0, 'rows': 0}
+        if start_date is None or end_date is None:
+            first, last = self._data_date_range()
+            start_date = start_date or first
+            end_date = end_date or last
+        if start_date is None or end_date is None:
+            return stats
+
+        current = start_date
+        while current <= end_date:
+            chunk_end = min(current + timedelta(days=chunk_days - 1), end_date)
+            stats['rows'] += self._refresh_range(current, chunk_end, db.session)
+            db.session.commit()
+            stats['days'] += (chunk_end - current).days + 1
+            current = chunk_end + timedelta(days=1)
+        return stats
+
+    # ==================== 汇总计算 ====================
+
+    def _refresh_range(self, start: date, end: date, session) -> int:
+        rows = self._aggregate(start, end, session)
+        table = DailyFinancial.__table__
+        session.execute(delete(table).where(table.c.date >= start, table.c.date <= end))
+        if rows:
+            session.execute(insert(table), rows)
+        return len(rows)
+
+    def _aggregate(self, start: date, end: date, session) -> List[Dict]:
+        """按（日期, 货币）汇总 [start, end] 范围内的数据，每个数据源一条分组查询"""
+        from app.services.exchange_rate_service import exchange_rate_service
+
+        now = datetime.utcnow()
+        buckets = {}
+
+        def bucket(day, currency):
+            key = (_as_date(day), currency)
+            if key not in buckets:
+                buckets[key] = {
+                    'date': key[0],
+                    'currency': currency,
+                    'revenue': Decimal('0'),
+                    'revenue_cny': Decimal('0'),
+                    'expense_cny': Decimal('0'),
+                    'order_cost_cny': Decimal('0'),
+                    'order_count': 0,
+                    'paid_count': 0,
+                    'updated_at': now,
+                }
+            return buckets[key]
+
+        def to_cny(amount, currency, day) -> Decimal:
+            amount = Decimal(str(amount or 0))
+            if currency == 'CNY' or not amount:
+                return amount
+            # 使用当天的历史汇率（内存映射，不访问外部API）
+            return Decimal(str(exchange_rate_service.convert_to_cny(float(amount), currency, _as_date(day))))
+
+        # 订单：订单数、已支付订单数、已支付订单的实际到账金额
+        is_paid = Order.financial_status.in_(PAID_STATUSES)
+        order_day = date_bucket(Order.created_at)
+        order_currency = func.coalesce(Order.currency, 'USD')
+        order_rows = session.query(
+            order_day.label('day'),
+            order_currency.label('currency'),
+            func.count(Order.id).label('order_count'),
+            func.sum(case((is_paid, 1), else_=0)).label('paid_count'),
+            func.sum(case((is_paid, Order.actual_received), else_=0)).label('revenue')
+        ).filter(
+            in_range(Order.created_at, *dates_range(start, end))
+        ).group_by(order_day, order_currency).all()
+
+        for row in order_rows:
+            item = bucket(row.day, row.currency)
+            item['order_count'] += row.order_count or 0
+            item['paid_count'] += int(row.paid_count or 0)
+            item['revenue'] += Decimal(str(row.revenue or 0))
+            item['revenue_cny'] += to_cny(row.revenue, row.currency, row.day)
+
+        # 费用记录
+        expense_rows = session.query(
+            Expense.expense_date.label('day'),
+            Expense.currency,
+            func.sum(Expense.amount).label('total')
+        ).filter(
+            Expense.expense_date >= start,
+            Expense.expense_date <= end,
+            Expense.amount.isnot(None),
+            Expense.currency.isnot(None)
+        ).group_by(Expense.expense_date, Expense.currency).all()
+
+        for row in expense_rows:
+            bucket(row.day, row.currency)['expense_cny'] += to_cny(row.total, row.currency, row.day)
+
+        # 已确认的订单成本（物流费用 + 方果费用 + 其他费用，已经是人民币）
+        cost_rows = session.query(
+            OrderCost.cost_date.label('day'),
+            func.sum(
+                func.coalesce(OrderCost.shipping_cost, 0) +
+                func.coalesce(OrderCost.fangguo_cost, 0) +
+                func.coalesce(OrderCost.other_cost, 0)
+            ).label('total')
+        ).filter(
+            OrderCost.cost_date >= start,
+            OrderCost.cost_date <= end,
+            OrderCost.status == 'confirmed'
+        ).group_by(OrderCost.cost_date).all()
+
+        for row in cost_rows:
+            bucket(row.day, 'CNY')['order_cost_cny'] += Decimal(str(row.total or 0))
+
+        cent = Decimal('0.01')
+        for item in buckets.values():
+            for field in ('revenue', 'revenue_cny', 'expense_cny', 'order_cost_cny'):
+                item[field] = item[field].quantize(cent, rounding=ROUND_HALF_UP)
+        return list(buckets.values())
+
+    def _data_date_range(self) -> Tuple[Optional[date], Optional[date]]:
+        """业务数据中最早和最晚的日期"""
+        candidates = [
+            db.session.query(func.min(Order.created_at), func.max(Order.created_at)).one(),
+            db.session.query(func.min(Expense.expense_date), func.max(Expense.expense_date)).one(),
+            db.session.query(func.min(OrderCost.cost_date), func.max(OrderCost.cost_date)).one(),
+        ]
+        firsts = [_as_date(first) for first, _ in candidates if first is not None]
+        lasts = [_as_date(last) for _, last in candidates if last is not None]
+        return (min(firsts) if firsts else None, max(lasts) if lasts else None)
+
+    @staticmethod
+    def _contiguous_ranges(days: List[date]) -> List[Tuple[date, date]]:
+        """把排序后的日期合并为连续区间"""
+        ranges = []
+        for day in days:
+            if ranges and day == ranges[-1][1] + timedelta(days=1):
+                ranges[-1] = (ranges[-1][0], day)
+            else:
+                ranges.append((day, day))
+        return ranges
+
+    # ==================== 会话事件 ====================
+
+    def _collect_dirty_days(self, session, flush_context, instances):
+        """flush前记录新增、修改、删除的业务数据涉及的日期（包括修改前的日期）"""
+        days = set()
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            field = self.TRACKED_DATE_FIELDS.get(type(obj))
+            if field is None:
+                continue
+            value = getattr(obj, field)
+            if value is None and obj in session.new:
+                # created_at 在插入时才取默认值
+                value = datetime.utcnow()
+            days.add(value)
+            days.update(inspect(obj).attrs[field].history.deleted or ())
+        if days:
+            self.mark_days(days, session)
+
+    def _refresh_before_commit(self, session):
+        # before_commit 在提交前最后一次自动flush之前触发，先flush才能收集到未flush的改动
+        session.flush()
+        if not session.info.get(DIRTY_DAYS_KEY):
+            return
+        days = session.info.pop(DIRTY_DAYS_KEY, set())
+        self.refresh_days(days, session)
+
+    def _discard_dirty_days(self, session):
+        session.info.pop(DIRTY_DAYS_KEY, None)
+
+
+# 创建全局实例
+financial_rollup = FinancialRollupService()
+
+event.listen(Session, 'before_flush', financial_rollup._collect_dirty_days)
+event.listen(Session, 'before_commit', financial_rollup._refresh_before_commit)
+event.listen(Session, 'after_rollback', financial_rollup._discard_dirty_days)
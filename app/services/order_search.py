@@ -0,0 +1,129 @@
+import re
+from typing import Iterable, Optional, Sequence
+from flask import current_app
+from sqlalchemy import column, inspect, or_, select, table, text
+from app.models.order import Order
+from app import db
+
+
+class OrderSearchIndex:
+    """订单全文搜索索引（订单号、客户邮箱、客户姓名）
+
+    SQLite 使用 FTS5 虚拟表 orders_fts（rowid 即 orders.id），由订单批量写入器
+    在 upsert 后同步；MySQL 使用 orders 表上的 FULLTEXT 索引，由数据库自动维护。
+    搜索词按单词切分后做前缀匹配（如 "1001" 匹配 "#10012"，"john" 匹配
+    "john.doe@example.com"）。索引不可用时（其他数据库、未执行迁移）退回 ILIKE 扫描。
+    """
+
+    FTS_TABLE = 'orders_fts'
+    FULLTEXT_INDEX = 'ft_orders_search'
+    COLUMNS = ('order_number', 'customer_email', 'customer_name')
+
+    def __init__(self):
+        self._available = {}
+
+    def _dialect(self, session) -> str:
+        return session.get_bind().dialect.name
+
+    def is_available(self, session=None) -> bool:
+        """当前数据库是否已建立搜索索引（按数据库地址缓存结果）"""
+        session = session or db.session
+        bind = session.get_bind()
+        key = str(bind.url)
+        if key not in self._available:
+            inspector = inspect(bind)
+            if bind.dialect.name == 'sqlite':
+                available = inspector.has_table(self.FTS_TABLE)
+            elif bind.dialect.name == 'mysql':
+                available = any(
+                    index['name'] == self.FULLTEXT_INDEX for index in inspector.get_indexes('orders')
+                )
+            else:
+                available = False
+            self._available[key] = available
+        return self._available[key]
+
+    @staticmethod
+    def _tokens(term: str):
+        return re.findall(r'\w+', term or '', re.UNICODE)
+
+    def filter(self, query, term: str, columns: Optional[Sequence[str]] = None):
+        """给订单查询加上搜索条件
+
+        Args:
+            query: 订单查询
+            term: 搜索词
+            columns: 只在指定字段中搜索（默认三个字段都搜索）
+        """
+        term = (term or '').strip()
+        if not term:
+            return query
+        columns = columns or self.COLUMNS
+
+        tokens = self._tokens(term)
+        if not tokens or not self.is_available():
+            # 没有可索引的单词（如只输入了 "#"）或没有索引时使用原来的模糊匹配
+            return query.filter(or_(*[getattr(Order, name).ilike(f'%{term}%') for name in columns]))
+
+        if self._dialect(db.session) == 'sqlite':
+            match = ' '.join(f'"{token}"*' for token in tokens)
+            if tuple(columns) != self.COLUMNS:
+                match = '{' + ' '.join(columns) + '} : (' + match + ')'
+            fts = table(self.FTS_TABLE, column('rowid'))
+            query = query.filter(Order.id.in_(
+                select(fts.c.rowid).where(text(f'{self.FTS_TABLE} MATCH :order_search').bindparams(order_search=match))
+            ))
+        else:
+            match = ' '.join(f'+{token}*' for token in tokens)
+            query = query.filter(text(
+                f"MATCH ({', '.join(f'orders.{name}' for name in self.COLUMNS)}) "
+                "AGAINST (:order_search IN BOOLEAN MODE)"
+            ).bindparams(order_search=match))
+            if tuple(columns) != self.COLUMNS:
+                # FULLTEXT 索引覆盖三个字段，限定字段时在命中的行上再过滤一次
+                query = query.filter(or_(*[getattr(Order, name).ilike(f'%{term}%') for name in columns]))
+        return query
+
+    def sync_orders(self, order_ids: Iterable[int], session=None):
+        """按订单ID刷新搜索索引（不提交事务）；MySQL 的 FULLTEXT 索引无需同步"""
+        session = session or db.session
+        order_ids = [order_id for order_id in order_ids if order_id is not None]
+        if not order_ids or self._dialect(session) != 'sqlite' or not self.is_available(session):
+            return
+
+        columns = ', '.join(self.COLUMNS)
+        values = ', '.join(f"COALESCE({name}, '')" for name in self.COLUMNS)
+        for start in range(0, len(order_ids), 500):
+            chunk = order_ids[start:start + 500]
+            params = {f'id_{index}': order_id for index, order_id in enumerate(chunk)}
+            placeholders = ', '.join(f':{name}' for name in params)
+            session.execute(text(
+                f'DELETE FROM {self.FTS_TABLE} WHERE rowid IN ({placeholders})'
+            ), params)
+            session.execute(text(
+                f'INSERT INTO {self.FTS_TABLE} (rowid, {columns}) '
+                f'SELECT id, {values} FROM orders WHERE id IN ({placeholders})'
+            ), params)
+
+    def rebuild(self) -> int:
+        """重建 SQLite 搜索索引（用于回填或修复），返回索引的订单数量"""
+        if self._dialect(db.session) != 'sqlite':
+            current_app.logger.info('当前数据库使用 FULLTEXT 索引或不支持搜索索引，无需重建')
+            return 0
+
+        columns = ', '.join(self.COLUMNS)
+        values = ', '.join(f"COALESCE({name}, '')" for name in self.COLUMNS)
+        db.session.execute(text(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.FTS_TABLE} USING fts5({columns})'
+        ))
+        db.session.execute(text(f'DELETE FROM {self.FTS_TABLE}'))
+        db.session.execute(text(
+            f'INSERT INTO {self.FTS_TABLE} (rowid, {columns}) SELECT id, {values} FROM orders'
+        ))
+        db.session.commit()
+        self._available.clear()
+        return db.session.query(Order.id).count()
+
+
+# 创建全局实例
+order_search = OrderSearchIndex()
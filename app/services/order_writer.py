@@ -0,0 +1,312 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+from app.models.order import Order
+from app.models.product import Product
+from app.models.payment import Payment
+from app.services.product_cache import ProductCache
+from app.services.fee_engine import fee_engine
+from app.services.financial_rollup import financial_rollup
+from app.services.expense_allocation import expense_allocation
+from app.services.order_search import order_search
+from app.utils.upsert import upsert_rows
+from app import db
+
+
+def _get(obj, name, default=None):
+    """同时兼容Shopify资源对象和webhook的JSON字典"""
+    if obj is None:
+        return default
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def _as_list(value):
+    """确保关联数据（line_items、transactions）是可迭代的列表"""
+    if value is None:
+        return []
+    if hasattr(value, '__call__'):
+        value = value()
+    if not hasattr(value, '__iter__') or isinstance(value, (str, bytes, dict)):
+        return []
+    return list(value)
+
+
+def _parse_datetime(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _decimal(value, default='0'):
+    if value is None or value == '':
+        return Decimal(default)
+    return Decimal(str(value))
+
+
+class OrderBulkWriter:
+    """订单批量写入器
+
+    把一页Shopify订单规范化后，按表用一条 INSERT ... ON CONFLICT DO UPDATE
+    （SQLite/PostgreSQL）或 INSERT ... ON DUPLICATE KEY UPDATE（MySQL）写入
+    products、orders、payments，代替逐条 SELECT + merge/add。
+    每页固定为少量语句，与订单数无关。
+    """
+
+    # 更新时由Shopify数据覆盖的字段；cost、product_type等本地维护的字段不会被覆盖
+    PRODUCT_UPDATE_COLUMNS = ['title', 'variant_title', 'sku', 'price', 'vendor', 'updated_at']
+    ORDER_UPDATE_COLUMNS = [
+        'order_number', 'customer_email', 'customer_name', 'total_price', 'subtotal_price',
+        'total_tax', 'shipping_price', 'currency', 'financial_status', 'fulfillment_status',
+        'order_date', 'created_at', 'updated_at', 'product_cost', 'payment_method',
+        'payment_fee', 'actual_received', 'gross_profit', 'profit_margin'
+    ]
+    PAYMENT_UPDATE_COLUMNS = [
+        'payment_method', 'amount', 'currency', 'fee_fixed', 'fee_percentage',
+        'total_fee', 'net_amount', 'status', 'payment_date', 'updated_at'
+    ]
+
+    def __init__(self, session=None):
+        self.session = session or db.session
+
+    # ==================== 规范化 ====================
+
+    def normalize(self, shopify_order) -> Dict:
+        """把Shopify订单（资源对象或JSON字典）转换为写入所需的纯数据结构"""
+        billing_address = _get(shopify_order, 'billing_address')
+        customer_name = f"{_get(billing_address, 'first_name') or ''} {_get(billing_address, 'last_name') or ''}".strip()
+
+        total_price = _decimal(_get(shopify_order, 'total_price'))
+        subtotal_price = _get(shopify_order, 'subtotal_price')
+        total_tax = _get(shopify_order, 'total_tax')
+        shipping_price_set = _get(shopify_order, 'total_shipping_price_set')
+        shipping_price = _get(_get(shipping_price_set, 'shop_money'), 'amount')
+        created_at = _parse_datetime(_get(shopify_order, 'created_at'))
+
+        order = {
+            'shopify_order_id': str(_get(shopify_order, 'id')),
+            'order_number': str(_get(shopify_order, 'order_number')),
+            'customer_email': _get(shopify_order, 'email'),
+            'customer_name': customer_name,
+            'total_price': total_price,
+            'subtotal_price': _decimal(subtotal_price) if subtotal_price else total_price,
+            'total_tax': _decimal(total_tax) if total_tax else Decimal('0'),
+            'shipping_price': _decimal(shipping_price) if shipping_price else Decimal('0'),
+            'currency': _get(shopify_order, 'currency'),
+            'financial_status': _get(shopify_order, 'financial_status'),
+            'fulfillment_status': _get(shopify_order, 'fulfillment_status') or 'unfulfilled',
+            'order_date': created_at,
+            'created_at': created_at,
+            'updated_at': _parse_datetime(_get(shopify_order, 'updated_at')),
+        }
+
+        line_items = []
+        for line_item in _as_list(_get(shopify_order, 'line_items')):
+            product_id = _get(line_item, 'product_id')
+            variant_id = _get(line_item, 'variant_id')
+            # 自定义商品没有product_id/variant_id，无法关联到商品表
+            if not product_id or not variant_id:
+                continue
+            line_items.append({
+                'shopify_product_id': str(product_id),
+                'shopify_variant_id': str(variant_id),
+                'title': _get(line_item, 'title'),
+                'variant_title': _get(line_item, 'variant_title'),
+                'sku': _get(line_item, 'sku'),
+                'price': _decimal(_get(line_item, 'price')),
+                'vendor': _get(line_item, 'vendor'),
+                'quantity': int(_get(line_item, 'quantity') or 0),
+            })
+
+        transactions = []
+        for transaction in _as_list(_get(shopify_order, 'transactions')):
+            # 处理成功的sale交易（直接支付）或capture交易（PayPal授权后捕获）
+            if _get(transaction, 'status') != 'success' or _get(transaction, 'kind') not in ['sale', 'capture']:
+                continue
+            gateway = _get(transaction, 'gateway') or 'unknown'
+            # 统一支付方式命名
+            if 'stripe' in gateway.lower():
+                payment_method = 'stripe'
+            elif 'paypal' in gateway.lower():
+                payment_method = 'paypal'
+            else:
+                payment_method = gateway
+            processed_at = _get(transaction, 'processed_at')
+            transactions.append({
+                'transaction_id': str(_get(transaction, 'id')),
+                'payment_method': payment_method,
+                'amount': _decimal(_get(transaction, 'amount')),
+                'status': _get(transaction, 'status'),
+                'payment_date': _parse_datetime(processed_at) if processed_at else datetime.utcnow(),
+            })
+
+        return {'order': order, 'line_items': line_items, 'transactions': transactions}
+
+    # ==================== 写入 ====================
+
+    def write_page(self, normalized_orders: List[Dict], product_cache: Optional[ProductCache] = None) -> Dict[str, int]:
+        """写入一页规范化后的订单（不提交事务，由调用方控制提交）
+
+        Args:
+            normalized_orders: normalize() 的结果列表
+            product_cache: 同步运行内共享的商品缓存，不传则仅在本页内有效
+
+        Returns:
+            Dict包含新增/更新订单数量
+        """
+        stats = {'new_orders': 0, 'updated_orders': 0}
+        if not normalized_orders:
+            return stats
+
+        now = datetime.utcnow()
+        if product_cache is None:
+            product_cache = ProductCache(self.session)
+
+        # 同一页中同一订单可能出现多次，只保留最后一次
+        by_shopify_id = {}
+        for item in normalized_orders:
+            by_shopify_id[item['order']['shopify_order_id']] = item
+        items = list(by_shopify_id.values())
+        shopify_ids = list(by_shopify_id.keys())
+
+        # 1. 商品
+        self._write_products(items, product_cache, now)
+
+        # 2. 查询已存在订单（判断新增/更新，并保留本地维护的物流成本等字段）
+        existing = {
+            row.shopify_order_id: row
+            for row in self.session.query(
+                Order.shopify_order_id, Order.shipping_cost, Order.payment_method, Order.payment_fee
+            ).filter(Order.shopify_order_id.in_(shopify_ids)).all()
+        }
+
+        # 3. 整页支付一次性计算手续费，再计算订单派生字段
+        fee_results = iter(fee_engine.calculate_batch(
+            (transaction['payment_method'], transaction['amount'], item['order']['currency'])
+            for item in items
+            for transaction in item['transactions']
+        ))
+        order_rows = []
+        payment_rows_by_order = {}
+        for item in items:
+            order_data = dict(item['order'])
+            previous = existing.get(order_data['shopify_order_id'])
+
+            total_cost = Decimal('0')
+            for line_item in item['line_items']:
+                cost = product_cache.cost(line_item['shopify_variant_id'])
+                if cost:
+                    total_cost += Decimal(str(cost)) * Decimal(str(line_item['quantity']))
+            order_data['product_cost'] = total_cost
+
+            payment_method = previous.payment_method if previous else None
+            payment_fee = previous.payment_fee if previous else None
+            payment_rows = []
+            for transaction in item['transactions']:
+                payment = self._build_payment(transaction, order_data['currency'], next(fee_results))
+                payment_rows.append(payment)
+                # 将支付方式和手续费同步到订单表
+                if payment['payment_method']:
+                    payment_method = payment['payment_method']
+                    if payment['total_fee']:
+                        payment_fee = Decimal(str(payment['total_fee']))
+            payment_rows_by_order[order_data['shopify_order_id']] = payment_rows
+
+            # 复用模型上的计算逻辑
+            calculator = Order(
+                total_price=order_data['total_price'],
+                payment_fee=payment_fee,
+                product_cost=order_data['product_cost'],
+                shipping_cost=previous.shipping_cost if previous and previous.shipping_cost is not None else Decimal('0')
+            )
+            calculator.calculate_actual_received()
+            calculator.calculate_profit()
+
+            order_data['payment_method'] = payment_method
+            order_data['payment_fee'] = payment_fee if payment_fee is not None else Decimal('0')
+            order_data['actual_received'] = calculator.actual_received
+            order_data['gross_profit'] = calculator.gross_profit
+            order_data['profit_margin'] = calculator.profit_margin
+            order_rows.append(order_data)
+
+            if previous:
+                stats['updated_orders'] += 1
+            else:
+                stats['new_orders'] += 1
+
+        # 4. 订单（批量upsert不经过ORM事件，需要登记每日汇总表要刷新的日期）
+        self._upsert(Order, order_rows, ['shopify_order_id'], self.ORDER_UPDATE_COLUMNS)
+        financial_rollup.mark_days((row['created_at'] for row in order_rows), self.session)
+
+        # 5. 支付记录（需要订单主键）
+        order_ids = dict(
+            self.session.query(Order.shopify_order_id, Order.id)
+            .filter(Order.shopify_order_id.in_(shopify_ids)).all()
+        )
+        order_search.sync_orders(order_ids.values(), self.session)
+        expense_allocation.mark_orders(order_ids.values(), self.session)
+        payment_rows = []
+        for shopify_order_id, rows in payment_rows_by_order.items():
+            for row in rows:
+                row['order_id'] = order_ids[shopify_order_id]
+                row['created_at'] = now
+                row['updated_at'] = now
+                payment_rows.append(row)
+        self._upsert(Payment, payment_rows, ['order_id', 'transaction_id'], self.PAYMENT_UPDATE_COLUMNS)
+
+        return stats
+
+    def _write_products(self, items, product_cache: ProductCache, now):
+        """写入页内涉及的、标题/价格/SKU有变化的商品"""
+        products = {}
+        for item in items:
+            for line_item in item['line_items']:
+                products[line_item['shopify_variant_id']] = {
+                    'shopify_product_id': line_item['shopify_product_id'],
+                    'shopify_variant_id': line_item['shopify_variant_id'],
+                    'title': line_item['title'],
+                    'variant_title': line_item['variant_title'],
+                    'sku': line_item['sku'],
+                    'price': line_item['price'],
+                    'vendor': line_item['vendor'],
+                    'cost': Decimal('0'),  # 默认成本，需要手动配置
+                    'product_type': 'phone_case',  # 默认为手机壳
+                    'created_at': now,
+                    'updated_at': now,
+                }
+        self.write_products(list(products.values()), product_cache)
+
+    def write_products(self, products: List[Dict], product_cache: Optional[ProductCache] = None):
+        """批量写入商品行，只upsert标题/价格/SKU有变化的商品（不提交事务）"""
+        if not products:
+            return
+        if product_cache is None:
+            product_cache = ProductCache(self.session)
+
+        product_cache.prefetch(product['shopify_variant_id'] for product in products)
+        changed = product_cache.changed(products)
+        self._upsert(Product, changed,
+                     ['shopify_product_id', 'shopify_variant_id'], self.PRODUCT_UPDATE_COLUMNS)
+        product_cache.remember(changed)
+
+    def _build_payment(self, transaction: Dict, currency: Optional[str], fee) -> Dict:
+        """组装支付记录行，fee 为 FeeEngine 计算的结果"""
+        return {
+            'transaction_id': transaction['transaction_id'],
+            'payment_method': transaction['payment_method'],
+            'amount': transaction['amount'],
+            'currency': currency,  # 设置支付货币与订单货币一致
+            'fee_fixed': fee.fee_fixed,
+            'fee_percentage': fee.fee_percentage,
+            'total_fee': fee.total_fee,
+            'net_amount': fee.net_amount,
+            'status': transaction['status'],
+            'payment_date': transaction['payment_date'],
+        }
+
+    def _upsert(self, model, rows: List[Dict], index_elements: List[str], update_columns: List[str]):
+        """按数据库方言执行一条批量 upsert 语句"""
+        upsert_rows(self.session, model, rows, index_elements, update_columns)
@@ -0,0 +1,83 @@
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+from app.models.product import Product
+from app import db
+
+
+class ProductCache:
+    """同步过程中的商品身份缓存
+
+    一次同步运行内共享：每页只对尚未缓存的变体执行一次 IN 查询，
+    之后同一变体不再访问数据库。写回时只挑出标题、价格或SKU真正变化的商品。
+    """
+
+    # 判断商品是否需要写回的字段
+    TRACKED_FIELDS = ('title', 'price', 'sku')
+
+    def __init__(self, session=None):
+        self.session = session or db.session
+        self._by_variant: Dict[str, Dict] = {}
+
+    def __len__(self):
+        return len(self._by_variant)
+
+    def prefetch(self, variant_ids: Iterable[str]):
+        """预加载尚未缓存的变体（一条 IN 查询）"""
+        missing = {variant_id for variant_id in variant_ids if variant_id not in self._by_variant}
+        if not missing:
+            return
+
+        rows = self.session.query(
+            Product.shopify_product_id, Product.shopify_variant_id,
+            Product.title, Product.price, Product.sku, Product.cost
+        ).filter(Product.shopify_variant_id.in_(list(missing))).all()
+
+        for row in rows:
+            self._by_variant[row.shopify_variant_id] = {
+                'shopify_product_id': row.shopify_product_id,
+                'title': row.title,
+                'price': row.price,
+                'sku': row.sku,
+                'cost': row.cost,
+            }
+
+    def changed(self, products: List[Dict]) -> List[Dict]:
+        """返回新增或标题/价格/SKU发生变化的商品"""
+        changed = []
+        for product in products:
+            cached = self._by_variant.get(product['shopify_variant_id'])
+            if cached is None or cached['shopify_product_id'] != product['shopify_product_id']:
+                changed.append(product)
+                continue
+            if any(self._differs(cached[field], product[field]) for field in self.TRACKED_FIELDS):
+                changed.append(product)
+        return changed
+
+    def remember(self, products: List[Dict]):
+        """写入成功后更新缓存，新商品沿用默认成本"""
+        for product in products:
+            cached = self._by_variant.get(product['shopify_variant_id'])
+            self._by_variant[product['shopify_variant_id']] = {
+                'shopify_product_id': product['shopify_product_id'],
+                'title': product['title'],
+                'price': product['price'],
+                'sku': product['sku'],
+                'cost': cached['cost'] if cached else product.get('cost', Decimal('0')),
+            }
+
+    def cost(self, variant_id: str) -> Optional[Decimal]:
+        """获取变体的成本价"""
+        cached = self._by_variant.get(variant_id)
+        return cached['cost'] if cached else None
+
+    def clear(self):
+        """事务回滚后缓存可能与数据库不一致，需要清空"""
+        self._by_variant.clear()
+
+    @staticmethod
+    def _differs(old, new) -> bool:
+        if isinstance(old, Decimal) or isinstance(new, Decimal):
+            if old is None or new is None:
+                return old is not new
+            return Decimal(str(old)) != Decimal(str(new))
+        return (old or None) != (new or None)
@@ -0,0 +1,203 @@
+import re
+from datetime import date, datetime
+from typing import Callable, Dict, List
+from sqlalchemy import and_, desc, or_, select, text
+from app.models.account import Consumption, Recharge
+from app.models.expense import Expense, expense_order_association
+from app.models.expense_allocation import ExpenseAllocation
+from app.models.order import Order
+from app.models.order_cost import OrderCost
+from app.models.payment import Payment
+from app.models.webhook_event import WebhookEvent
+from app import db
+
+
+class HotQueryAudit:
+    """热点查询的执行计划检查
+
+    这里登记的查询与 app/api、报表汇总、webhook处理中的真实查询形状一致
+    （参数取代表值）。audit() 对每条查询执行 EXPLAIN，出现全表扫描时判定为失败，
+    用于在部署前确认索引迁移已生效、新增的查询有索引可用。
+    """
+
+    def __init__(self):
+        self.queries: Dict[str, Callable] = {}
+
+    def register(self, name: str, builder: Callable):
+        """登记热点查询，builder 返回一个 SELECT 语句"""
+        self.queries[name] = builder
+
+    def audit(self) -> List[Dict]:
+        """对所有登记的查询执行 EXPLAIN
+
+        Returns:
+            每条查询一个字典：name、full_scan（是否全表扫描）、plan（执行计划文本行）
+        """
+        connection = db.session.connection()
+        dialect = connection.dialect
+        if dialect.name == 'postgresql':
+            # 小表上PostgreSQL总是倾向顺序扫描，关闭后可以看出是否有索引可用
+            connection.execute(text('SET LOCAL enable_seqscan = off'))
+
+        results = []
+        for name, builder in self.queries.items():
+            compiled = builder().compile(dialect=dialect, compile_kwargs={'render_postcompile': True})
+            params = compiled.params
+            if compiled.positional:
+                params = tuple(params[key] for key in compiled.positiontup)
+            prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+            rows = connection.exec_driver_sql(prefix + str(compiled), params).fetchall()
+            plan, full_scan = self._parse_plan(dialect.name, rows)
+            results.append({'name': name, 'full_scan': full_scan, 'plan': plan})
+
+        db.session.rollback()
+        return results
+
+    @staticmethod
+    def _parse_plan(dialect: str, rows):
+        if dialect == 'sqlite':
+            # (id, parent, notused, detail)：不带 USING INDEX 的 "SCAN 表名" 是全表扫描
+            plan = [row[-1] for row in rows]
+            full_scan = any(re.match(r'^SCAN (TABLE )?\S+( AS \S+)?$', detail) for detail in plan)
+        elif dialect == 'mysql':
+            # type 列为 ALL 表示全表扫描
+            plan = [' '.join(f'{key}={value}' for key, value in row._mapping.items()) for row in rows]
+            full_scan = any(row._mapping.get('type') == 'ALL' for row in rows)
+        else:
+            plan = [row[0] for row in rows]
+            full_scan = any('Seq Scan' in line for line in plan)
+        return plan, full_scan
+
+
+# 创建全局实例
+query_audit = HotQueryAudit()
+
+# 代表性参数
+_now = datetime(2024, 1, 31, 12, 0, 0)
+_month_start = date(2024, 1, 1)
+_month_end = date(2024, 1, 31)
+
+
+def _orders_list():
+    # GET /api/orders 默认排序；游标分页第一页
+    return select(Order.id).order_by(desc(Order.created_at), desc(Order.id)).limit(21)
+
+
+def _orders_keyset():
+    # GET /api/orders 游标分页后续页
+    return select(Order.id).where(or_(
+        Order.created_at < _now, and_(Order.created_at == _now, Order.id < 1000)
+    )).order_by(desc(Order.created_at), desc(Order.id)).limit(21)
+
+
+def _orders_by_status():
+    # GET /api/orders?financial_status=paid
+    return select(Order.id).where(Order.financial_status == 'paid').order_by(desc(Order.created_at)).limit(21)
+
+
+def _orders_created_range():
+    # 每日汇总按日期范围聚合订单、GET /api/orders?start_date=&end_date=
+    return select(Order.id).where(Order.created_at >= _month_start, Order.created_at < _month_end)
+
+
+def _orders_order_date_range():
+    # 订单页面按订单日期筛选并排序
+    return select(Order.id).where(
+        Order.order_date >= _month_start, Order.order_date < _month_end
+    ).order_by(desc(Order.order_date), desc(Order.id)).limit(21)
+
+
+def _orders_by_number():
+    # 按订单号查找（费用导入、订单成本关联）
+    return select(Order.id).where(Order.order_number == '#1001')
+
+
+def _expenses_list():
+    # GET /api/expenses 按费用日期倒序、按日期范围筛选
+    return select(Expense.id).where(
+        Expense.expense_date >= _month_start, Expense.expense_date <= _month_end
+    ).order_by(desc(Expense.expense_date)).limit(10)
+
+
+def _expense_links_by_order():
+    # 订单序列化时预加载关联费用
+    return select(expense_order_association.c.expense_id).where(expense_order_association.c.order_id == 1)
+
+
+def _expense_allocations_by_order():
+    # 订单序列化时按订单汇总分摊费用
+    return select(ExpenseAllocation.category).where(ExpenseAllocation.order_id.in_([1, 2, 3]))
+
+
+def _order_costs_by_order():
+    # 订单序列化时预加载订单成本
+    return select(OrderCost.id).where(OrderCost.order_id == 1)
+
+
+def _order_costs_confirmed_range():
+    # 每日汇总按日期范围聚合已确认的订单成本
+    return select(OrderCost.cost_date).where(
+        OrderCost.status == 'confirmed', OrderCost.cost_date >= _month_start, OrderCost.cost_date <= _month_end
+    )
+
+
+def _order_costs_list():
+    # GET /api/order-costs 默认排序
+    return select(OrderCost.id).order_by(desc(OrderCost.created_at)).limit(20)
+
+
+def _order_costs_by_batch():
+    # GET /api/order-costs?batch_id=、批次确认
+    return select(OrderCost.id).where(OrderCost.batch_id == 'BATCH_20240101000000')
+
+
+def _order_costs_by_number():
+    # 按订单号查找订单成本
+    return select(OrderCost.id).where(OrderCost.order_number == '#1001')
+
+
+def _consumptions_by_account():
+    # GET /api/accounts/<id>/consumptions
+    return select(Consumption.id).where(
+        Consumption.account_id == 1, Consumption.consumption_date >= _month_start
+    ).order_by(desc(Consumption.consumption_date)).limit(20)
+
+
+def _recharges_by_account():
+    # GET /api/accounts/<id>/recharges
+    return select(Recharge.id).where(Recharge.account_id == 1).order_by(desc(Recharge.recharge_date)).limit(20)
+
+
+def _payments_by_order():
+    # GET /api/orders/<id> 的支付记录
+    return select(Payment.id).where(Payment.order_id == 1)
+
+
+def _pending_webhooks():
+    # webhook收件箱处理
+    return select(WebhookEvent.id).where(
+        WebhookEvent.status == WebhookEvent.STATUS_PENDING
+    ).order_by(WebhookEvent.id).limit(100)
+
+
+for _name, _builder in [
+    ('orders.list', _orders_list),
+    ('orders.keyset', _orders_keyset),
+    ('orders.by_status', _orders_by_status),
+    ('orders.created_range', _orders_created_range),
+    ('orders.order_date_range', _orders_order_date_range),
+    ('orders.by_number', _orders_by_number),
+    ('expenses.list', _expenses_list),
+    ('expense_links.by_order', _expense_links_by_order),
+    ('expense_allocations.by_order', _expense_allocations_by_order),
+    ('order_costs.by_order', _order_costs_by_order),
+    ('order_costs.confirmed_range', _order_costs_confirmed_range),
+    ('order_costs.list', _order_costs_list),
+    ('order_costs.by_batch', _order_costs_by_batch),
+    ('order_costs.by_number', _order_costs_by_number),
+    ('consumptions.by_account', _consumptions_by_account),
+    ('recharges.by_account', _recharges_by_account),
+    ('payments.by_order', _payments_by_order),
+    ('webhooks.pending', _pending_webhooks),
+]:
+    query_audit.register(_name, _builder)
@@ -0,0 +1,115 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Optional
+from flask import current_app
+
+
+class RateSnapshotStore:
+    """跨进程共享的汇率快照存储
+
+    汇率由定时任务统一刷新后发布到这里，各个Web/Celery工作进程只读取快照，
+    通过版本号判断是否需要重新读取，避免每个进程在缓存过期后各自请求外部API。
+    后端为 Redis（默认），本地开发可使用 SQLite 文件代替。
+    """
+
+    SNAPSHOT_KEY = 'caseledger:exchange_rates:snapshot'
+    VERSION_KEY = 'caseledger:exchange_rates:version'
+
+    def __init__(self, backend: Optional[str] = None, redis_url: Optional[str] = None,
+                 sqlite_path: Optional[str] = None):
+        self.backend = backend
+        self.redis_url = redis_url
+        self.sqlite_path = sqlite_path
+        self._redis = None
+
+    def _configure(self):
+        """首次使用时从应用配置读取后端设置"""
+        if self.backend:
+            return
+        try:
+            config = current_app.config
+        except RuntimeError:
+            from config import Config
+            config = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+        self.backend = config.get('EXCHANGE_RATE_SNAPSHOT_BACKEND') or 'redis'
+        self.redis_url = self.redis_url or config.get('REDIS_URL')
+        self.sqlite_path = self.sqlite_path or config.get('EXCHANGE_RATE_SNAPSHOT_PATH')
+
+    def _redis_client(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(self.redis_url, socket_timeout=1, socket_connect_timeout=1)
+        return self._redis
+
+    def _sqlite_connection(self):
+        directory = os.path.dirname(self.sqlite_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.sqlite_path, timeout=1)
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS rate_snapshot ('
+            'name TEXT PRIMARY KEY, version INTEGER NOT NULL, payload TEXT NOT NULL)'
+        )
+        return connection
+
+    def publish(self, snapshot: Dict) -> int:
+        """发布新的汇率快照，返回版本号"""
+        self._configure()
+        version = int(time.time() * 1000)
+        payload = json.dumps(dict(snapshot, version=version))
+
+        if self.backend == 'sqlite':
+            connection = self._sqlite_connection()
+            try:
+                with connection:
+                    connection.execute(
+                        'INSERT OR REPLACE INTO rate_snapshot (name, version, payload) VALUES (?, ?, ?)',
+                        (self.SNAPSHOT_KEY, version, payload)
+                    )
+            finally:
+                connection.close()
+        else:
+            pipeline = self._redis_client().pipeline()
+            pipeline.set(self.SNAPSHOT_KEY, payload)
+            pipeline.set(self.VERSION_KEY, version)
+            pipeline.execute()
+        return version
+
+    def read_version(self) -> Optional[int]:
+        """读取当前快照版本号（开销很小，用于判断是否需要重新读取快照）"""
+        self._configure()
+        if self.backend == 'sqlite':
+            if not os.path.exists(self.sqlite_path):
+                return None
+            connection = self._sqlite_connection()
+            try:
+                row = connection.execute(
+                    'SELECT version FROM rate_snapshot WHERE name = ?', (self.SNAPSHOT_KEY,)
+                ).fetchone()
+            finally:
+                connection.close()
+            return row[0] if row else None
+
+        value = self._redis_client().get(self.VERSION_KEY)
+        return int(value) if value is not None else None
+
+    def read(self) -> Optional[Dict]:
+        """读取完整快照：{'version', 'base', 'rates', 'fetched_at'}"""
+        self._configure()
+        if self.backend == 'sqlite':
+            if not os.path.exists(self.sqlite_path):
+                return None
+            connection = self._sqlite_connection()
+            try:
+                row = connection.execute(
+                    'SELECT payload FROM rate_snapshot WHERE name = ?', (self.SNAPSHOT_KEY,)
+                ).fetchone()
+            finally:
+                connection.close()
+            payload = row[0] if row else None
+        else:
+            payload = self._redis_client().get(self.SNAPSHOT_KEY)
+
+        return json.loads(payload) if payload else None
@@ -0,0 +1,162 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+import requests
+
+
+class LeakyBucket:
+    """Shopify REST API 漏桶限流模型
+
+    Shopify 每个店铺有一个容量为 capacity 的请求桶，按 leak_rate 个/秒漏出。
+    本地按同样的模型计数，并用每次响应中的 X-Shopify-Shop-Api-Call-Limit
+    （如 "32/40"）校准，使并发请求始终贴着配额运行而不触发429。
+    """
+
+    def __init__(self, capacity: int = 40, leak_rate: float = 2.0, headroom: int = 1):
+        self.capacity = capacity
+        self.leak_rate = leak_rate
+        self.headroom = headroom  # 预留的余量，给其他客户端（如webhook回调）使用
+        self.level = 0.0
+        self.paused_until = 0.0
+        self._last_leak = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _leak(self, now: float):
+        self.level = max(0.0, self.level - (now - self._last_leak) * self.leak_rate)
+        self._last_leak = now
+
+    def acquire(self):
+        """占用一个请求名额，桶满或处于Retry-After暂停期时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._leak(now)
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.level + 1 <= self.capacity - self.headroom:
+                    self.level += 1
+                    return
+                else:
+                    wait = (self.level + 1 - (self.capacity - self.headroom)) / self.leak_rate
+            time.sleep(wait)
+
+    def update_from_header(self, header: Optional[str]):
+        """用服务端返回的 "已用/容量" 校准本地计数"""
+        if not header or '/' not in header:
+            return
+        try:
+            used, capacity = (int(part) for part in header.split('/', 1))
+        except ValueError:
+            return
+        with self._lock:
+            self._leak(time.monotonic())
+            self.capacity = capacity
+            # 服务端计数是权威值，但并发请求的响应可能乱序到达，只向上校准
+            self.level = max(self.level, float(used))
+
+    def pause(self, seconds: float):
+        """收到429后，所有请求暂停 Retry-After 秒"""
+        with self._lock:
+            now = time.monotonic()
+            self._leak(now)
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.level = float(self.capacity)
+
+
+class ShopifyFetcher:
+    """带限流的并发Shopify拉取层
+
+    订单分页请求与每页订单的交易请求都在一个小线程池上执行，由 LeakyBucket
+    统一控速；遇到429时遵循 Retry-After。线程只负责HTTP请求，数据库写入仍在
+    调用方线程中完成。base_url 可指向本地的模拟Shopify服务用于测试。
+    """
+
+    def __init__(self, shop_domain: str, access_token: str, api_version: str = '2023-10',
+                 base_url: Optional[str] = None, max_workers: int = 4,
+                 bucket: Optional[LeakyBucket] = None, max_retries: int = 5, timeout: int = 30):
+        self.base_url = (base_url or f"https://{shop_domain}/admin/api/{api_version}").rstrip('/')
+        self.access_token = access_token
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.bucket = bucket or LeakyBucket()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='shopify-fetch')
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        """每个线程使用独立的 requests.Session（连接复用）"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                'X-Shopify-Access-Token': self.access_token,
+                'Accept': 'application/json'
+            })
+            self._local.session = session
+        return session
+
+    def request(self, url: str, params: Optional[Dict] = None) -> requests.Response:
+        """发送一次GET请求，按漏桶控速，429/5xx时重试"""
+        if not url.startswith('http'):
+            url = f"{self.base_url}/{url.lstrip('/')}"
+
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            response = self._session().get(url, params=params, timeout=self.timeout)
+            self.bucket.update_from_header(response.headers.get('X-Shopify-Shop-Api-Call-Limit'))
+
+            if response.status_code == 429 and attempt < self.max_retries:
+                retry_after = float(response.headers.get('Retry-After') or 2.0)
+                self.bucket.pause(retry_after)
+                continue
+            if response.status_code >= 500 and attempt < self.max_retries:
+                time.sleep(min(2 ** attempt, 30))
+                continue
+
+            response.raise_for_status()
+            return response
+
+        response.raise_for_status()
+        return response
+
+    def iter_order_pages(self, with_transactions: bool = True, **params) -> Iterator[List[Dict]]:
+        """按 page_info 游标逐页获取订单
+
+        当前页交给调用方处理时，下一页已经在线程池中请求；
+        with_transactions 为True时会并发拉取本页每个订单的交易记录，
+        写入订单字典的 transactions 字段。
+        调用方提前结束迭代（break 或异常）时取消尚未开始的下一页请求。
+        """
+        future = self.executor.submit(self.request, 'orders.json', params)
+        try:
+            while future is not None:
+                response = future.result()
+                orders = response.json().get('orders', [])
+
+                next_url = response.links.get('next', {}).get('url')
+                future = self.executor.submit(self.request, next_url) if next_url else None
+
+                if with_transactions and orders:
+                    transactions = self.fetch_transactions([order['id'] for order in orders])
+                    for order in orders:
+                        order['transactions'] = transactions.get(order['id'], [])
+
+                yield orders
+        finally:
+            if future is not None:
+                future.cancel()
+
+    def fetch_transactions(self, order_ids: List) -> Dict:
+        """并发获取多个订单的交易记录，返回 order_id -> 交易列表"""
+        futures = {
+            order_id: self.executor.submit(self.request, f'orders/{order_id}/transactions.json')
+            for order_id in order_ids
+        }
+        return {
+            order_id: future.result().json().get('transactions', [])
+            for order_id, future in futures.items()
+        }
+
+    def close(self):
+        """关闭线程池，未开始的请求直接取消"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
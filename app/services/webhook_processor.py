@@ -0,0 +1,173 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, List
+from flask import current_app
+from app.models.product import Product
+from app.models.webhook_event import WebhookEvent
+from app.services.order_writer import OrderBulkWriter
+from app import db
+
+
+class WebhookProcessor:
+    """Webhook收件箱处理器
+
+    webhook接口只负责验签并把原始请求体写入 webhook_inbox，
+    这里由Celery任务（webhooks队列，单并发）按接收顺序逐条处理，
+    并用 Redis 锁保证同一时间只有一个进程在处理。
+    每个事件一个事务；处理失败的事件会阻塞后续事件，直到重试成功
+    或达到最大重试次数，从而保证同一订单的事件按顺序生效。
+
+    同一批待处理事件中，同一订单的多个事件（如 orders/updated、orders/paid
+    和重复的 orders/updated）合并为一次写入：只应用 updated_at 最新的那份
+    payload，其余事件标记为 coalesced。
+    """
+
+    # 同一时间只允许一个进程处理收件箱（定时兜底任务与收到webhook时触发的任务可能重叠）
+    LOCK_KEY = 'caseledger:webhook_inbox:lock'
+    LOCK_TIMEOUT = 300
+
+    ORDER_TOPICS = ('orders/create', 'orders/updated', 'orders/paid', 'orders/cancelled')
+    PRODUCT_TOPICS = ('products/create', 'products/update')
+
+    def __init__(self):
+        self.order_writer = OrderBulkWriter()
+
+    def process_pending(self, limit: int = 100) -> Dict[str, int]:
+        """处理待处理的webhook事件
+
+        Args:
+            limit: 本次最多处理的事件数量
+
+        Returns:
+            Dict包含处理统计信息；其他进程正在处理时 skipped 为 True，不处理任何事件
+        """
+        lock = self._lock()
+        if not lock.acquire(blocking=False):
+            current_app.logger.info('Webhook收件箱正由其他进程处理，跳过本次处理')
+            return {'processed': 0, 'coalesced': 0, 'failed': 0, 'remaining': 0, 'skipped': True}
+        try:
+            return self._process_pending(limit)
+        finally:
+            try:
+                lock.release()
+            except Exception as e:
+                # 处理时间超过 LOCK_TIMEOUT 时锁已过期
+                current_app.logger.warning(f"Release webhook inbox lock error: {str(e)}")
+
+    def _lock(self):
+        """收件箱处理锁（Redis，超时自动释放，避免进程崩溃后一直占用）"""
+        import redis
+        client = redis.Redis.from_url(current_app.config['REDIS_URL'])
+        return client.lock(self.LOCK_KEY, timeout=self.LOCK_TIMEOUT)
+
+    def _process_pending(self, limit: int) -> Dict[str, int]:
+        stats = {'processed': 0, 'coalesced': 0, 'failed': 0, 'remaining': 0, 'skipped': False}
+
+        events = WebhookEvent.query.filter_by(
+            status=WebhookEvent.STATUS_PENDING
+        ).order_by(WebhookEvent.id).limit(limit).all()
+
+        for group in self._coalesce(events):
+            event = group[-1]
+            superseded = group[:-1]
+            try:
+                self._dispatch(event.topic, event.data)
+                event.mark_processed()
+                for other in superseded:
+                    other.mark_coalesced(event.id)
+                db.session.commit()
+                stats['processed'] += 1
+                stats['coalesced'] += len(superseded)
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Error processing webhook {event.id} ({event.topic}): {str(e)}")
+                # 整组一起重试，下次可能与更新的事件再次合并
+                for member in group:
+                    member.mark_failed(str(e))
+                db.session.commit()
+                stats['failed'] += len(group)
+                if event.status == WebhookEvent.STATUS_PENDING:
+                    # 保持顺序：失败事件下次重试前不处理后面的事件
+                    break
+
+        stats['remaining'] = WebhookEvent.query.filter_by(status=WebhookEvent.STATUS_PENDING).count()
+        return stats
+
+    def _coalesce(self, events: List[WebhookEvent]) -> List[List[WebhookEvent]]:
+        """按订单合并事件
+
+        返回事件分组，按组内最早事件的接收顺序排列；订单事件按 shopify_order_id
+        分组，组内最后一个元素是要应用的事件（payload 中 updated_at 最新，
+        相同时取最后接收的），其余事件只标记为已合并。
+        """
+        groups = []
+        order_groups = {}
+        for event in events:
+            event.data = json.loads(event.payload)
+            if event.topic in self.ORDER_TOPICS and event.resource_id:
+                group = order_groups.get(event.resource_id)
+                if group is None:
+                    group = order_groups[event.resource_id] = []
+                    groups.append(group)
+                group.append(event)
+            else:
+                groups.append([event])
+
+        for group in groups:
+            if len(group) > 1:
+                group.sort(key=lambda event: (self._updated_at(event.data), event.id))
+        return groups
+
+    @staticmethod
+    def _updated_at(data: Dict) -> datetime:
+        """payload 中的 updated_at（不带时区的UTC），缺失时视为最早"""
+        value = data.get('updated_at')
+        if not value:
+            return datetime.min
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+
+    def _dispatch(self, topic: str, data: Dict):
+        """按webhook主题处理事件（不提交事务）"""
+        if topic in self.ORDER_TOPICS:
+            self._apply_order(topic, data)
+        elif topic in self.PRODUCT_TOPICS:
+            self._apply_product(data)
+        elif topic == 'products/delete':
+            Product.query.filter_by(shopify_product_id=str(data.get('id'))).delete(synchronize_session=False)
+        else:
+            current_app.logger.warning(f"Unsupported webhook topic: {topic}")
+
+    def _apply_order(self, topic: str, data: Dict):
+        normalized = self.order_writer.normalize(data)
+        # 合并后应用的可能是取消之后的 orders/updated，按 cancelled_at 判断
+        if topic == 'orders/cancelled' or data.get('cancelled_at'):
+            normalized['order']['financial_status'] = 'cancelled'
+            normalized['order']['fulfillment_status'] = 'cancelled'
+        self.order_writer.write_page([normalized])
+
+    def _apply_product(self, data: Dict):
+        now = datetime.utcnow()
+        products = []
+        for variant in data.get('variants') or []:
+            products.append({
+                'shopify_product_id': str(data.get('id')),
+                'shopify_variant_id': str(variant.get('id')),
+                'title': data.get('title'),
+                'variant_title': variant.get('title'),
+                'sku': variant.get('sku'),
+                'price': Decimal(str(variant.get('price') or 0)),
+                'vendor': data.get('vendor'),
+                'cost': Decimal('0'),  # 默认成本，需要手动配置
+                'product_type': data.get('product_type') or 'phone_case',
+                'created_at': now,
+                'updated_at': now,
+            })
+        self.order_writer.write_products(products)
+
+
+# 创建全局实例
+webhook_processor = WebhookProcessor()
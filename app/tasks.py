@@ -79,6 +79,56 @@ def sync_shopify_orders_daily_task(self):
             raise
 
 
+@celery.task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 3, 'countdown': 60})
+def sync_shopify_orders_incremental_task(self, fallback_hours=24):
+    """基于updated_at水位线增量同步Shopify订单的Celery任务"""
+    app = create_app()
+    with app.app_context():
+        try:
+            shopify_service = ShopifyService()
+            shopify_service.init_app(app)
+            result = shopify_service.sync_incremental_orders(fallback_hours=fallback_hours)
+            logger.info(f"增量订单同步完成: {result}")
+            return result
+        except Exception as e:
+            logger.error(f"增量订单同步失败: {str(e)}")
+            raise
+
+
+@celery.task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 3, 'countdown': 300})
+def refresh_exchange_rates_task(self):
+    """刷新共享汇率快照的Celery任务"""
+    app = create_app()
+    with app.app_context():
+        try:
+            from app.services.exchange_rate_service import exchange_rate_service
+            result = exchange_rate_service.refresh_shared_rates()
+            logger.info(f"汇率刷新完成: {result}")
+            return result
+        except Exception as e:
+            logger.error(f"汇率刷新失败: {str(e)}")
+            raise
+
+
+@celery.task(bind=True)
+def process_webhook_inbox_task(self, limit=100):
+    """按接收顺序处理webhook收件箱的Celery任务（webhooks队列，单并发）"""
+    app = create_app()
+    with app.app_context():
+        try:
+            from app.services.webhook_processor import webhook_processor
+            result = webhook_processor.process_pending(limit=limit)
+            logger.info(f"Webhook收件箱处理完成: {result}")
+            # 本批全部处理成功且仍有待处理事件时继续处理下一批（processed 按合并后的组计数，不能与 limit 比较）；
+            # 有失败事件时等待定时任务重试，避免反复重新入队
+            if not result['skipped'] and not result['failed'] and result['remaining'] > 0:
+                process_webhook_inbox_task.delay(limit)
+            return result
+        except Exception as e:
+            logger.error(f"Webhook收件箱处理失败: {str(e)}")
+            raise
+
+
 @celery.task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 2, 'countdown': 30})
 def test_connection_task(self):
     """测试Shopify连接的Celery任务"""
@@ -0,0 +1,100 @@
+from datetime import date, datetime, time, timedelta
+from typing import Tuple, Union
+from sqlalchemy import and_, func
+from sqlalchemy.types import DateTime
+from app import db
+
+DateLike = Union[date, datetime]
+
+
+# ==================== 半开区间 [start, end) ====================
+
+def _as_day(value: DateLike) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def day_range(day: DateLike) -> Tuple[datetime, datetime]:
+    """某一天的时间范围 [当天 00:00, 次日 00:00)"""
+    start = datetime.combine(_as_day(day), time.min)
+    return start, start + timedelta(days=1)
+
+
+def week_range(day: DateLike) -> Tuple[datetime, datetime]:
+    """所在自然周（周一开始）的时间范围"""
+    monday = _as_day(day) - timedelta(days=_as_day(day).weekday())
+    start = datetime.combine(monday, time.min)
+    return start, start + timedelta(days=7)
+
+
+def month_range(day: DateLike) -> Tuple[datetime, datetime]:
+    """所在自然月的时间范围 [本月1日 00:00, 下月1日 00:00)"""
+    first = _as_day(day).replace(day=1)
+    if first.month == 12:
+        next_first = first.replace(year=first.year + 1, month=1)
+    else:
+        next_first = first.replace(month=first.month + 1)
+    return datetime.combine(first, time.min), datetime.combine(next_first, time.min)
+
+
+def dates_range(start_day: DateLike, end_day: DateLike) -> Tuple[datetime, datetime]:
+    """包含首尾两天的日期区间，转换为 [start 00:00, end 次日 00:00)"""
+    return day_range(start_day)[0], day_range(end_day)[1]
+
+
+PERIOD_RANGES = {
+    'daily': day_range,
+    'weekly': week_range,
+    'monthly': month_range,
+}
+
+
+def period_range(day: DateLike, granularity: str = 'daily') -> Tuple[datetime, datetime]:
+    """按粒度（daily、weekly、monthly）取所在周期的时间范围"""
+    try:
+        return PERIOD_RANGES[granularity](day)
+    except KeyError:
+        raise ValueError(f"不支持的时间粒度: {granularity}")
+
+
+def in_range(column, start: DateLike, end: DateLike):
+    """column >= start AND column < end
+
+    代替 func.date(column) == ... 之类的条件，可以使用列上的索引。
+    DateTime 列的边界统一转换为 datetime，Date 列转换为 date，
+    避免不同数据库对日期和时间戳比较的差异。
+    """
+    return and_(column >= _coerce(column, start), column < _coerce(column, end))
+
+
+def _coerce(column, value: DateLike) -> DateLike:
+    if isinstance(column.type, DateTime):
+        if not isinstance(value, datetime):
+            return datetime.combine(value, time.min)
+        return value
+    return _as_day(value)
+
+
+# ==================== 分桶表达式 ====================
+
+def date_bucket(column, granularity: str = 'daily'):
+    """按日/周/月分桶的SQL表达式
+
+    结果为字符串：daily 'YYYY-MM-DD'，weekly 为所在周周一的 'YYYY-MM-DD'，
+    monthly 'YYYY-MM'。只用于 GROUP BY / SELECT，筛选条件请使用 in_range()。
+    """
+    dialect = db.session.get_bind().dialect.name
+    if granularity not in PERIOD_RANGES:
+        raise ValueError(f"不支持的时间粒度: {granularity}")
+
+    if dialect == 'mysql':
+        if granularity == 'weekly':
+            return func.date_format(func.subdate(column, func.weekday(column)), '%Y-%m-%d')
+        return func.date_format(column, '%Y-%m-%d' if granularity == 'daily' else '%Y-%m')
+    if dialect == 'postgresql':
+        if granularity == 'weekly':
+            return func.to_char(func.date_trunc('week', column), 'YYYY-MM-DD')
+        return func.to_char(column, 'YYYY-MM-DD' if granularity == 'daily' else 'YYYY-MM')
+    if granularity == 'weekly':
+        # 'weekday 0' 前进到本周日（周日不变），再回退6天得到周一
+        return func.date(column, 'weekday 0', '-6 days')
+    return func.strftime('%Y-%m-%d' if granularity == 'daily' else '%Y-%m', column)
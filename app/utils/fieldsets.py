@@ -0,0 +1,28 @@
+from typing import Dict, Iterable, Optional, Set
+
+
+def parse_fieldset(value: Optional[str]) -> Optional[Set[str]]:
+    """解析逗号分隔的 fields= / expand= 参数
+
+    未传参数时返回 None（fields 表示返回全部默认字段，expand 表示不展开）。
+    """
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def wants(fields: Optional[Set[str]], *names: str) -> bool:
+    """是否需要返回其中任一字段（fields 为 None 表示全部字段）"""
+    return fields is None or any(name in fields for name in names)
+
+
+def pick_fields(data: Dict, fields: Optional[Set[str]]) -> Dict:
+    """只保留请求的字段，id 始终返回"""
+    if fields is None:
+        return data
+    return {key: value for key, value in data.items() if key == 'id' or key in fields}
+
+
+def invalid_names(requested: Optional[Set[str]], allowed: Iterable[str]) -> Set[str]:
+    """请求中不支持的名称（用于校验 expand= 参数）"""
+    return set(requested or ()) - set(allowed)
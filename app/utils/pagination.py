@@ -0,0 +1,163 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+from sqlalchemy import and_, asc, desc, or_
+
+
+def encode_cursor(payload: Dict) -> str:
+    """把游标内容编码为不透明的 URL 安全字符串"""
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str) -> Dict:
+    """解码游标，格式错误时抛出 ValueError"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"无效的分页游标: {str(e)}")
+    if not isinstance(payload, dict) or 'id' not in payload or 'dir' not in payload:
+        raise ValueError("无效的分页游标")
+    return payload
+
+
+def _dump_value(value: Any) -> Dict:
+    """排序列的值转为可JSON序列化的形式（带类型标记，解码时还原）"""
+    if isinstance(value, datetime):
+        return {'t': 'datetime', 'v': value.isoformat()}
+    if isinstance(value, date):
+        return {'t': 'date', 'v': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'t': 'decimal', 'v': str(value)}
+    return {'t': 'raw', 'v': value}
+
+
+def _load_value(data: Dict) -> Any:
+    kind, value = data.get('t'), data.get('v')
+    if kind == 'datetime':
+        return datetime.fromisoformat(value)
+    if kind == 'date':
+        return date.fromisoformat(value)
+    if kind == 'decimal':
+        return Decimal(value)
+    return value
+
+
+class KeysetPage:
+    """游标分页结果
+
+    与 Flask-SQLAlchemy 的 Pagination 保持相近的属性（items、has_next、has_prev、total），
+    但不提供页码；total 只有在显式要求时才计算，否则为 None。
+    """
+
+    def __init__(self, items: List, per_page: int, next_cursor: Optional[str],
+                 prev_cursor: Optional[str], total: Optional[int] = None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_cursor is not None
+
+    def to_dict(self) -> Dict:
+        return {
+            'mode': 'keyset',
+            'per_page': self.per_page,
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor,
+            'has_next': self.has_next,
+            'has_prev': self.has_prev,
+            'total': self.total
+        }
+
+
+def keyset_paginate(query, sort_column, id_column, sort_order: str = 'desc', per_page: int = 20,
+                    cursor: Optional[str] = None, include_total: bool = False) -> KeysetPage:
+    """按（排序列, id）做游标分页
+
+    用 WHERE (sort_column, id) 位于游标之后 的条件代替 OFFSET，配合
+    (sort_column, id) 上的索引，任意深度的页面都只扫描 per_page + 1 行；
+    默认不执行 COUNT(*)。排序列不能为 NULL。
+
+    Args:
+        query: 已应用筛选条件、尚未排序的查询
+        sort_column: 排序列
+        id_column: 唯一的决胜列（主键）
+        sort_order: 'asc' 或 'desc'
+        per_page: 每页数量
+        cursor: 上一次返回的 next_cursor / prev_cursor，为空表示第一页
+        include_total: 是否额外统计满足条件的总数
+
+    Raises:
+        ValueError: 游标无效，或与当前排序方式不一致
+    """
+    descending = sort_order == 'desc'
+    sort_key = sort_column.key
+
+    direction = 'next'
+    boundary = None
+    if cursor:
+        payload = decode_cursor(cursor)
+        if payload.get('sort') != sort_key or payload.get('order') != sort_order:
+            raise ValueError("分页游标与当前排序方式不一致")
+        direction = payload['dir']
+        boundary = (_load_value(payload.get('value') or {}), payload['id'])
+
+    total = query.order_by(None).count() if include_total else None
+
+    # 向前翻页时反向扫描，取到结果后再翻转回来
+    scan_descending = descending if direction == 'next' else not descending
+    if boundary is not None:
+        value, last_id = boundary
+        if sort_column is id_column:
+            condition = id_column < last_id if scan_descending else id_column > last_id
+        elif scan_descending:
+            condition = or_(sort_column < value, and_(sort_column == value, id_column < last_id))
+        else:
+            condition = or_(sort_column > value, and_(sort_column == value, id_column > last_id))
+        query = query.filter(condition)
+
+    order = desc if scan_descending else asc
+    if sort_column is id_column:
+        query = query.order_by(order(id_column))
+    else:
+        query = query.order_by(order(sort_column), order(id_column))
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+
+    def make_cursor(row, row_direction):
+        return encode_cursor({
+            'sort': sort_key,
+            'order': sort_order,
+            'dir': row_direction,
+            'value': _dump_value(getattr(row, sort_key)),
+            'id': getattr(row, id_column.key)
+        })
+
+    next_cursor = prev_cursor = None
+    if rows:
+        # 向后翻页：是否还有下一页取决于多取的一行；从游标进入说明前面一定有数据
+        if direction == 'next':
+            more_after, more_before = has_more, boundary is not None
+        else:
+            more_after, more_before = True, has_more
+        if more_after:
+            next_cursor = make_cursor(rows[-1], 'next')
+        if more_before:
+            prev_cursor = make_cursor(rows[0], 'prev')
+
+    return KeysetPage(rows, per_page, next_cursor, prev_cursor, total)
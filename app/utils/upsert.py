@@ -0,0 +1,30 @@
+from typing import Dict, List
+from sqlalchemy.dialects import mysql, sqlite, postgresql
+
+
+def upsert_rows(session, model, rows: List[Dict], index_elements: List[str], update_columns: List[str]):
+    """按数据库方言执行一条批量 upsert 语句（不提交事务）
+
+    SQLite/PostgreSQL 使用 INSERT ... ON CONFLICT DO UPDATE，
+    MySQL 使用 INSERT ... ON DUPLICATE KEY UPDATE。
+    """
+    if not rows:
+        return
+
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+
+    if dialect == 'mysql':
+        stmt = mysql.insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in update_columns})
+    elif dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={column: stmt.excluded[column] for column in update_columns}
+        )
+    else:
+        raise NotImplementedError(f"不支持的数据库方言: {dialect}")
+
+    session.execute(stmt)
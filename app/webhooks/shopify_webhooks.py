@@ -1,11 +1,8 @@
-import json
 import logging
 from flask import Blueprint, request, jsonify, current_app
+from sqlalchemy.exc import IntegrityError
 from app import db
-from app.models.order import Order
-from app.models.product import Product
-from app.models.payment import Payment
-from app.services.shopify_service import ShopifyService
+from app.models.webhook_event import WebhookEvent
 from app.utils.helpers import validate_shopify_webhook_signature
 from datetime import datetime
 
@@ -17,267 +14,106 @@ logger = logging.getLogger(__name__)
 @webhook_bp.route('/shopify/orders/create', methods=['POST'])
 def handle_order_create():
     """处理Shopify订单创建webhook"""
-    try:
-        # 验证webhook签名
-        if not _verify_webhook_signature():
-            return jsonify({'error': 'Invalid signature'}), 401
-        
-        # 获取订单数据
-        order_data = request.get_json()
-        
-        if not order_data:
-            return jsonify({'error': 'No data received'}), 400
-        
-        # 处理订单
-        shopify_service = ShopifyService()
-        result = shopify_service._process_order(order_data)
-        
-        logger.info(f"Order created via webhook: {order_data.get('order_number')}")
-        
-        return jsonify({
-            'status': 'success',
-            'message': 'Order processed successfully',
-            'order_id': result.get('order_id')
-        }), 200
-        
-    except Exception as e:
-        logger.error(f"Error processing order create webhook: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+    return _enqueue_webhook('orders/create')
 
 
 @webhook_bp.route('/shopify/orders/update', methods=['POST'])
 def handle_order_update():
     """处理Shopify订单更新webhook"""
-    try:
-        # 验证webhook签名
-        if not _verify_webhook_signature():
-            return jsonify({'error': 'Invalid signature'}), 401
-        
-        # 获取订单数据
-        order_data = request.get_json()
-        
-        if not order_data:
-            return jsonify({'error': 'No data received'}), 400
-        
-        # 查找现有订单
-        shopify_order_id = str(order_data.get('id'))
-        order = Order.query.filter_by(shopify_order_id=shopify_order_id).first()
-        
-        if order:
-            # 更新订单信息
-            shopify_service = ShopifyService()
-            result = shopify_service._process_order(order_data, update_existing=True)
-            
-            logger.info(f"Order updated via webhook: {order_data.get('order_number')}")
-            
-            return jsonify({
-                'status': 'success',
-                'message': 'Order updated successfully',
-                'order_id': result.get('order_id')
-            }), 200
-        else:
-            # 如果订单不存在，创建新订单
-            shopify_service = ShopifyService()
-            result = shopify_service._process_order(order_data)
-            
-            logger.info(f"New order created via update webhook: {order_data.get('order_number')}")
-            
-            return jsonify({
-                'status': 'success',
-                'message': 'Order created successfully',
-                'order_id': result.get('order_id')
-            }), 200
-        
-    except Exception as e:
-        logger.error(f"Error processing order update webhook: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+    return _enqueue_webhook('orders/updated')
 
 
 @webhook_bp.route('/shopify/orders/paid', methods=['POST'])
 def handle_order_paid():
     """处理Shopify订单支付webhook"""
-    try:
-        # 验证webhook签名
-        if not _verify_webhook_signature():
-            return jsonify({'error': 'Invalid signature'}), 401
-        
-        # 获取订单数据
-        order_data = request.get_json()
-        
-        if not order_data:
-            return jsonify({'error': 'No data received'}), 400
-        
-        # 查找订单并更新支付状态
-        shopify_order_id = str(order_data.get('id'))
-        order = Order.query.filter_by(shopify_order_id=shopify_order_id).first()
-        
-        if order:
-            order.financial_status = order_data.get('financial_status', 'paid')
-            order.updated_at = datetime.utcnow()
-            
-            # 处理支付信息
-            shopify_service = ShopifyService()
-            for transaction in order_data.get('transactions', []):
-                if transaction.get('status') == 'success':
-                    shopify_service._process_payment(transaction, order.id)
-            
-            db.session.commit()
-            
-            logger.info(f"Order payment processed via webhook: {order_data.get('order_number')}")
-            
-            return jsonify({
-                'status': 'success',
-                'message': 'Payment processed successfully'
-            }), 200
-        else:
-            logger.warning(f"Order not found for payment webhook: {shopify_order_id}")
-            return jsonify({'error': 'Order not found'}), 404
-        
-    except Exception as e:
-        logger.error(f"Error processing order paid webhook: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+    return _enqueue_webhook('orders/paid')
 
 
 @webhook_bp.route('/shopify/orders/cancelled', methods=['POST'])
 def handle_order_cancelled():
     """处理Shopify订单取消webhook"""
-    try:
-        # 验证webhook签名
-        if not _verify_webhook_signature():
-            return jsonify({'error': 'Invalid signature'}), 401
-        
-        # 获取订单数据
-        order_data = request.get_json()
-        
-        if not order_data:
-            return jsonify({'error': 'No data received'}), 400
-        
-        # 查找订单并更新状态
-        shopify_order_id = str(order_data.get('id'))
-        order = Order.query.filter_by(shopify_order_id=shopify_order_id).first()
-        
-        if order:
-            order.financial_status = 'cancelled'
-            order.fulfillment_status = 'cancelled'
-            order.cancelled_at = datetime.fromisoformat(
-                order_data.get('cancelled_at', datetime.utcnow().isoformat()).replace('Z', '+00:00')
-            )
-            order.updated_at = datetime.utcnow()
-            
-            db.session.commit()
-            
-            logger.info(f"Order cancelled via webhook: {order_data.get('order_number')}")
-            
-            return jsonify({
-                'status': 'success',
-                'message': 'Order cancellation processed successfully'
-            }), 200
-        else:
-            logger.warning(f"Order not found for cancellation webhook: {shopify_order_id}")
-            return jsonify({'error': 'Order not found'}), 404
-        
-    except Exception as e:
-        logger.error(f"Error processing order cancelled webhook: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+    return _enqueue_webhook('orders/cancelled')
 
 
 @webhook_bp.route('/shopify/products/create', methods=['POST'])
 def handle_product_create():
     """处理Shopify产品创建webhook"""
-    try:
-        # 验证webhook签名
-        if not _verify_webhook_signature():
-            return jsonify({'error': 'Invalid signature'}), 401
-        
-        # 获取产品数据
-        product_data = request.get_json()
-        
-        if not product_data:
-            return jsonify({'error': 'No data received'}), 400
-        
-        # 处理产品
-        shopify_service = ShopifyService()
-        result = shopify_service._sync_product(product_data)
-        
-        logger.info(f"Product created via webhook: {product_data.get('title')}")
-        
-        return jsonify({
-            'status': 'success',
-            'message': 'Product processed successfully',
-            'product_id': result.get('product_id')
-        }), 200
-        
-    except Exception as e:
-        logger.error(f"Error processing product create webhook: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+    return _enqueue_webhook('products/create')
 
 
 @webhook_bp.route('/shopify/products/update', methods=['POST'])
 def handle_product_update():
     """处理Shopify产品更新webhook"""
+    return _enqueue_webhook('products/update')
+
+
+@webhook_bp.route('/shopify/products/delete', methods=['POST'])
+def handle_product_delete():
+    """处理Shopify产品删除webhook"""
+    return _enqueue_webhook('products/delete')
+
+
+def _enqueue_webhook(topic):
+    """验签后把原始请求体写入webhook收件箱并立即返回
+    
+    Shopify要求5秒内响应，否则会重试并最终停用webhook。这里只做一次INSERT，
+    订单、商品、支付的处理由 process_webhook_inbox_task 在webhooks队列中完成。
+    """
     try:
         # 验证webhook签名
         if not _verify_webhook_signature():
             return jsonify({'error': 'Invalid signature'}), 401
         
-        # 获取产品数据
-        product_data = request.get_json()
+        payload = request.get_data(as_text=True)
+        data = request.get_json(silent=True)
         
-        if not product_data:
+        if not payload or not isinstance(data, dict):
             return jsonify({'error': 'No data received'}), 400
         
-        # 处理产品更新
-        shopify_service = ShopifyService()
-        result = shopify_service._sync_product(product_data)
+        event = WebhookEvent(
+            webhook_id=request.headers.get('X-Shopify-Webhook-Id'),
+            topic=topic,
+            shop_domain=request.headers.get('X-Shopify-Shop-Domain'),
+            resource_id=str(data.get('id')) if data.get('id') is not None else None,
+            payload=payload
+        )
+        db.session.add(event)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Shopify重试投递的同一个webhook（X-Shopify-Webhook-Id相同），已经保存过
+            db.session.rollback()
+            logger.info(f"Duplicate webhook ignored: {topic} {event.webhook_id}")
+            return jsonify({'status': 'duplicate'}), 200
+        
+        _notify_inbox_worker()
         
-        logger.info(f"Product updated via webhook: {product_data.get('title')}")
+        logger.info(f"Webhook queued: {topic} {event.resource_id} (event {event.id})")
         
         return jsonify({
-            'status': 'success',
-            'message': 'Product updated successfully',
-            'product_id': result.get('product_id')
+            'status': 'accepted',
+            'event_id': event.id
         }), 200
         
     except Exception as e:
-        logger.error(f"Error processing product update webhook: {str(e)}")
+        db.session.rollback()
+        logger.error(f"Error queuing {topic} webhook: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
 
-@webhook_bp.route('/shopify/products/delete', methods=['POST'])
-def handle_product_delete():
-    """处理Shopify产品删除webhook"""
+def _notify_inbox_worker():
+    """通知Celery处理收件箱；消息代理不可用时由定时任务兜底
+    
+    延迟几秒执行，让同一订单短时间内的多个webhook在一次处理中合并。
+    """
     try:
-        # 验证webhook签名
-        if not _verify_webhook_signature():
-            return jsonify({'error': 'Invalid signature'}), 401
-        
-        # 获取产品数据
-        product_data = request.get_json()
-        
-        if not product_data:
-            return jsonify({'error': 'No data received'}), 400
-        
-        # 查找并删除产品
-        shopify_product_id = str(product_data.get('id'))
-        product = Product.query.filter_by(shopify_product_id=shopify_product_id).first()
-        
-        if product:
-            db.session.delete(product)
-            db.session.commit()
-            
-            logger.info(f"Product deleted via webhook: {product_data.get('title')}")
-            
-            return jsonify({
-                'status': 'success',
-                'message': 'Product deleted successfully'
-            }), 200
-        else:
-            logger.warning(f"Product not found for deletion webhook: {shopify_product_id}")
-            return jsonify({'error': 'Product not found'}), 404
-        
+        from app.tasks import process_webhook_inbox_task
+        process_webhook_inbox_task.apply_async(
+            countdown=current_app.config.get('WEBHOOK_COALESCE_SECONDS', 3),
+            retry=False
+        )
     except Exception as e:
-        logger.error(f"Error processing product delete webhook: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        logger.warning(f"Failed to notify webhook inbox worker: {str(e)}")
 
 
 def _verify_webhook_signature():
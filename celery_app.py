@@ -19,7 +19,10 @@ celery.conf.update(
         'app.tasks.sync_shopify_orders_task': {'queue': 'sync'},
         'app.tasks.sync_shopify_orders_full_task': {'queue': 'sync'},
         'app.tasks.sync_shopify_orders_daily_task': {'queue': 'sync'},
+        'app.tasks.sync_shopify_orders_incremental_task': {'queue': 'sync'},
         'app.tasks.sync_shopify_products_task': {'queue': 'sync'},
+        'app.tasks.process_webhook_inbox_task': {'queue': 'webhooks'},
+        'app.tasks.refresh_exchange_rates_task': {'queue': 'sync'},
         'app.tasks.test_connection_task': {'queue': 'test'},
     },
     # 定时任务配置
@@ -34,9 +37,9 @@ celery.conf.update(
             'task': 'app.tasks.sync_shopify_orders_full_task',
             'schedule': crontab(hour=0, minute=0),   # 每天晚上12:00（凌晨0:00）
         },
-        # 增量同步：每小时同步当天订单
+        # 增量同步：每小时同步上次水位线之后有变更的订单
         'sync-shopify-orders-hourly': {
-            'task': 'app.tasks.sync_shopify_orders_daily_task',
+            'task': 'app.tasks.sync_shopify_orders_incremental_task',
             'schedule': crontab(minute=0),  # 每小时的0分执行
         },
         # 产品同步：每天执行一次
@@ -44,6 +47,16 @@ celery.conf.update(
             'task': 'app.tasks.sync_shopify_products_task',
             'schedule': 86400.0,  # 每天执行一次
         },
+        # 汇率刷新：每小时刷新一次共享汇率快照
+        'refresh-exchange-rates': {
+            'task': 'app.tasks.refresh_exchange_rates_task',
+            'schedule': crontab(minute=30),  # 每小时的30分执行
+        },
+        # Webhook收件箱：每分钟兜底处理一次（正常情况下收到webhook时即触发）
+        'process-webhook-inbox': {
+            'task': 'app.tasks.process_webhook_inbox_task',
+            'schedule': 60.0,
+        },
         # 连接测试：每30分钟测试一次
         'test-shopify-connection': {
             'task': 'app.tasks.test_connection_task',
@@ -24,6 +24,11 @@ class Config:
     SHOPIFY_ACCESS_TOKEN = os.environ.get('SHOPIFY_ACCESS_TOKEN')
     SHOPIFY_SHOP_URL = os.environ.get('SHOPIFY_SHOP_URL')
     SHOPIFY_WEBHOOK_SECRET = os.environ.get('SHOPIFY_WEBHOOK_SECRET')
+    # 订单拉取：并发线程数；API地址可指向本地模拟服务（留空使用店铺Admin API）
+    SHOPIFY_FETCH_WORKERS = int(os.environ.get('SHOPIFY_FETCH_WORKERS') or 4)
+    SHOPIFY_API_BASE_URL = os.environ.get('SHOPIFY_API_BASE_URL')
+    # webhook收件箱延迟处理的秒数，窗口内同一订单的多个webhook合并为一次写入
+    WEBHOOK_COALESCE_SECONDS = int(os.environ.get('WEBHOOK_COALESCE_SECONDS') or 3)
     
     # PayPal API配置
     PAYPAL_CLIENT_ID = os.environ.get('PAYPAL_CLIENT_ID')
@@ -37,6 +42,11 @@ class Config:
     # Redis配置（用于Celery）
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
     
+    # 共享汇率快照：redis 或 sqlite（本地开发使用SQLite文件代替Redis）
+    EXCHANGE_RATE_SNAPSHOT_BACKEND = os.environ.get('EXCHANGE_RATE_SNAPSHOT_BACKEND') or 'redis'
+    EXCHANGE_RATE_SNAPSHOT_PATH = os.environ.get('EXCHANGE_RATE_SNAPSHOT_PATH') or \
+        os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance', 'exchange_rates_snapshot.db')
+    
     # Celery配置
     CELERY_BROKER_URL = REDIS_URL
     CELERY_RESULT_BACKEND = REDIS_URL
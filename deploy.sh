@@ -143,6 +143,30 @@ TimeoutStopSec=30
 WantedBy=multi-user.target
 EOF
 
+# Celery Webhook Worker 服务（webhooks 队列，单并发按接收顺序处理）
+sudo tee /etc/systemd/system/caseledger-webhooks.service > /dev/null <<EOF
+[Unit]
+Description=CaseLedger Celery Webhook Worker
+After=network.target redis.service
+Requires=redis.service
+
+[Service]
+Type=simple
+User=$APP_USER
+Group=$APP_USER
+WorkingDirectory=$APP_DIR
+Environment=PATH=$APP_DIR/venv/bin
+EnvironmentFile=$APP_DIR/.env
+ExecStart=$APP_DIR/venv/bin/python start_celery_worker.py --queues=webhooks
+Restart=always
+RestartSec=10
+KillMode=mixed
+TimeoutStopSec=30
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
 # Celery Beat 服务
 sudo tee /etc/systemd/system/caseledger-beat.service > /dev/null <<EOF
 [Unit]
@@ -244,8 +268,8 @@ sudo systemctl daemon-reload
 
 # 启动服务
 echo "启动应用服务..."
-sudo systemctl enable caseledger-app caseledger-worker caseledger-beat
-sudo systemctl start caseledger-app caseledger-worker caseledger-beat
+sudo systemctl enable caseledger-app caseledger-worker caseledger-webhooks caseledger-beat
+sudo systemctl start caseledger-app caseledger-worker caseledger-webhooks caseledger-beat
 
 # 重启 Nginx
 echo "重启 Nginx..."
@@ -261,6 +285,7 @@ sudo systemctl is-active caseledger-app || echo "❌ Flask 应用未运行"
 
 echo "Celery Worker:"
 sudo systemctl is-active caseledger-worker || echo "❌ Celery Worker 未运行"
+sudo systemctl is-active caseledger-webhooks || echo "❌ Celery Webhook Worker 未运行"
 
 echo "Celery Beat:"
 sudo systemctl is-active caseledger-beat || echo "❌ Celery Beat 未运行"
@@ -289,6 +314,7 @@ echo ""
 echo "查看日志命令:"
 echo "sudo journalctl -u caseledger-app -f"
 echo "sudo journalctl -u caseledger-worker -f"
+echo "sudo journalctl -u caseledger-webhooks -f"
 echo "sudo journalctl -u caseledger-beat -f"
 echo ""
 echo "如有问题，请查看部署指南: $APP_DIR/DEPLOYMENT_GUIDE.md"
\ No newline at end of file
@@ -90,7 +90,17 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # 订单全文搜索索引（SQLite FTS5 虚拟表及其影子表、MySQL FULLTEXT 索引）
+    # 由迁移手工维护，不在模型中声明，自动生成迁移时忽略
+    def include_object(object, name, type_, reflected, compare_to):
+        if type_ == 'table' and name.startswith('orders_fts'):
+            return False
+        if type_ == 'index' and name == 'ft_orders_search':
+            return False
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
+    conf_args.setdefault('include_object', include_object)
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
 
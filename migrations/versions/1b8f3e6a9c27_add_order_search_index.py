@@ -0,0 +1,44 @@
+"""Add order full-text search index
+
+Revision ID: 1b8f3e6a9c27
+Revises: 0a7e4c9d2b16
+Create Date: 2026-10-17 18:02:41.905316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1b8f3e6a9c27'
+down_revision = '0a7e4c9d2b16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 订单号、客户邮箱、客户姓名的全文搜索索引（见 app/services/order_search.py）
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts '
+            'USING fts5(order_number, customer_email, customer_name)'
+        )
+        op.execute(
+            "INSERT INTO orders_fts (rowid, order_number, customer_email, customer_name) "
+            "SELECT id, COALESCE(order_number, ''), COALESCE(customer_email, ''), "
+            "COALESCE(customer_name, '') FROM orders"
+        )
+    elif dialect == 'mysql':
+        op.execute(
+            'CREATE FULLTEXT INDEX ft_orders_search '
+            'ON orders (order_number, customer_email, customer_name)'
+        )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS orders_fts')
+    elif dialect == 'mysql':
+        op.execute('DROP INDEX ft_orders_search ON orders')
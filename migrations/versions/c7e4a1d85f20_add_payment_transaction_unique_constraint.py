@@ -0,0 +1,35 @@
+"""Add unique constraint on payments (order_id, transaction_id)
+
+Revision ID: c7e4a1d85f20
+Revises: b3c1f2a9d4e7
+Create Date: 2026-10-17 10:03:17.552904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e4a1d85f20'
+down_revision = 'b3c1f2a9d4e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 清理历史重复的支付记录，只保留每笔交易最早的一条
+    connection = op.get_bind()
+    connection.execute(sa.text(
+        "DELETE FROM payments WHERE transaction_id IS NOT NULL AND id NOT IN ("
+        "SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM payments "
+        "WHERE transaction_id IS NOT NULL GROUP BY order_id, transaction_id) AS keep"
+        ")"
+    ))
+
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_payment_order_transaction', ['order_id', 'transaction_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_payment_order_transaction', type_='unique')
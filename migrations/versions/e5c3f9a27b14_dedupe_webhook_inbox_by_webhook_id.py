@@ -0,0 +1,44 @@
+"""Dedupe webhook_inbox by webhook_id
+
+Revision ID: e5c3f9a27b14
+Revises: d4b2e8f61a93
+Create Date: 2026-10-17 13:41:09.662857
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5c3f9a27b14'
+down_revision = 'd4b2e8f61a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 删除重复投递的webhook，只保留最早收到的一条
+    op.execute("""
+        DELETE FROM webhook_inbox
+        WHERE webhook_id IS NOT NULL
+          AND id NOT IN (
+              SELECT min_id FROM (
+                  SELECT MIN(id) AS min_id
+                  FROM webhook_inbox
+                  WHERE webhook_id IS NOT NULL
+                  GROUP BY webhook_id
+              ) AS keep_rows
+          )
+    """)
+
+    with op.batch_alter_table('webhook_inbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_webhook_inbox_webhook_id')
+        batch_op.create_unique_constraint('uq_webhook_inbox_webhook_id', ['webhook_id'])
+        batch_op.create_index('ix_webhook_inbox_resource_id', ['resource_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('webhook_inbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_webhook_inbox_resource_id')
+        batch_op.drop_constraint('uq_webhook_inbox_webhook_id', type_='unique')
+        batch_op.create_index('ix_webhook_inbox_webhook_id', ['webhook_id'], unique=False)
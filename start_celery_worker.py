@@ -16,6 +16,7 @@ print(f"启动时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 print("支持的任务队列:")
 print("- sync: 订单和产品同步任务")
 print("- test: 连接测试任务")
+print("- webhooks: Webhook收件箱处理（使用 --queues=webhooks 单独启动，单并发）")
 print()
 print("按 Ctrl+C 停止工作进程")
 print("=" * 50)
@@ -24,5 +25,11 @@ print("=" * 50)
 if __name__ == '__main__':
     from celery_app import celery
     
-    # 启动worker进程，监听所有队列
-    celery.start(['worker', '--loglevel=info', '--queues=sync,test'])
\ No newline at end of file
+    # webhook收件箱需要按接收顺序处理，单独的单并发worker：
+    #   python start_celery_worker.py --queues=webhooks
+    if '--queues=webhooks' in sys.argv[1:]:
+        celery.start(['worker', '--loglevel=info', '--queues=webhooks', '--concurrency=1',
+                      '--hostname=webhooks@%h'])
+    else:
+        # 启动worker进程，监听同步和测试队列
+        celery.start(['worker', '--loglevel=info', '--queues=sync,test'])
\ No newline at end of file
@@ -0,0 +1,101 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from app.models import Expense, Order, OrderCost, Payment
+from app.services.exchange_rate_service import exchange_rate_service
+
+EXPAND = {'order_costs', 'payments', 'expenses'}
+
+
+class StatementCounter:
+    """通过 before_cursor_execute 统计执行的SQL语句"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+
+def seed_orders(db, count):
+    """每个订单两笔支付、一条订单成本；两笔费用分别关联全部订单（提交时写入分摊表）"""
+    exchange_rate_service.store_rates([
+        {'rate_date': date(2024, 1, 1), 'from_currency': 'USD', 'to_currency': 'CNY', 'rate': Decimal('7.1')},
+    ], source='test')
+    orders = []
+    for index in range(count):
+        order = Order(
+            shopify_order_id=f'gid-{index}', order_number=f'#{1000 + index}',
+            total_price=Decimal('100.00') + index, subtotal_price=Decimal('90.00'),
+            currency='USD', payment_fee=Decimal('3.20'), product_cost=Decimal('20.00'),
+            financial_status='paid', order_date=datetime(2024, 3, 1) + timedelta(hours=index)
+        )
+        order.calculate_actual_received()
+        db.session.add(order)
+        orders.append(order)
+    db.session.flush()
+    for order in orders:
+        for method in ('paypal', 'stripe'):
+            db.session.add(Payment(order_id=order.id, payment_method=method, amount=Decimal('50.00'),
+                                   payment_date=order.order_date))
+        db.session.add(OrderCost(order_id=order.id, order_number=order.order_number,
+                                 shipping_cost=Decimal('35.00'), fangguo_cost=Decimal('60.00'),
+                                 cost_date=date(2024, 3, 2)))
+    for category, strategy in (('product_cost', 'even'), ('shipping_cost', 'revenue_weighted')):
+        expense = Expense(category=category, amount=Decimal('1000.00'), allocation_strategy=strategy,
+                          expense_date=date(2024, 3, 1))
+        expense.orders = list(orders)
+        db.session.add(expense)
+    db.session.commit()
+    db.session.expunge_all()
+
+
+def serialize_page(db, size):
+    """按订单列表接口的方式查询一页订单并序列化，返回 (结果, 执行的SQL语句)"""
+    # 历史汇率每个进程只加载一次，不计入单页的查询
+    exchange_rate_service.load_historical_rates()
+    with StatementCounter(db.engine) as counter:
+        orders = Order.query.options(*Order.serializer_options(None, EXPAND)).order_by(Order.id).limit(size).all()
+        data = Order.to_dict_list(orders, None, EXPAND)
+    db.session.expunge_all()
+    return data, counter.statements
+
+
+@pytest.mark.parametrize('size', [5, 20])
+def test_to_dict_list_uses_fixed_statement_count(db, size):
+    seed_orders(db, 20)
+
+    data, statements = serialize_page(db, size)
+
+    # 订单、订单成本（selectin）、费用（selectin）、分摊合计、支付记录各一条
+    assert len(statements) == 5, statements
+    assert len(data) == size
+    first = data[0]
+    assert len(first['payments']) == 2
+    assert len(first['order_costs']) == 1
+    assert len(first['expenses']) == 2
+    assert first['shipping_cost_cny'] == 35.0
+    assert first['fangguo_cost_cny'] == 60.0
+    assert first['allocated_product_cost'] == 50.0
+    assert first['allocated_shipping_cost'] > 0
+
+
+def test_to_dict_list_matches_to_dict(db):
+    seed_orders(db, 3)
+
+    data, _ = serialize_page(db, 3)
+
+    for item in data:
+        order = db.session.get(Order, item['id'])
+        assert order.to_dict(expand=EXPAND) == item
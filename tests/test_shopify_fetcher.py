@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app.services.shopify_fetcher import LeakyBucket, ShopifyFetcher
+from app.services.shopify_service import ShopifyService
+
+API_PREFIX = '/admin/api/2023-10'
+
+
+@pytest.fixture(autouse=True)
+def _no_proxy(monkeypatch):
+    # 本地模拟服务不能经过代理
+    monkeypatch.setenv('NO_PROXY', '127.0.0.1')
+
+
+class StubShopify:
+    """本地模拟的Shopify REST API
+
+    订单按 page_info 游标分页并返回 Link 头，每个响应带 X-Shopify-Shop-Api-Call-Limit，
+    可让前 rate_limited 次订单请求返回429和 Retry-After。
+    """
+
+    def __init__(self, pages, call_limit='1/40', rate_limited=0, retry_after='0.3'):
+        self.pages = pages
+        self.call_limit = call_limit
+        self.rate_limited = rate_limited
+        self.retry_after = retry_after
+        self.requests = []  # (到达时间, 路径, 查询参数, 访问令牌)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}{API_PREFIX}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, handler):
+        url = urlparse(handler.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        with self._lock:
+            self.requests.append((time.monotonic(), url.path, query,
+                                  handler.headers.get('X-Shopify-Access-Token')))
+            rate_limited = url.path.endswith('/orders.json') and self.rate_limited > 0
+            if rate_limited:
+                self.rate_limited -= 1
+
+        if rate_limited:
+            self.respond(handler, 429, {'errors': 'Exceeded 2 calls per second for api client.'},
+                         {'Retry-After': self.retry_after})
+        elif url.path == f'{API_PREFIX}/orders.json':
+            index = int(query.get('page_info', '0'))
+            headers = {}
+            if index + 1 < len(self.pages):
+                next_url = f'{self.base_url}/orders.json?limit=2&page_info={index + 1}'
+                headers['Link'] = f'<{next_url}>; rel="next"'
+            self.respond(handler, 200, {'orders': self.pages[index]}, headers)
+        elif url.path.endswith('/transactions.json'):
+            order_id = int(url.path.split('/')[-2])
+            self.respond(handler, 200, {'transactions': [{'id': order_id * 10, 'order_id': order_id}]})
+        else:
+            self.respond(handler, 404, {'errors': 'Not Found'})
+
+    def respond(self, handler, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(payload)))
+        handler.send_header('X-Shopify-Shop-Api-Call-Limit', self.call_limit)
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def order_requests(self):
+        return [request for request in self.requests if request[1].endswith('/orders.json')]
+
+
+def make_pages(page_count, per_page=2):
+    return [
+        [{'id': page * per_page + index + 1} for index in range(per_page)]
+        for page in range(page_count)
+    ]
+
+
+def test_fetcher_follows_link_pagination_from_configured_base_url(app):
+    with StubShopify(make_pages(3)) as stub:
+        app.config.update(
+            SHOPIFY_API_KEY='key', SHOPIFY_API_SECRET='secret', SHOPIFY_SHOP_URL='test-shop',
+            SHOPIFY_ACCESS_TOKEN='token', SHOPIFY_API_BASE_URL=stub.base_url
+        )
+        service = ShopifyService(app)
+        try:
+            pages = list(service.fetcher.iter_order_pages(limit=2, status='any'))
+        finally:
+            service.fetcher.close()
+
+    assert [[order['id'] for order in page] for page in pages] == [[1, 2], [3, 4], [5, 6]]
+    assert all(order['transactions'] == [{'id': order['id'] * 10, 'order_id': order['id']}]
+               for page in pages for order in page)
+    # 第一页使用调用方的参数，后续页只跟随 Link 中的 page_info
+    page_queries = [query for _, _, query, _ in stub.order_requests()]
+    assert page_queries == [{'limit': '2', 'status': 'any'},
+                            {'limit': '2', 'page_info': '1'},
+                            {'limit': '2', 'page_info': '2'}]
+    assert len(stub.requests) == 3 + 6
+    assert {token for _, _, _, token in stub.requests} == {'token'}
+
+
+def test_fetcher_retries_after_429_with_retry_after(app):
+    with StubShopify(make_pages(1), rate_limited=1, retry_after='0.3') as stub:
+        fetcher = ShopifyFetcher('test-shop.myshopify.com', 'token', base_url=stub.base_url)
+        try:
+            pages = list(fetcher.iter_order_pages(with_transactions=False))
+        finally:
+            fetcher.close()
+
+    assert pages == [[{'id': 1}, {'id': 2}]]
+    first, retry = stub.order_requests()
+    assert retry[0] - first[0] >= 0.3 * 0.9
+
+
+def test_fetcher_throttles_to_server_reported_bucket(app):
+    # 本地按容量40建桶，服务端报告 "4/4"：校准后每个请求都要等漏出名额
+    bucket = LeakyBucket(capacity=40, leak_rate=20.0, headroom=1)
+    with StubShopify(make_pages(3), call_limit='4/4') as stub:
+        fetcher = ShopifyFetcher('test-shop.myshopify.com', 'token', base_url=stub.base_url, bucket=bucket)
+        try:
+            pages = list(fetcher.iter_order_pages())
+        finally:
+            fetcher.close()
+
+    assert sum(len(page) for page in pages) == 6
+    assert bucket.capacity == 4
+    arrivals = sorted(arrival for arrival, _, _, _ in stub.requests)
+    # 第一次响应后桶已满，之后的请求不超过 leak_rate 个/秒
+    throttled = arrivals[1:]
+    assert throttled[-1] - throttled[0] >= (len(throttled) - 1) / bucket.leak_rate * 0.9